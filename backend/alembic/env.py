@@ -25,14 +25,27 @@ if config.config_file_name is not None:
 from app.database.base import Base
 from app.models import Book, Review
 
+from app.database.connection import to_sync_url
+
 database_url = os.getenv("DATABASE_URL")
 if database_url is None:
     raise ValueError("DATABASE_URL environment variable not set!")
 
-config.set_main_option("sqlalchemy.url", database_url)
+# Migrations run on the blocking driver even when the app is configured with an asyncio one
+config.set_main_option("sqlalchemy.url", to_sync_url(database_url))
 
 target_metadata = Base.metadata
 
+# Database-maintained objects that are deliberately not mapped on the models
+UNMAPPED_OBJECTS = {
+    ("column", "search_vector"), ("index", "idx_books_search_vector"), ("index", "idx_reviews_search_vector")
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping the database-maintained search columns"""
+    return not (reflected and compare_to is None and (type_, name) in UNMAPPED_OBJECTS)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +70,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -78,7 +92,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
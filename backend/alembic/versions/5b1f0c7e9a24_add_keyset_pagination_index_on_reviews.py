@@ -0,0 +1,32 @@
+"""Add keyset pagination index on reviews
+
+Revision ID: 5b1f0c7e9a24
+Revises: d483358e575d
+Create Date: 2026-10-18 09:12:03.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f0c7e9a24'
+down_revision: Union[str, Sequence[str], None] = 'd483358e575d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (book_id, id) serves keyset pages of a book's reviews and makes the
+    # book_id-only index redundant
+    op.create_index('idx_reviews_book_id_id', 'reviews', ['book_id', 'id'], unique=False)
+    op.drop_index('idx_reviews_book_id', table_name='reviews')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('idx_reviews_book_id', 'reviews', ['book_id'], unique=False)
+    op.drop_index('idx_reviews_book_id_id', table_name='reviews')
@@ -0,0 +1,48 @@
+"""Add review aggregates to books
+
+Revision ID: 8c3d2e6f1b70
+Revises: 5b1f0c7e9a24
+Create Date: 2026-10-18 11:40:27.504913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3d2e6f1b70'
+down_revision: Union[str, Sequence[str], None] = '5b1f0c7e9a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AGGREGATE_COLUMNS = [
+    'review_count', 'rating_sum',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in AGGREGATE_COLUMNS:
+        op.add_column('books', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from existing reviews
+    op.execute("""
+        UPDATE books SET
+            review_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.book_id = books.id),
+            rating_1_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 1),
+            rating_2_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 2),
+            rating_3_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 3),
+            rating_4_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 4),
+            rating_5_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 5)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('books') as batch_op:
+        for column in reversed(AGGREGATE_COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,88 @@
+"""Add book search vector
+
+Revision ID: e7a91c4d2f58
+Revises: 8c3d2e6f1b70
+Create Date: 2026-10-18 14:05:51.632019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a91c4d2f58'
+down_revision: Union[str, Sequence[str], None] = '8c3d2e6f1b70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Full-text search is Postgres only; other databases use the in-memory index
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE books ADD COLUMN search_vector tsvector")
+
+    # Weighted document for one book: title (A), author (B), description (C)
+    # and all of its review comments (D)
+    op.execute("""
+        CREATE FUNCTION book_search_vector(book_id integer, title text, author text, description text)
+        RETURNS tsvector LANGUAGE sql STABLE AS $$
+            SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(author, '')), 'B')
+                || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+                || setweight(to_tsvector('english', coalesce(
+                    (SELECT string_agg(comment, ' ') FROM reviews WHERE reviews.book_id = $1), ''
+                )), 'D')
+        $$
+    """)
+    op.execute("""
+        CREATE FUNCTION books_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := book_search_vector(NEW.id, NEW.title, NEW.author, NEW.description);
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE FUNCTION reviews_search_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            target integer := CASE WHEN TG_OP = 'DELETE' THEN OLD.book_id ELSE NEW.book_id END;
+        BEGIN
+            UPDATE books SET search_vector = book_search_vector(id, title, author, description)
+            WHERE id = target;
+            RETURN NULL;
+        END
+        $$
+    """)
+    # Rating and aggregate updates do not touch indexed text, so they skip the triggers
+    op.execute("""
+        CREATE TRIGGER books_search_vector_update
+        BEFORE INSERT OR UPDATE OF title, author, description ON books
+        FOR EACH ROW EXECUTE FUNCTION books_search_vector_trigger()
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_search_vector_update
+        AFTER INSERT OR DELETE OR UPDATE OF comment ON reviews
+        FOR EACH ROW EXECUTE FUNCTION reviews_search_vector_trigger()
+    """)
+
+    op.execute("UPDATE books SET search_vector = book_search_vector(id, title, author, description)")
+    op.create_index('idx_books_search_vector', 'books', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('idx_books_search_vector', table_name='books', postgresql_using='gin')
+    op.execute("DROP TRIGGER reviews_search_vector_update ON reviews")
+    op.execute("DROP TRIGGER books_search_vector_update ON books")
+    op.execute("DROP FUNCTION reviews_search_vector_trigger()")
+    op.execute("DROP FUNCTION books_search_vector_trigger()")
+    op.execute("DROP FUNCTION book_search_vector(integer, text, text, text)")
+    op.execute("ALTER TABLE books DROP COLUMN search_vector")
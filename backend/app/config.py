@@ -6,12 +6,116 @@ load_dotenv()
 class Settings:
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL")
+    # Optional comma-separated read replicas for GET endpoints, health-checked every
+    # REPLICA_HEALTH_INTERVAL seconds. REPLICA_LAG_WINDOW is how long after a write a
+    # replica may still be behind: the writer reads from the primary for that long,
+    # and cache invalidations are repeated after it.
+    DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+    REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+    REPLICA_LAG_WINDOW = float(os.getenv("REPLICA_LAG_WINDOW", "3"))
+
+    # Async engine pool (PostgreSQL; SQLite does not pool). Connections are
+    # recycled after DB_POOL_RECYCLE seconds and pinged before reuse.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+    # Default per-statement limit for API queries in milliseconds (0 disables)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
 
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    # Seconds a Redis command or connection attempt may take before it counts as a failure
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+    REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.25"))
+    # Failures in a row that open the circuit breaker, and the bounds of the
+    # backoff between reconnection attempts while it is open
+    REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "5"))
+    REDIS_RECONNECT_MIN = float(os.getenv("REDIS_RECONNECT_MIN", "0.5"))
+    REDIS_RECONNECT_MAX = float(os.getenv("REDIS_RECONNECT_MAX", "30"))
+
+    # In-process cache tier in front of Redis
+    CACHE_LOCAL_ENABLED = os.getenv("CACHE_LOCAL_ENABLED", "False").lower() == "true"
+    CACHE_LOCAL_MAXSIZE = int(os.getenv("CACHE_LOCAL_MAXSIZE", "10000"))
+    CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+    CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+
+    # Top-rated ranking: Bayesian average with LEADERBOARD_PRIOR_WEIGHT virtual
+    # reviews of LEADERBOARD_PRIOR_MEAN stars
+    LEADERBOARD_PRIOR_WEIGHT = int(os.getenv("LEADERBOARD_PRIOR_WEIGHT", "10"))
+    LEADERBOARD_PRIOR_MEAN = float(os.getenv("LEADERBOARD_PRIOR_MEAN", "3.0"))
+    LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", "5"))
+
+    # Full-text search: at most this many book and review matches (the best ranked) are merged per query
+    SEARCH_MAX_RANKED = int(os.getenv("SEARCH_MAX_RANKED", "10000"))
+
+    # Bulk import: rows per INSERT (and per cache invalidation)
+    BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+
+    # Batch fetch: most ids accepted by one /batch request
+    BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
+
+    # HTTP caching of GET responses: max-age for browsers, s-maxage for a CDN
+    HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+    HTTP_CACHE_SHARED_MAX_AGE = int(os.getenv("HTTP_CACHE_SHARED_MAX_AGE", "5"))
+
+    # Response compression: encodings in preference order, smallest body worth
+    # compressing, levels. br and zstd need the optional brotli and zstandard
+    # packages, so only gzip is on by default
+    COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "gzip")
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
     
     API_V1_STR = "/api/v1"
     PROJECT_NAME = "Book Review Service"
     
+    # Request, database and cache metrics at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+    # Per-request profiling: requests sending PROFILE_HEADER set to PROFILE_TOKEN
+    # (ignored while the token is empty), plus a random PROFILE_SAMPLE_RATE share,
+    # get a Server-Timing header and a cProfile, logged or saved in PROFILE_DIR
+    PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+    # Statements slower than SLOW_QUERY_MS (0 disables) are logged with their
+    # parameters and, with SLOW_QUERY_EXPLAIN, their plan
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() == "true"
+
+    # Outbox of post-commit side effects: how often the worker polls for events
+    # that were not applied right after their write, and events per drain batch
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+
+    # Admission control for API routes: requests in progress at once, extra
+    # per-route limits ("METHOD /route/template=limit", comma-separated; those
+    # routes and writes are low priority), the wait queue's size and timeout,
+    # the share of the queue low-priority requests may fill, and the Retry-After
+    # seconds sent with a 503
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+    ADMISSION_ROUTE_LIMITS = os.getenv(
+        "ADMISSION_ROUTE_LIMITS",
+        "GET /api/v1/books/{book_id}/reviews=16,GET /api/v1/books/search=8,GET /api/v1/books/export=2,"
+        "POST /api/v1/books/bulk=2,POST /api/v1/books/{book_id}/reviews/bulk=2",
+    )
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "128"))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+    ADMISSION_LOW_PRIORITY_QUEUE_SHARE = float(os.getenv("ADMISSION_LOW_PRIORITY_QUEUE_SHARE", "0.5"))
+    ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+    # Size of the synthetic dataset `python -m app.seed` loads into an empty database
+    SEED_BOOKS = int(os.getenv("SEED_BOOKS", "10000"))
+    SEED_REVIEWS = int(os.getenv("SEED_REVIEWS", "100000"))
+
     # Environment
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
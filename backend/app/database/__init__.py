@@ -1,4 +1,10 @@
 from .base import Base
-from .connection import engine, SessionLocal, get_db
+from .connection import (
+    engine, SessionLocal, async_engine, AsyncSessionLocal, get_db, get_read_db, read_session, replicas,
+    ping_database, pool_stats, statement_timeout
+)
 
-__all__ = ["Base", "engine", "SessionLocal", "get_db"]
\ No newline at end of file
+__all__ = [
+    "Base", "engine", "SessionLocal", "async_engine", "AsyncSessionLocal", "get_db", "get_read_db", "read_session", "replicas",
+    "ping_database", "pool_stats", "statement_timeout",
+]
\ No newline at end of file
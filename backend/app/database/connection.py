@@ -1,13 +1,219 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.requests import Request
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+logger = logging.getLogger(__name__)
+
+# Set on responses to writes; while it is valid the client's reads go to the primary
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# asyncio drivers used for each synchronous dialect in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """Rewrite a database URL to use the asyncio driver for its dialect"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.get_driver_name() == driver:
+        return parsed.render_as_string(hide_password=False)
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+def to_sync_url(url: str) -> str:
+    """Rewrite a database URL to use the default blocking driver for its dialect"""
+    parsed = make_url(url)
+    if parsed.get_driver_name() != ASYNC_DRIVERS.get(parsed.get_backend_name()):
+        return parsed.render_as_string(hide_password=False)
+    return parsed.set(drivername=parsed.get_backend_name()).render_as_string(hide_password=False)
+
+# Blocking engine, kept for scripts (seed, maintenance commands) that run outside the event loop.
+# No statement timeout here: migrations and repairs legitimately run long.
+engine = create_engine(
+    to_sync_url(settings.DATABASE_URL),
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
-    db = SessionLocal()
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.waits["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.waits["count"] += 1
+            self.waits["total"] += waited
+            self.waits["max"] = max(self.waits["max"], waited)
+
+def async_engine_options(url: str) -> dict:
+    """Engine options for the async engine serving the API"""
+    if make_url(url).get_backend_name() == "sqlite":
+        # Opening a SQLite file is cheap, and each aiosqlite connection owns a worker
+        # thread bound to the event loop that created it, so pooling buys nothing here
+        return {"poolclass": NullPool}
+    connect_args: Dict[str, Any] = {"timeout": settings.DB_CONNECT_TIMEOUT}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        # Session default set once per connection; see statement_timeout() to change it per request
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        # Replace connections that died (e.g. in a failover) before handing them out
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+# Async engine used by the API so queries never block the event loop
+async_engine = create_async_engine(
+    to_async_url(settings.DATABASE_URL),
+    **async_engine_options(settings.DATABASE_URL),
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+class ReplicaSet:
+    """Async engines for read replicas, used round robin while they pass health checks"""
+
+    def __init__(self, urls: List[str]):
+        self.urls = urls
+        self.engines: List[AsyncEngine] = [create_async_engine(to_async_url(url), **async_engine_options(url)) for url in urls]
+        self.healthy = [True] * len(self.engines)
+        self.latencies: List[Optional[float]] = [None] * len(self.engines)
+        self._next = 0
+        self._checker: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Next healthy replica, or None when there is none (reads then use the primary)"""
+        for _ in range(len(self.engines)):
+            index = self._next % len(self.engines)
+            self._next += 1
+            if self.healthy[index]:
+                return self.engines[index]
+        return None
+
+    async def check(self):
+        """Ping every replica, taking failing ones out of rotation until they answer again"""
+        for index, engine in enumerate(self.engines):
+            try:
+                self.latencies[index] = await asyncio.wait_for(ping_database(engine), timeout=settings.REPLICA_HEALTH_TIMEOUT)
+                healthy = True
+            except Exception as e:
+                self.latencies[index] = None
+                healthy = False
+                if self.healthy[index]:
+                    logger.warning("Read replica %s failed its health check: %s", index, e)
+            if healthy and not self.healthy[index]:
+                logger.info("Read replica %s is back in rotation", index)
+            self.healthy[index] = healthy
+
+    def start_health_checks(self):
+        if self.engines and self._checker is None:
+            self._checker = asyncio.create_task(self._check_periodically())
+
+    async def _check_periodically(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL)
+
+    async def close(self):
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+        for engine in self.engines:
+            await engine.dispose()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "url": make_url(url).render_as_string(hide_password=True),
+                "healthy": healthy,
+                "latency_ms": round(latency * 1000, 3) if latency is not None else None,
+            }
+            for url, healthy, latency in zip(self.urls, self.healthy, self.latencies)
+        ]
+
+# Optional read replicas for GET endpoints (none unless DATABASE_REPLICA_URLS is set)
+replicas = ReplicaSet([url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()])
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def reads_own_writes(request: Request) -> bool:
+    """Whether the client wrote recently enough that a replica may not have its change yet"""
     try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def read_session(request: Optional[Request] = None) -> AsyncSession:
+    """A session on a healthy replica, or on the primary after the client's own writes"""
+    engine = None if request is not None and reads_own_writes(request) else replicas.pick()
+    return AsyncSessionLocal(bind=engine) if engine is not None else AsyncSessionLocal()
+
+async def get_read_db(request: Request):
+    """Session for read-only routes: replicas when configured, otherwise the primary"""
+    async with read_session(request) as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+async def statement_timeout(db: AsyncSession, milliseconds: int):
+    """Override the statement timeout for the rest of the session's transaction (0 disables it)"""
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text(f"SET LOCAL statement_timeout = {int(milliseconds)}"))
+
+def pool_stats() -> Dict[str, Any]:
+    """Live numbers for the async engine's pool: size, checked out, overflow and checkout waits"""
+    pool = async_engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    stats = {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    waits = getattr(pool, "waits", None)
+    if waits is not None:
+        stats["waits"] = {
+            "count": waits["count"],
+            "mean_ms": round(waits["total"] / waits["count"] * 1000, 3) if waits["count"] else 0.0,
+            "max_ms": round(waits["max"] * 1000, 3),
+            "timeouts": waits["timeouts"],
+        }
+    return stats
+
+async def ping_database(engine: Optional[AsyncEngine] = None) -> float:
+    """Round-trip a trivial query on a pooled connection; returns the latency in seconds"""
+    started = time.perf_counter()
+    async with (engine or async_engine).connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return time.perf_counter() - started
@@ -1,18 +1,71 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 
 from app.config import settings
 from app.routes import books, reviews
+from app.database import AsyncSessionLocal, async_engine, ping_database, pool_stats, replicas
+from app.utils.admission import AdmissionMiddleware, admission
+from app.utils.cache import cache
+from app.utils.compression import CompressionMiddleware
+from app.utils.consistency import ReadYourWritesMiddleware
+from app.utils.metrics import MetricsMiddleware, collect_pool, instrument_engine, registry
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.leaderboard import leaderboard
+from app.utils.outbox import outbox
+
+async def ensure_leaderboard():
+    async with AsyncSessionLocal() as db:
+        await leaderboard.ensure_built(db)
+
+# Redis may come back empty after an outage, or be down at startup
+cache.reconnect_hooks.append(ensure_leaderboard)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared connections on startup and release them on shutdown"""
+    await cache.connect()
+    cache.start_invalidation_listener()
+    if replicas.engines:
+        # Entries refilled from a lagging replica right after a write are retired again
+        cache.reinvalidate_after = settings.REPLICA_LAG_WINDOW
+        replicas.start_health_checks()
+    await ensure_leaderboard()
+    # Applies side effects of writes that were not applied right after their response
+    outbox.start()
+    yield
+    await outbox.close()
+    await replicas.close()
+    await cache.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="A REST API for managing books and reviews",
     version="1.0.0",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Sheds load before the route runs; inside metrics, so queueing shows in latency
+app.add_middleware(AdmissionMiddleware, routes=app.router.routes)
+
+# Timing wraps everything but compression, which only reshapes the bytes on the way out
+app.add_middleware(MetricsMiddleware)
+for engine in (async_engine, *replicas.engines):
+    instrument_engine(engine)
+collect_pool(pool_stats, lambda: getattr(async_engine.pool, "waits", None))
+
+# Sees the final headers and body of every response
+app.add_middleware(CompressionMiddleware)
+
+# Server-Timing covers compression too
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so every response carries the CORS headers, 503s from admission included
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -48,9 +101,50 @@ app.include_router(
 )
 
 @app.get("/health")
-async def health_check():
+async def health_check(deep: bool = Query(False, description="Also round-trip the database and Redis and report latency")):
     """Health check endpoint"""
-    return {"status": "healthy", "message": "Book Review Service is running"}
+    health = {
+        "status": "healthy",
+        "message": "Book Review Service is running",
+        "cache": cache.stats(),
+        "db_pool": pool_stats(),
+        "outbox": outbox.stats(),
+        "admission": admission.stats(),
+    }
+    if replicas.engines:
+        health["replicas"] = replicas.stats()
+    if not cache.breaker.allows_calls:
+        # Known without a round trip: requests are served uncached
+        health["status"] = "degraded"
+    if not deep:
+        return health
+
+    checks = {}
+    try:
+        checks["database"] = {"status": "up", "latency_ms": round(await ping_database() * 1000, 3)}
+    except Exception as e:
+        checks["database"] = {"status": "down", "error": str(e) if settings.DEBUG else type(e).__name__}
+    try:
+        checks["redis"] = {"status": "up", "latency_ms": round(await cache.ping() * 1000, 3)}
+    except Exception as e:
+        checks["redis"] = {"status": "down", "error": str(e) if settings.DEBUG else type(e).__name__}
+    if replicas.engines:
+        await replicas.check()
+        health["replicas"] = replicas.stats()
+    health["checks"] = checks
+
+    # The API still serves (uncached) without Redis, but not without the database
+    if checks["database"]["status"] == "down":
+        health["status"] = "unhealthy"
+        return JSONResponse(status_code=503, content=health)
+    if checks["redis"]["status"] == "down" or not all(replicas.healthy):
+        health["status"] = "degraded"
+    return health
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, database, cache and pool metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -1,4 +1,5 @@
 from .book import Book
+from .outbox import OutboxEvent
 from .review import Review
 
-__all__ = ["Book", "Review"]
\ No newline at end of file
+__all__ = ["Book", "OutboxEvent", "Review"]
\ No newline at end of file
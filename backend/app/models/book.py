@@ -14,5 +14,24 @@ class Book(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Denormalized review aggregates, kept in step with reviews in the same transaction
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_1_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Relationship
-    reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
\ No newline at end of file
+    reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
+    
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+    
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, f"rating_{stars}_count") or 0 for stars in range(1, 6)}
\ No newline at end of file
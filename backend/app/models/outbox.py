@@ -0,0 +1,14 @@
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Column, DateTime, Integer, JSON, String
+from app.database.base import Base
+
+class OutboxEvent(Base):
+    """Side effect of a write (cache invalidation, ranking update), committed with the write itself"""
+    __tablename__ = "outbox"
+
+    # Rows are deleted once applied, but ids keep counting up
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # Stamped by the app: now() on Postgres is the transaction start, and SQLite's has whole seconds
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
@@ -16,7 +16,7 @@ class Review(Base):
     # Relationship
     book = relationship("Book", back_populates="reviews")
     
-    # Index for optimized fetching reviews by book
+    # Index for fetching reviews by book in id order (keyset pagination)
     __table_args__ = (
-        Index('idx_reviews_book_id', 'book_id'),
+        Index('idx_reviews_book_id_id', 'book_id', 'id'),
     )
\ No newline at end of file
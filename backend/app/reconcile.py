@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.database.connection import AsyncSessionLocal, SessionLocal
+from app.models import Book
+from app.utils.aggregates import reconcile_statement
+from app.utils.cache import cache
+from app.utils.leaderboard import leaderboard
+
+# Recompute per-book review aggregates from the reviews table.
+# Use it to backfill after bulk loads that bypass the API, or to repair drift.
+
+def count_drifted(db: Session) -> int:
+    """Number of books whose stored aggregates differ from their reviews"""
+    statement = reconcile_statement()
+    return db.scalar(select(func.count()).select_from(Book).where(statement.whereclause))
+
+def reconcile(dry_run: bool = False) -> int:
+    db: Session = SessionLocal()
+    try:
+        if dry_run:
+            drifted = count_drifted(db)
+            print(f"Reconcile: {drifted} books have drifted aggregates (dry run, nothing changed).")
+            return drifted
+
+        result = db.execute(reconcile_statement())
+        db.commit()
+        print(f"Reconcile: fixed aggregates for {result.rowcount} books.")
+        return result.rowcount
+    finally:
+        db.close()
+
+async def rebuild_leaderboard() -> int:
+    """Rewrite the Redis rankings from the (reconciled) aggregates"""
+    if not await cache.connect():
+        print("Reconcile: Redis unavailable, leaderboard not rebuilt.")
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            total = await leaderboard.rebuild(db)
+        print(f"Reconcile: rebuilt leaderboard for {total} books.")
+        return total
+    finally:
+        await cache.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or repair per-book review aggregates")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many books drifted")
+    args = parser.parse_args()
+    reconcile(dry_run=args.dry_run)
+    if not args.dry_run:
+        asyncio.run(rebuild_leaderboard())
@@ -1,88 +1,226 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, true
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import List, Literal, Optional, Union
 
-from app.database import get_db
-from app.models import Book
-from app.schemas import BookCreate, BookUpdate, BookResponse, BookWithReviews
+from app.database import AsyncSessionLocal, get_db, get_read_db
+from app.models import Book, Review
+from app.schemas import (
+    BookCreate, BookUpdate, BookResponse, BookPage, BookBatchItem, BookSearchResult, BookWithReviews, ReviewResponse,
+    TopBook
+)
+from app.config import settings
+from app.utils.batch import fetch_by_ids, parse_ids
+from app.utils.bulk import (
+    BulkResultResponse, BulkRowError, insert_ignoring_conflicts, parse_record, read_records, report_line, upload_format
+)
 from app.utils.cache import cache
+from app.utils.conditional import cached_response
+from app.utils.export import EXPORT_MEDIA_TYPES, stream_export
+from app.utils.leaderboard import bayesian_score, leaderboard
+from app.utils.outbox import outbox
+from app.utils.pagination import decode_cursor, keyset_page
+from app.utils.search import search_index
 from app.utils.validation import validate_isbn, validate_year
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-@router.get("/", response_model=List[BookResponse])
+@router.get("/", response_model=Union[List[BookResponse], BookPage])
 async def get_books(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(
+        None,
+        description="Keyset cursor from a previous page's next_cursor (empty for the first page). "
+                    "When given, skip is ignored and a page with next_cursor is returned.",
+    ),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all books with pagination"""
-    # Try to get from cache first
-    cache_key = f"books:list:{skip}:{limit}"
-    cached_books = cache.get(cache_key)
-    
-    if cached_books is not None:
-        return cached_books
-    
-    # If not in cache, fetch from database
-    books = db.query(Book).offset(skip).limit(limit).all()
-    
-    # Convert to response format
-    book_responses = [BookResponse.model_validate(book) for book in books]
-    
-    # Cache the result
-    cache.set(cache_key, [book.model_dump() for book in book_responses], expire=300)
-    
-    return book_responses
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        async def load_page():
+            # Seek past the last seen id on the primary key instead of scanning `skip` rows
+            query = select(Book).order_by(Book.id).limit(limit + 1)
+            if after_id is not None:
+                query = query.where(Book.id > after_id)
+            result = await db.execute(query)
+            return keyset_page(result.scalars().all(), limit, BookResponse)
+
+        entry = await cache.get_or_load_entry(f"after:{after_id}:{limit}", load_page, expire=300, namespace="books:list")
+        return await cached_response(request, entry)
+
+    async def load_books():
+        # Fetch from database
+        result = await db.execute(select(Book).order_by(Book.id).offset(skip).limit(limit))
+        books = result.scalars().all()
+        return [BookResponse.model_validate(book) for book in books]
+
+    # Serve the cached bytes (or a 304 from their validators); concurrent misses share one database load
+    entry = await cache.get_or_load_entry(f"{skip}:{limit}", load_books, expire=300, namespace="books:list")
+    return await cached_response(request, entry)
+
+@router.get("/top", response_model=List[TopBook])
+async def get_top_books(
+    request: Request,
+    by: Literal["rating", "reviews"] = Query("rating"),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the top-rated (Bayesian average) or most-reviewed books"""
+    async def load_top_books():
+        # Rankings come from the incrementally maintained sorted sets
+        ranked = await leaderboard.top(by, limit)
+        if ranked is None:
+            # Redis is down: rank on the stored aggregates instead (no scan of reviews)
+            score = (Book.review_count if by == "reviews" else bayesian_score(Book.review_count, Book.rating_sum))
+            result = await db.execute(
+                select(Book, score).where(Book.review_count > 0).order_by(score.desc(), Book.id).limit(limit)
+            )
+            return [TopBook(**BookResponse.model_validate(book).model_dump(), score=value) for book, value in result.all()]
+
+        # Only the ranked books are loaded, by primary key
+        scores = dict(ranked)
+        result = await db.execute(select(Book).where(Book.id.in_(scores)))
+        books = {book.id: book for book in result.scalars().all()}
+        return [
+            TopBook(**BookResponse.model_validate(books[book_id]).model_dump(), score=score)
+            for book_id, score in ranked
+            if book_id in books
+        ]
+
+    # Cached briefly: rankings move with every review, book details only on update
+    entry = await cache.get_or_load_entry(
+        f"{by}:{limit}", load_top_books, expire=settings.LEADERBOARD_CACHE_TTL, namespace="books:top"
+    )
+    return await cached_response(request, entry)
+
+@router.get("/search", response_model=List[BookSearchResult])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in title, author, description or review comments"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search books, most relevant first"""
+    # Served from the full-text index, never by scanning the books table
+    hits = await search_index.search(db, q, skip, limit)
+    return [{**BookResponse.model_validate(book).model_dump(), "rank": rank} for book, rank in hits]
+
+@router.get("/batch", response_model=List[BookBatchItem])
+async def get_books_batch(
+    ids: str = Query(..., description="Comma-separated book ids, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get many books by ID, in the order requested"""
+    try:
+        book_ids = parse_ids(ids, settings.BATCH_MAX_IDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One cache round trip and at most one database query for the whole batch
+    books = await fetch_by_ids(db, Book, BookResponse, book_ids, "book")
+    return [
+        {"id": book_id, "book": books[book_id]} if books[book_id] else {"id": book_id, "detail": "Book not found"}
+        for book_id in book_ids
+    ]
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_books(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    stats: bool = Query(False, description="Include review count, average rating and rating histogram"),
+):
+    """Stream the whole catalog as NDJSON or CSV"""
+    # Rows are fetched and written one batch at a time, so memory stays flat
+    return StreamingResponse(
+        stream_export(format, stats),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'},
+    )
 
 @router.get("/{book_id}", response_model=BookResponse)
-async def get_book(book_id: int, db: Session = Depends(get_db)):
+async def get_book(book_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Get a specific book by ID"""
-    # Try cache first
-    cache_key = f"book:{book_id}"
-    cached_book = cache.get(cache_key)
-    
-    if cached_book is not None:
-        return cached_book
-    
-    # Fetch from database
-    book = db.query(Book).filter(Book.id == book_id).first()
-    
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    book_response = BookResponse.model_validate(book)
-    
-    # Cache the result
-    cache.set(cache_key, book_response.model_dump(), expire=300)
-    
-    return book_response
+    async def load_book():
+        # Fetch from database
+        book = await db.get(Book, book_id)
+        
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        
+        return BookResponse.model_validate(book)
+
+    entry = await cache.get_or_load_entry(f"book:{book_id}", load_book, expire=300)
+    return await cached_response(request, entry)
 
 @router.get("/{book_id}/reviews", response_model=BookWithReviews)
-async def get_book_with_reviews(book_id: int, db: Session = Depends(get_db)):
-    """Get a book with all its reviews"""
-    # Try cache first
-    cache_key = f"book:reviews:{book_id}"
-    cached_data = cache.get(cache_key)
-    
-    if cached_data is not None:
-        return cached_data
-    
-    # Fetch from database with reviews
-    book = db.query(Book).filter(Book.id == book_id).first()
-    
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    book_with_reviews = BookWithReviews.model_validate(book)
-    
-    # Cache the result
-    cache.set(cache_key, book_with_reviews.model_dump(), expire=300)
-    
-    return book_with_reviews
+async def get_book_with_reviews(
+    book_id: int,
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        None,
+        description="Keyset cursor from a previous response's next_cursor. "
+                    "When given, skip is ignored.",
+    ),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get a book with one page of its reviews and the total review count"""
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        skip = 0
+
+    async def load_book_with_reviews():
+        # The book (with its review count) and the requested page of reviews come
+        # back from a single query: one row per review, or one row with no review
+        page = select(Review).where(Review.book_id == book_id).order_by(Review.id)
+        if after_id is not None:
+            page = page.where(Review.id > after_id)
+        page = page.offset(skip).limit(limit + 1).subquery()
+        page_review = aliased(Review, page)
+        result = await db.execute(
+            select(Book, page_review)
+            .outerjoin(page, true())
+            .where(Book.id == book_id)
+            .order_by(page.c.id)
+        )
+        rows = result.all()
+        
+        if not rows:
+            raise HTTPException(status_code=404, detail="Book not found")
+        
+        book = rows[0][0]
+        reviews_page = keyset_page([review for _, review in rows if review is not None], limit, ReviewResponse)
+        return BookWithReviews(
+            **BookResponse.model_validate(book).model_dump(),
+            reviews=reviews_page["items"],
+            review_total=book.review_count,
+            next_cursor=reviews_page["next_cursor"],
+        )
+
+    entry = await cache.get_or_load_entry(
+        f"{skip}:{after_id}:{limit}", load_book_with_reviews, expire=300, namespace=f"book:reviews:{book_id}"
+    )
+    return await cached_response(request, entry)
 
 @router.post("/", response_model=BookResponse, status_code=201)
-async def create_book(book: BookCreate, db: Session = Depends(get_db)):
+async def create_book(book: BookCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """Create a new book"""
     # Validate ISBN format
     if book.isbn and not validate_isbn(book.isbn):
@@ -94,26 +232,105 @@ async def create_book(book: BookCreate, db: Session = Depends(get_db)):
     
     # Check if ISBN already exists
     if book.isbn:
-        existing_book = db.query(Book).filter(Book.isbn == book.isbn).first()
+        existing_book = await db.scalar(select(Book).where(Book.isbn == book.isbn))
         if existing_book:
             raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
     
     # Create new book
     db_book = Book(**book.model_dump())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    # Retire every cached list page, recorded in the same transaction and applied after the response
+    outbox.invalidate(db, namespaces=("books:list",))
+    await db.commit()
+    await db.refresh(db_book)
+    background_tasks.add_task(outbox.drain)
     
-    # Clear cache patterns that might be affected
-    cache.clear_pattern("books:list:*")
+    await search_index.refresh(db, db_book.id)
     
     return BookResponse.model_validate(db_book)
 
+@router.post("/bulk", response_class=BulkResultResponse)
+async def bulk_import_books(request: Request, background_tasks: BackgroundTasks):
+    """Import books from a streamed NDJSON or CSV upload.
+
+    Rows are validated like create_book and inserted in batches; the response
+    streams one line per rejected row and a final summary.
+    """
+    format = upload_format(request)
+    if format is None:
+        raise HTTPException(status_code=415, detail="Upload application/x-ndjson or text/csv")
+
+    async def insert_batch(batch):
+        # One multi-row INSERT per batch; rows whose ISBN already exists are skipped
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                insert_ignoring_conflicts(db, Book, [row for _, row in batch], ["isbn"]).returning(Book.id, Book.isbn)
+            )
+            created = result.all()
+            # Retire every cached list page once for the whole batch
+            if created:
+                outbox.invalidate(db, namespaces=("books:list",))
+            await db.commit()
+            await search_index.refresh_many(db, [book_id for book_id, _ in created])
+
+        created_isbns = {isbn for _, isbn in created}
+        conflicts = [number for number, row in batch if row["isbn"] and row["isbn"] not in created_isbns]
+        return len(created), conflicts
+
+    async def import_books():
+        totals = {"inserted": 0, "failed": 0}
+        batch, batch_isbns = [], set()
+
+        async def flush():
+            created, conflicts = await insert_batch(batch)
+            totals["inserted"] += created
+            totals["failed"] += len(conflicts)
+            batch.clear()
+            batch_isbns.clear()
+            return [report_line(line=number, error="Book with this ISBN already exists") for number in conflicts]
+
+        try:
+            async for number, record in read_records(request, format):
+                try:
+                    book = parse_record(BookCreate, record)
+                    if book.isbn and not validate_isbn(book.isbn):
+                        raise BulkRowError("Invalid ISBN format")
+                    if not validate_year(book.publication_year):
+                        raise BulkRowError("Invalid publication year")
+                    if book.isbn and book.isbn in batch_isbns:
+                        raise BulkRowError("Book with this ISBN already exists")
+                except BulkRowError as e:
+                    totals["failed"] += 1
+                    yield report_line(line=number, error=str(e))
+                    continue
+
+                batch.append((number, book.model_dump()))
+                if book.isbn:
+                    batch_isbns.add(book.isbn)
+                if len(batch) >= settings.BULK_BATCH_SIZE:
+                    for line in await flush():
+                        yield line
+            if batch:
+                for line in await flush():
+                    yield line
+        except SQLAlchemyError:
+            # Batches already committed stay imported
+            logger.exception("Bulk book import aborted")
+            yield report_line(error="Import aborted: database error", **totals)
+            return
+
+        yield report_line(**totals)
+
+    background_tasks.add_task(outbox.drain)
+    return BulkResultResponse(import_books())
+
 @router.put("/{book_id}", response_model=BookResponse)
-async def update_book(book_id: int, book_update: BookUpdate, db: Session = Depends(get_db)):
+async def update_book(
+    book_id: int, book_update: BookUpdate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)
+):
     """Update a book"""
     # Find the book
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
@@ -128,7 +345,7 @@ async def update_book(book_id: int, book_update: BookUpdate, db: Session = Depen
     
     # Check if new ISBN already exists (and it's different from current)
     if book_update.isbn and book_update.isbn != db_book.isbn:
-        existing_book = db.query(Book).filter(Book.isbn == book_update.isbn).first()
+        existing_book = await db.scalar(select(Book).where(Book.isbn == book_update.isbn))
         if existing_book:
             raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
     
@@ -137,32 +354,37 @@ async def update_book(book_id: int, book_update: BookUpdate, db: Session = Depen
     for field, value in update_data.items():
         setattr(db_book, field, value)
     
-    db.commit()
-    db.refresh(db_book)
+    # Clear relevant cache entries in one round trip once committed
+    outbox.invalidate(db, f"book:{book_id}", namespaces=("books:list", "books:top", f"book:reviews:{book_id}"))
+    await db.commit()
+    await db.refresh(db_book)
+    background_tasks.add_task(outbox.drain)
     
-    # Clear relevant cache entries
-    cache.delete(f"book:{book_id}")
-    cache.delete(f"book:reviews:{book_id}")
-    cache.clear_pattern("books:list:*")
+    await search_index.refresh(db, book_id)
     
     return BookResponse.model_validate(db_book)
 
 @router.delete("/{book_id}", status_code=204)
-async def delete_book(book_id: int, db: Session = Depends(get_db)):
+async def delete_book(book_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """Delete a book"""
     # Find the book
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
     
     # Delete the book (reviews will be deleted automatically due to cascade)
-    db.delete(db_book)
-    db.commit()
-    
-    # Clear relevant cache entries
-    cache.delete(f"book:{book_id}")
-    cache.delete(f"book:reviews:{book_id}")
-    cache.clear_pattern("books:list:*")
+    await db.delete(db_book)
+    # Clear relevant cache entries in one round trip and drop the book from the rankings once committed
+    outbox.invalidate(
+        db,
+        f"book:{book_id}",
+        namespaces=("books:list", "books:top", f"book:reviews:{book_id}", f"reviews:book:{book_id}"),
+    )
+    outbox.remove_book(db, book_id)
+    await db.commit()
+    background_tasks.add_task(outbox.drain)
+    
+    await search_index.refresh(db, book_id)
     
     return None
\ No newline at end of file
@@ -1,60 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 
-from app.database import get_db
+from app.config import settings
+from app.database import AsyncSessionLocal, get_db, get_read_db
 from app.models import Book, Review
-from app.schemas import ReviewCreate, ReviewUpdate, ReviewResponse
+from app.schemas import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewPage, ReviewBatchItem
+from app.utils.aggregates import apply_review_change, apply_review_ratings
+from app.utils.batch import fetch_by_ids, parse_ids
+from app.utils.bulk import BulkResultResponse, BulkRowError, parse_record, read_records, report_line, upload_format
 from app.utils.cache import cache
+from app.utils.conditional import cached_response
+from app.utils.outbox import outbox
+from app.utils.pagination import decode_cursor, keyset_page
+from app.utils.search import search_index
 from app.utils.validation import validate_rating
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-@router.get("/{book_id}/reviews", response_model=List[ReviewResponse])
+@router.get("/{book_id}/reviews", response_model=Union[List[ReviewResponse], ReviewPage])
 async def get_reviews_for_book(
     book_id: int,
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(
+        None,
+        description="Keyset cursor from a previous page's next_cursor (empty for the first page). "
+                    "When given, skip is ignored and a page with next_cursor is returned.",
+    ),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all reviews for a specific book with pagination"""
-    # Check if book exists
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    # Try cache first
-    cache_key = f"reviews:book:{book_id}:{skip}:{limit}"
-    cached_reviews = cache.get(cache_key)
-    
-    if cached_reviews is not None:
-        return cached_reviews
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        async def load_page():
+            # Check if book exists
+            book = await db.get(Book, book_id)
+            if not book:
+                raise HTTPException(status_code=404, detail="Book not found")
+
+            # Seek on the (book_id, id) index instead of scanning `skip` rows
+            query = select(Review).where(Review.book_id == book_id).order_by(Review.id).limit(limit + 1)
+            if after_id is not None:
+                query = query.where(Review.id > after_id)
+            result = await db.execute(query)
+            return keyset_page(result.scalars().all(), limit, ReviewResponse)
+
+        entry = await cache.get_or_load_entry(
+            f"after:{after_id}:{limit}", load_page, expire=300, namespace=f"reviews:book:{book_id}"
+        )
+        return await cached_response(request, entry)
+
+    async def load_reviews():
+        # Check if book exists
+        book = await db.get(Book, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        
+        # Fetch from database
+        result = await db.execute(
+            select(Review)
+            .where(Review.book_id == book_id)
+            .order_by(Review.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        reviews = result.scalars().all()
+        
+        return [ReviewResponse.model_validate(review) for review in reviews]
     
-    # Fetch from database
-    reviews = (
-        db.query(Review)
-        .filter(Review.book_id == book_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
+    # Serve the cached bytes (or a 304 from their validators); concurrent misses share one database load
+    entry = await cache.get_or_load_entry(
+        f"{skip}:{limit}", load_reviews, expire=300, namespace=f"reviews:book:{book_id}"
     )
-    
-    review_responses = [ReviewResponse.model_validate(review) for review in reviews]
-    
-    # Cache the result
-    cache.set(cache_key, [review.model_dump() for review in review_responses], expire=300)
-    
-    return review_responses
+    return await cached_response(request, entry)
 
 @router.post("/{book_id}/reviews", response_model=ReviewResponse, status_code=201)
 async def create_review(
     book_id: int,
     review: ReviewCreate,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new review for a book"""
     # Check if book exists
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
@@ -62,50 +102,137 @@ async def create_review(
     if not validate_rating(review.rating):
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
     
-    # Create new review
+    # Create new review and fold it into the book's aggregates in the same transaction
     db_review = Review(**review.model_dump(), book_id=book_id)
     db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
+    await apply_review_change(db, book_id, added=db_review.rating)
+    # Clear relevant cache entries in one round trip (book payloads carry the aggregates)
+    # and rescore the book, once committed
+    outbox.invalidate(
+        db,
+        f"book:{book_id}",
+        namespaces=("books:list", f"book:reviews:{book_id}", f"reviews:book:{book_id}"),
+    )
+    outbox.record_ratings(db, book_id, added=[db_review.rating])
+    await db.commit()
+    await db.refresh(db_review)
+    background_tasks.add_task(outbox.drain)
     
-    # Clear relevant cache entries
-    cache.clear_pattern(f"reviews:book:{book_id}:*")
-    cache.delete(f"book:reviews:{book_id}")
+    await search_index.refresh(db, book_id)
     
     return ReviewResponse.model_validate(db_review)
 
+@router.post("/{book_id}/reviews/bulk", response_class=BulkResultResponse)
+async def bulk_import_reviews(
+    book_id: int, request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)
+):
+    """Import reviews for a book from a streamed NDJSON or CSV upload.
+
+    Rows are validated like create_review and inserted in batches; the response
+    streams one line per rejected row and a final summary.
+    """
+    format = upload_format(request)
+    if format is None:
+        raise HTTPException(status_code=415, detail="Upload application/x-ndjson or text/csv")
+
+    # Check if book exists
+    book = await db.get(Book, book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    async def insert_batch(rows):
+        # One multi-row INSERT per batch, with the aggregates folded in the same transaction
+        ratings = [row["rating"] for row in rows]
+        async with AsyncSessionLocal() as batch_db:
+            await batch_db.execute(insert(Review).values([{**row, "book_id": book_id} for row in rows]))
+            await apply_review_ratings(batch_db, book_id, added=ratings)
+            # Clear relevant cache entries and rescore the book once for the whole batch
+            outbox.invalidate(
+                batch_db,
+                f"book:{book_id}",
+                namespaces=("books:list", f"book:reviews:{book_id}", f"reviews:book:{book_id}"),
+            )
+            outbox.record_ratings(batch_db, book_id, added=ratings)
+            await batch_db.commit()
+            await search_index.refresh(batch_db, book_id)
+
+    async def import_reviews():
+        totals = {"inserted": 0, "failed": 0}
+        batch = []
+        try:
+            async for number, record in read_records(request, format):
+                try:
+                    review = parse_record(ReviewCreate, record)
+                    if not validate_rating(review.rating):
+                        raise BulkRowError("Rating must be between 1 and 5")
+                except BulkRowError as e:
+                    totals["failed"] += 1
+                    yield report_line(line=number, error=str(e))
+                    continue
+
+                batch.append(review.model_dump())
+                if len(batch) >= settings.BULK_BATCH_SIZE:
+                    await insert_batch(batch)
+                    totals["inserted"] += len(batch)
+                    batch = []
+            if batch:
+                await insert_batch(batch)
+                totals["inserted"] += len(batch)
+        except SQLAlchemyError:
+            # Batches already committed stay imported
+            logger.exception("Bulk review import aborted")
+            yield report_line(error="Import aborted: database error", **totals)
+            return
+
+        yield report_line(**totals)
+
+    background_tasks.add_task(outbox.drain)
+    return BulkResultResponse(import_reviews())
+
+@router.get("/reviews/batch", response_model=List[ReviewBatchItem])
+async def get_reviews_batch(
+    ids: str = Query(..., description="Comma-separated review ids, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get many reviews by ID, in the order requested"""
+    try:
+        review_ids = parse_ids(ids, settings.BATCH_MAX_IDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One cache round trip and at most one database query for the whole batch
+    reviews = await fetch_by_ids(db, Review, ReviewResponse, review_ids, "review")
+    return [
+        {"id": review_id, "review": reviews[review_id]} if reviews[review_id]
+        else {"id": review_id, "detail": "Review not found"}
+        for review_id in review_ids
+    ]
+
 @router.get("/reviews/{review_id}", response_model=ReviewResponse)
-async def get_review(review_id: int, db: Session = Depends(get_db)):
+async def get_review(review_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Get a specific review by ID"""
-    # Try cache first
-    cache_key = f"review:{review_id}"
-    cached_review = cache.get(cache_key)
+    async def load_review():
+        # Fetch from database
+        review = await db.get(Review, review_id)
+        
+        if not review:
+            raise HTTPException(status_code=404, detail="Review not found")
+        
+        return ReviewResponse.model_validate(review)
     
-    if cached_review is not None:
-        return cached_review
-    
-    # Fetch from database
-    review = db.query(Review).filter(Review.id == review_id).first()
-    
-    if not review:
-        raise HTTPException(status_code=404, detail="Review not found")
-    
-    review_response = ReviewResponse.model_validate(review)
-    
-    # Cache the result
-    cache.set(cache_key, review_response.model_dump(), expire=300)
-    
-    return review_response
+    entry = await cache.get_or_load_entry(f"review:{review_id}", load_review, expire=300)
+    return await cached_response(request, entry)
 
 @router.put("/reviews/{review_id}", response_model=ReviewResponse)
 async def update_review(
     review_id: int,
     review_update: ReviewUpdate,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a review"""
-    # Find the review
-    db_review = db.query(Review).filter(Review.id == review_id).first()
+    # Find the review, locking it so concurrent rating changes adjust the aggregates in turn
+    db_review = await db.get(Review, review_id, with_for_update=True)
     
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
@@ -115,38 +242,55 @@ async def update_review(
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
     
     # Update fields
+    old_rating = db_review.rating
     update_data = review_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_review, field, value)
     
-    db.commit()
-    db.refresh(db_review)
+    if db_review.rating != old_rating:
+        await apply_review_change(db, db_review.book_id, added=db_review.rating, removed=old_rating)
+        outbox.record_ratings(db, db_review.book_id, added=[db_review.rating], removed=[old_rating])
+    # Clear relevant cache entries in one round trip once committed
+    outbox.invalidate(
+        db,
+        f"review:{review_id}",
+        f"book:{db_review.book_id}",
+        namespaces=("books:list", f"book:reviews:{db_review.book_id}", f"reviews:book:{db_review.book_id}"),
+    )
+    await db.commit()
+    await db.refresh(db_review)
+    background_tasks.add_task(outbox.drain)
     
-    # Clear relevant cache entries
-    cache.delete(f"review:{review_id}")
-    cache.clear_pattern(f"reviews:book:{db_review.book_id}:*")
-    cache.delete(f"book:reviews:{db_review.book_id}")
+    if "comment" in update_data:
+        await search_index.refresh(db, db_review.book_id)
     
     return ReviewResponse.model_validate(db_review)
 
 @router.delete("/reviews/{review_id}", status_code=204)
-async def delete_review(review_id: int, db: Session = Depends(get_db)):
+async def delete_review(review_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """Delete a review"""
     # Find the review
-    db_review = db.query(Review).filter(Review.id == review_id).first()
+    db_review = await db.get(Review, review_id, with_for_update=True)
     
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     
     book_id = db_review.book_id
     
-    # Delete the review
-    db.delete(db_review)
-    db.commit()
+    # Delete the review and take it out of the book's aggregates
+    await db.delete(db_review)
+    await apply_review_change(db, book_id, removed=db_review.rating)
+    # Clear relevant cache entries in one round trip and rescore the book once committed
+    outbox.invalidate(
+        db,
+        f"review:{review_id}",
+        f"book:{book_id}",
+        namespaces=("books:list", f"book:reviews:{book_id}", f"reviews:book:{book_id}"),
+    )
+    outbox.record_ratings(db, book_id, removed=[db_review.rating])
+    await db.commit()
+    background_tasks.add_task(outbox.drain)
     
-    # Clear relevant cache entries
-    cache.delete(f"review:{review_id}")
-    cache.clear_pattern(f"reviews:book:{book_id}:*")
-    cache.delete(f"book:reviews:{book_id}")
+    await search_index.refresh(db, book_id)
     
     return None
\ No newline at end of file
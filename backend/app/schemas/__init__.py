@@ -1,7 +1,10 @@
-from .book import BookCreate, BookUpdate, BookResponse, BookWithReviews
-from .review import ReviewCreate, ReviewUpdate, ReviewResponse
+from .book import (
+    BookCreate, BookUpdate, BookResponse, BookPage, BookBatchItem, BookSearchResult, BookWithReviews, TopBook
+)
+from .review import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewPage, ReviewBatchItem
 
 __all__ = [
-    "BookCreate", "BookUpdate", "BookResponse", "BookWithReviews",
-    "ReviewCreate", "ReviewUpdate", "ReviewResponse"
+    "BookCreate", "BookUpdate", "BookResponse", "BookPage", "BookBatchItem", "BookSearchResult", "BookWithReviews",
+    "TopBook",
+    "ReviewCreate", "ReviewUpdate", "ReviewResponse", "ReviewPage", "ReviewBatchItem"
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class BookBase(BaseModel):
@@ -23,12 +23,36 @@ class BookResponse(BookBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    review_count: int = 0
+    average_rating: Optional[float] = None
+    rating_histogram: Dict[int, int] = {}
     
     class Config:
         from_attributes = True
 
+class BookPage(BaseModel):
+    items: List[BookResponse]
+    next_cursor: Optional[str] = None
+
+class TopBook(BookResponse):
+    # Ranking score: review count, or Bayesian average rating
+    score: float
+
+class BookSearchResult(BookResponse):
+    # Relevance to the query, higher is better
+    rank: float
+
+class BookBatchItem(BaseModel):
+    # One requested id: the book, or a detail saying why it is missing
+    id: int
+    book: Optional[BookResponse] = None
+    detail: Optional[str] = None
+
 class BookWithReviews(BookResponse):
     reviews: List['ReviewResponse'] = []
+    # Reviews are embedded one page at a time; these let clients page through the rest
+    review_total: int = 0
+    next_cursor: Optional[str] = None
     
     class Config:
         from_attributes = True
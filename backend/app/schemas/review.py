@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 class ReviewBase(BaseModel):
@@ -22,4 +22,14 @@ class ReviewResponse(ReviewBase):
     updated_at: Optional[datetime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ReviewPage(BaseModel):
+    items: List[ReviewResponse]
+    next_cursor: Optional[str] = None
+
+class ReviewBatchItem(BaseModel):
+    # One requested id: the review, or a detail saying why it is missing
+    id: int
+    review: Optional[ReviewResponse] = None
+    detail: Optional[str] = None
\ No newline at end of file
@@ -1,51 +1,298 @@
+import argparse
+import asyncio
+import io
+import math
+import multiprocessing
 import os
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from app.database.connection import SessionLocal
-from app.models import Book
-from app.models import Review
-
-# Only seed if there are no books
-
-def seed():
-    db: Session = SessionLocal()
-    if db.query(Book).count() > 0:
-        print("Seed: Books already exist, skipping seeding.")
-        db.close()
-        return
-
-    # Create 3 books
-    books = [
-        Book(title="The Pragmatic Programmer", author="Andrew Hunt", isbn="9780201616224", description="A classic book for software engineers."),
-        Book(title="Clean Code", author="Robert C. Martin", isbn="9780132350884", description="A handbook of agile software craftsmanship."),
-        Book(title="Deep Work", author="Cal Newport", isbn="9781455586691", description="Rules for focused success in a distracted world."),
-    ]
-    db.add_all(books)
-    db.commit()
-    db.refresh(books[0])
-    db.refresh(books[1])
-    db.refresh(books[2])
-    print(f"Book IDs: {[b.id for b in books]}")
-
-    # Add 2-3 reviews for each book
-    reviews = [
-        Review(book_id=books[0].id, reviewer_name="Alice", rating=5, comment="Must-read for every developer!"),
-        Review(book_id=books[0].id, reviewer_name="Bob", rating=4, comment="Great insights, a bit dated in parts."),
-        Review(book_id=books[1].id, reviewer_name="Charlie", rating=5, comment="Changed how I write code."),
-        Review(book_id=books[1].id, reviewer_name="Dana", rating=4, comment="Very useful, but dense."),
-        Review(book_id=books[1].id, reviewer_name="Eve", rating=5, comment="A must for clean code practices."),
-        Review(book_id=books[2].id, reviewer_name="Frank", rating=5, comment="Life-changing productivity advice."),
-        Review(book_id=books[2].id, reviewer_name="Grace", rating=4, comment="Good, but repetitive."),
-    ]
-    try:
-        db.add_all(reviews)
-        db.commit()
-        print(f"Seed: Added {len(reviews)} reviews.")
-    except SQLAlchemyError as e:
-        db.rollback()
-        print(f"Error inserting reviews: {e}")
-    finally:
-        db.close()
+import random
+import time
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from itertools import accumulate
+from typing import Callable, List, NamedTuple, Set, Tuple
+from sqlalchemy import distinct, func, insert, select, text
+from app.config import settings
+from app.database.connection import engine
+from app.models import Book, Review
+from app.reconcile import rebuild_leaderboard
+from app.utils.aggregates import recount_statement
+
+# Load a deterministic synthetic dataset: N books and M reviews spread over them
+# with a Zipf skew. Rows are generated per batch from (seed, table, batch number),
+# so any batch can be regenerated exactly. Ids are explicit (1..N and 1..M) and
+# each batch commits in one transaction, so a batch is either all there or not
+# at all: an interrupted run resumes by loading only the missing batches, and
+# a finished one has nothing left to do. A database holding anything else is
+# left alone.
+
+BATCH_SIZE = 10_000
+
+BOOK_COLUMNS = ("id", "title", "author", "isbn", "description", "publication_year", "created_at")
+REVIEW_COLUMNS = ("id", "book_id", "reviewer_name", "rating", "comment", "created_at")
+
+# Timestamps are spread over a fixed window so the data does not depend on when it is generated
+START = datetime(2019, 1, 1, tzinfo=timezone.utc)
+SPAN = (datetime(2026, 1, 1, tzinfo=timezone.utc) - START).total_seconds()
+
+FIRST_NAMES = (
+    "Alice", "Bob", "Charlie", "Dana", "Eve", "Frank", "Grace", "Hana", "Ivan", "Julia", "Kenji", "Laura",
+    "Mateo", "Nadia", "Oscar", "Priya", "Quinn", "Rosa", "Samir", "Tara", "Umar", "Vera", "Wei", "Ximena",
+    "Yusuf", "Zoe", "Amara", "Bruno", "Chloe", "Diego", "Elif", "Farah", "Gustav", "Ines", "Jonas", "Kira",
+)
+LAST_NAMES = (
+    "Anderson", "Baker", "Castillo", "Dubois", "Eriksen", "Fischer", "Garcia", "Hughes", "Ito", "Jensen",
+    "Kowalski", "Larsen", "Moreau", "Nakamura", "Okafor", "Petrov", "Quintero", "Rossi", "Schmidt", "Tanaka",
+    "Urban", "Varga", "Walsh", "Xu", "Yilmaz", "Zimmermann", "Adeyemi", "Bianchi", "Cohen", "Novak",
+)
+REVIEWERS = tuple(f"{first} {last[0]}." for first in FIRST_NAMES for last in LAST_NAMES)
+TITLE_WORDS = (
+    "silent", "river", "empire", "garden", "shadow", "winter", "code", "machine", "ocean", "letters", "night",
+    "city", "forgotten", "house", "glass", "stars", "journey", "light", "stone", "memory", "fire", "island",
+    "clock", "salt", "wolves", "mountain", "paper", "storm", "kingdom", "secret", "engine", "harbor", "dust",
+    "lantern", "orchard", "mirror", "thread", "crown", "signal", "atlas", "bridge", "echo", "field", "vault",
+)
+WORDS = (
+    "the", "a", "book", "story", "author", "chapter", "plot", "characters", "writing", "pace", "ending", "really",
+    "quite", "very", "not", "never", "always", "read", "loved", "enjoyed", "expected", "found", "felt", "was",
+    "is", "and", "but", "with", "slow", "gripping", "dull", "brilliant", "clever", "predictable", "moving",
+    "funny", "dense", "clear", "first", "second", "half", "middle", "world", "ideas", "examples", "advice",
+    "prose", "dialogue", "twist", "style", "recommend", "friends", "again", "worth", "time", "pages", "too",
+    "long", "short", "of", "in", "it", "this", "that", "for", "me", "my", "every", "some", "parts", "overall",
+)
+# Descriptions and comments are made of sentences drawn from a fixed pool, which keeps
+# generation cheap. None of them contain tabs, newlines or backslashes, so rows go
+# into COPY's text format without escaping.
+SENTENCES = tuple(
+    " ".join(random.Random(number).choices(WORDS, k=random.Random(-number).randint(6, 18))).capitalize() + "."
+    for number in range(2048)
+)
+
+NO_DESCRIPTION_SHARE = 0.1
+NO_COMMENT_SHARE = 0.15
+# Most comments are a few sentences, with a long tail of essays
+COMMENT_SENTENCES_MEAN = 3.0
+COMMENT_SENTENCES_MAX = 40
+
+# Share of 1..5 star ratings overall (the usual J shape), tilted per book
+# towards its end of the scale so some books are loved and some panned
+RATING_SHARES = (0.10, 0.07, 0.12, 0.26, 0.45)
+
+def _rating_weights(tilt: float) -> List[float]:
+    return list(accumulate(share * math.exp(tilt * (stars - 3)) for stars, share in enumerate(RATING_SHARES, 1)))
+
+RATING_WEIGHTS = [_rating_weights((bucket - 5) / 5) for bucket in range(11)]
+
+class Plan(NamedTuple):
+    """What to generate; the same plan always produces the same rows"""
+    books: int
+    reviews: int
+    seed: int
+    zipf: float
+
+def isbn13(number: int) -> str:
+    digits = f"978{number:09d}"
+    check = -sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits)) % 10
+    return f"{digits}{check}"
+
+def timestamp(position: int, total: int) -> datetime:
+    return START + timedelta(seconds=SPAN * position / (total + 1))
+
+def batch_ids(batch: int, total: int) -> range:
+    return range(batch * BATCH_SIZE + 1, min((batch + 1) * BATCH_SIZE, total) + 1)
+
+def book_rows(plan: Plan, batch: int) -> List[tuple]:
+    rng = random.Random(f"{plan.seed}:books:{batch}")
+    rows = []
+    for book_id in batch_ids(batch, plan.books):
+        title = " ".join(rng.choices(TITLE_WORDS, k=rng.randint(1, 5))).title()
+        if rng.random() < 0.3:
+            title = f"The {title}"
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        description = None
+        if rng.random() >= NO_DESCRIPTION_SHARE:
+            description = " ".join(rng.choices(SENTENCES, k=rng.randint(1, 6)))
+        year = max(2025 - int(rng.expovariate(1 / 15)), 1800)
+        rows.append((book_id, title, author, isbn13(book_id), description, year, timestamp(book_id, plan.books)))
+    return rows
+
+@lru_cache(maxsize=None)
+def popularity(plan: Plan) -> Tuple[List[int], List[float]]:
+    """Book ids from most to least reviewed, with the cumulative Zipf weights of their ranks"""
+    ranked = list(range(1, plan.books + 1))
+    random.Random(f"{plan.seed}:popularity").shuffle(ranked)
+    return ranked, list(accumulate(rank ** -plan.zipf for rank in range(1, plan.books + 1)))
+
+def review_rows(plan: Plan, batch: int) -> List[tuple]:
+    rng = random.Random(f"{plan.seed}:reviews:{batch}")
+    ids = batch_ids(batch, plan.reviews)
+    ranked, weights = popularity(plan)
+    book_ids = rng.choices(ranked, cum_weights=weights, k=len(ids))
+    reviewers = rng.choices(REVIEWERS, k=len(ids))
+    rows = []
+    for review_id, book_id, reviewer in zip(ids, book_ids, reviewers):
+        tilt = RATING_WEIGHTS[book_id * 2654435761 % len(RATING_WEIGHTS)]
+        rating = bisect(tilt, rng.random() * tilt[-1]) + 1
+        comment = None
+        if rng.random() >= NO_COMMENT_SHARE:
+            sentences = min(1 + int(rng.expovariate(1 / COMMENT_SENTENCES_MEAN)), COMMENT_SENTENCES_MAX)
+            comment = " ".join(rng.choices(SENTENCES, k=sentences))
+        # Reviews come in id order, but never before their book
+        offset = SPAN * max(review_id / (plan.reviews + 1), book_id / (plan.books + 1))
+        rows.append((review_id, book_id, reviewer, rating, comment, START + timedelta(seconds=offset)))
+    return rows
+
+TABLES = {
+    "books": (Book, BOOK_COLUMNS, book_rows),
+    "reviews": (Review, REVIEW_COLUMNS, review_rows),
+}
+REVIEWS_FOREIGN_KEY = "reviews_book_id_fkey"
+
+def load_batch(table: str, plan: Plan, batch: int) -> int:
+    """Generate one batch and insert it in a single transaction; returns the rows loaded"""
+    model, columns, generate = TABLES[table]
+    rows = generate(plan, batch)
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            data = io.StringIO("".join(
+                "\t".join("\\N" if value is None else str(value) for value in row) + "\n" for row in rows
+            ))
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", data)
+        else:
+            conn.execute(insert(model.__table__), [dict(zip(columns, row)) for row in rows])
+    return len(rows)
+
+def missing_batches(model, total: int) -> List[int]:
+    """Batches of ids 1..total with no rows in the table"""
+    with engine.connect() as conn:
+        loaded: Set[int] = set(conn.scalars(select(distinct((model.id - 1) // BATCH_SIZE)).where(model.id <= total)))
+    return [batch for batch in range(math.ceil(total / BATCH_SIZE)) if batch not in loaded]
+
+def matches_existing(plan: Plan) -> bool:
+    """Whether the rows already in the database (if any) are this plan's"""
+    checks = ((Book, book_rows, plan.books, ("title", "author", "isbn")),
+              (Review, review_rows, plan.reviews, ("book_id", "reviewer_name", "rating")))
+    for model, generate, total, fields in checks:
+        with engine.connect() as conn:
+            first = conn.execute(
+                select(model.id, *(getattr(model, field) for field in fields)).order_by(model.id).limit(1)
+            ).first()
+        if first is None:
+            continue
+        if first.id > total:
+            return False
+        batch, offset = divmod(first.id - 1, BATCH_SIZE)
+        expected = dict(zip(TABLES[model.__tablename__][1], generate(plan, batch)[offset]))
+        if any(getattr(first, field) != expected[field] for field in fields):
+            return False
+    return True
+
+def finished() -> bool:
+    """Whether the aggregates cover the loaded reviews"""
+    with engine.connect() as conn:
+        reviewed = conn.scalar(select(func.coalesce(func.sum(Book.review_count), 0)))
+        return reviewed == conn.scalar(select(func.count()).select_from(Review))
+
+def bulk_load_mode(enabled: bool):
+    """Postgres: drop the reviews -> books foreign key, or add it back.
+
+    The check is about half the cost of a COPY; adding the key back validates
+    every row in a single pass. Both steps are skipped when already done.
+    """
+    with engine.begin() as conn:
+        if enabled:
+            conn.execute(text(f"ALTER TABLE reviews DROP CONSTRAINT IF EXISTS {REVIEWS_FOREIGN_KEY}"))
+        elif not conn.scalar(
+            text("SELECT count(*) FROM pg_constraint WHERE conrelid = 'reviews'::regclass AND conname = :name"),
+            {"name": REVIEWS_FOREIGN_KEY},
+        ):
+            conn.execute(text(
+                f"ALTER TABLE reviews ADD CONSTRAINT {REVIEWS_FOREIGN_KEY} FOREIGN KEY (book_id) REFERENCES books (id)"
+            ))
+
+def finish(plan: Plan):
+    """Bring sequences and aggregates in line with the loaded rows"""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            for table in TABLES:
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+        conn.execute(recount_statement())
+
+def _forget_inherited_connections():
+    engine.dispose(close=False)
+
+def run_batches(plan: Plan, label: str, task: Callable[[Plan, int], int], batches: List[int], workers: int) -> int:
+    """Run `task` over batches, in worker processes when there are several; returns the rows it handled"""
+    if not batches:
+        return 0
+    started = time.perf_counter()
+    done = 0
+    if workers <= 1:
+        for batch in batches:
+            done += task(plan, batch)
+    else:
+        # Forked workers inherit the popularity table instead of each computing it
+        popularity(plan)
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context(method), initializer=_forget_inherited_connections
+        ) as pool:
+            for future in as_completed([pool.submit(task, plan, batch) for batch in batches]):
+                done += future.result()
+    elapsed = time.perf_counter() - started
+    print(f"Seed: {label} {done} rows in {elapsed:.1f}s ({done / max(elapsed, 1e-9):,.0f} rows/s).")
+    return done
+
+def seed(
+    books: int = settings.SEED_BOOKS,
+    reviews: int = settings.SEED_REVIEWS,
+    random_seed: int = 42,
+    zipf: float = 1.0,
+    workers: int = 1,
+) -> int:
+    """Load whatever part of the dataset is missing; returns how many rows were inserted"""
+    plan = Plan(books, reviews, random_seed, zipf)
+    postgres = engine.dialect.name == "postgresql"
+    if postgres:
+        # Undo the bulk load mode of a run that was killed halfway
+        bulk_load_mode(False)
+    if not matches_existing(plan):
+        print("Seed: database holds other data, skipping seeding.")
+        return 0
+    book_batches = missing_batches(Book, plan.books)
+    review_batches = missing_batches(Review, plan.reviews)
+    if not book_batches and not review_batches and finished():
+        print("Seed: already seeded, skipping.")
+        return 0
+
+    # SQLite has a single writer, so parallel batches would only queue for its lock
+    workers = workers if postgres else 1
+    loaded = 0
+    if book_batches or review_batches:
+        if postgres:
+            bulk_load_mode(True)
+        try:
+            # Reviews reference books, so every book batch is in before the first review batch
+            loaded += run_batches(plan, "loaded books:", partial(load_batch, "books"), book_batches, workers)
+            loaded += run_batches(plan, "loaded reviews:", partial(load_batch, "reviews"), review_batches, workers)
+        finally:
+            if postgres:
+                bulk_load_mode(False)
+    # Last, so a run interrupted before this point is not `finished` yet
+    finish(plan)
+    print(f"Seed: {plan.books} books and {plan.reviews} reviews in place.")
+    return loaded
 
 if __name__ == "__main__":
-    seed()
+    parser = argparse.ArgumentParser(description="Load (or finish loading) a deterministic synthetic dataset")
+    parser.add_argument("--books", type=int, default=settings.SEED_BOOKS)
+    parser.add_argument("--reviews", type=int, default=settings.SEED_REVIEWS)
+    parser.add_argument("--seed", type=int, default=42, help="same seed, same rows")
+    parser.add_argument("--zipf", type=float, default=1.0, help="skew of reviews per book (Zipf exponent)")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="batches loaded in parallel (Postgres only)")
+    args = parser.parse_args()
+    if seed(args.books, args.reviews, args.seed, args.zipf, args.workers):
+        asyncio.run(rebuild_leaderboard())
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database before any app module is imported
+_test_db_path = os.path.join(tempfile.mkdtemp(prefix="book-review-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_test_db_path}"
+
+import asyncio
+
+import pytest
+
+from app.database import Base, AsyncSessionLocal, async_engine
+from app.main import app
+
+async def _reset_schema():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+@pytest.fixture(autouse=True)
+def db_schema():
+    """Give every test an empty schema and no leftover dependency overrides"""
+    from app.utils.search import search_index
+
+    asyncio.run(_reset_schema())
+    search_index.clear()
+    app.dependency_overrides.clear()
+    yield
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def add_rows():
+    """Persist ORM objects through the app's session factory and return them"""
+    def _add(*rows):
+        async def _persist():
+            async with AsyncSessionLocal() as db:
+                db.add_all(rows)
+                await db.commit()
+        asyncio.run(_persist())
+        return rows
+    return _add
+
+@pytest.fixture
+def fake_cache():
+    """Back the global cache with an in-process fake Redis"""
+    import fakeredis
+    from app.utils.cache import cache
+
+    server = fakeredis.FakeServer()
+    asyncio.run(cache.connect(fakeredis.FakeAsyncRedis(server=server)))
+    yield fakeredis.FakeRedis(server=server, decode_responses=True)
+    cache.redis_client = None
+    cache.is_available = False
@@ -0,0 +1,67 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Book
+from app.utils.admission import HIGH, LOW, Limiter, admission, parse_route_limits
+from app.config import settings
+
+client = TestClient(app)
+
+def test_cheap_reads_are_served_first():
+    async def scenario():
+        limiter = Limiter(capacity=1, queue_size=4)
+        assert await limiter.acquire(HIGH, 1) is None
+        order = []
+
+        async def wait(priority, name):
+            if await limiter.acquire(priority, 1) is None:
+                order.append(name)
+                limiter.release()
+
+        waiters = [asyncio.create_task(wait(LOW, "export")), asyncio.create_task(wait(HIGH, "book"))]
+        await asyncio.sleep(0)
+        # Low priority may only fill half of the queue
+        assert limiter.waiting == 2 and await limiter.acquire(LOW, 1) == "queue_full"
+        limiter.release()
+        await asyncio.gather(*waiters)
+        timed_out = await asyncio.gather(limiter.acquire(HIGH, 1), limiter.acquire(HIGH, 0.01))
+        return order, timed_out, limiter.active
+
+    order, timed_out, active = asyncio.run(scenario())
+    assert order == ["book", "export"]
+    assert timed_out == [None, "timeout"]
+    assert active == 1
+
+def test_saturated_route_is_shed_with_retry_after(add_rows, monkeypatch):
+    book, = add_rows(Book(title="Busy", author="Author"))
+    route = f"GET {settings.API_V1_STR}/books/{{book_id}}/reviews"
+    full = Limiter(capacity=0, queue_size=0)
+    monkeypatch.setitem(admission.route_limiters, route, full)
+    monkeypatch.setitem(admission.route_limits, route, 0)
+    rejected = admission.rejected
+
+    response = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews", headers={"Origin": "http://127.0.0.1"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.ADMISSION_RETRY_AFTER)
+    # The browser sees the 503 rather than an opaque CORS error
+    assert "access-control-allow-origin" in response.headers
+    assert admission.rejected == rejected + 1
+    # Other routes still have room, and nothing was left holding a slot
+    assert client.get(f"{settings.API_V1_STR}/books/{book.id}").status_code == 200
+    assert admission.limiter.active == 0
+
+    metrics = client.get("/metrics").text
+    template = f"{settings.API_V1_STR}/books/{{book_id}}/reviews"
+    assert f'admission_rejections_total{{route="{template}",reason="queue_full"}}' in metrics
+    assert f'http_requests_total{{method="GET",route="{template}",status="503"}}' in metrics
+
+def test_health_and_metrics_are_never_shed(monkeypatch):
+    monkeypatch.setattr(admission, "limiter", Limiter(capacity=0, queue_size=0))
+    assert client.get(f"{settings.API_V1_STR}/books").status_code == 503
+    assert client.get("/health").status_code == 200
+    assert client.get("/metrics").status_code == 200
+
+def test_route_limits_parse():
+    assert parse_route_limits("GET /api/v1/books/{book_id}/reviews=16, POST /api/v1/books/bulk=2,") == {
+        "GET /api/v1/books/{book_id}/reviews": 16, "POST /api/v1/books/bulk": 2,
+    }
@@ -0,0 +1,80 @@
+import json
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.database import async_engine
+from app.models import Book, Review
+from app.utils.cache import CacheEntry, cache
+from app.config import settings
+
+client = TestClient(app)
+
+def test_batch_books_one_mget_one_query_one_pipeline(fake_cache, add_rows, monkeypatch):
+    first, second, third = add_rows(*(Book(title=f"Book {i}", author="Author") for i in range(3)))
+    client.get(f"{settings.API_V1_STR}/books/{second.id}")  # already cached
+
+    calls = {"mget": 0, "pipelines": []}
+    original_mget, original_pipeline = cache.redis_client.mget, cache.redis_client.pipeline
+
+    async def counting_mget(*args, **kwargs):
+        calls["mget"] += 1
+        return await original_mget(*args, **kwargs)
+
+    def tracking_pipeline(*args, **kwargs):
+        pipe = original_pipeline(*args, **kwargs)
+        original_execute = pipe.execute
+
+        async def recording_execute(*args, **kwargs):
+            calls["pipelines"].append([command[0][0] for command in pipe.command_stack])
+            return await original_execute(*args, **kwargs)
+
+        pipe.execute = recording_execute
+        return pipe
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    monkeypatch.setattr(cache.redis_client, "mget", counting_mget)
+    monkeypatch.setattr(cache.redis_client, "pipeline", tracking_pipeline)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"{settings.API_V1_STR}/books/batch", params={"ids": f"{third.id},99,{second.id},{first.id},99"})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert [(item["id"], item["book"] and item["book"]["title"], item["detail"]) for item in response.json()] == [
+        (third.id, "Book 2", None),
+        (99, None, "Book not found"),
+        (second.id, "Book 1", None),
+        (first.id, "Book 0", None),
+        (99, None, "Book not found"),
+    ]
+    assert calls["mget"] == 1
+    assert len(statements) == 1 and " IN " in statements[0]
+    assert calls["pipelines"] == [["SETEX", "SETEX"]]
+    assert json.loads(CacheEntry.load(fake_cache.get(f"book:{first.id}").encode()).body)["title"] == "Book 0"
+
+def test_batch_books_without_cache(add_rows):
+    book, = add_rows(Book(title="Only", author="Author"))
+    response = client.get(f"{settings.API_V1_STR}/books/batch", params={"ids": f"{book.id},2"})
+    assert [item["detail"] for item in response.json()] == [None, "Book not found"]
+
+def test_batch_reviews_shares_single_review_cache(fake_cache, add_rows):
+    book, = add_rows(Book(title="Reviewed", author="Author"))
+    review, = add_rows(Review(book_id=book.id, reviewer_name="Alice", rating=5))
+    response = client.get(f"{settings.API_V1_STR}/books/reviews/batch", params={"ids": f"7,{review.id}"})
+    assert [(item["id"], item["review"] and item["review"]["reviewer_name"]) for item in response.json()] == [
+        (7, None), (review.id, "Alice"),
+    ]
+    assert client.get(f"{settings.API_V1_STR}/books/reviews/{review.id}").json()["reviewer_name"] == "Alice"
+    assert fake_cache.exists(f"review:{review.id}") == 1
+
+def test_batch_rejects_bad_id_lists(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_IDS", 3)
+    for ids, detail in (("1,x", "Ids must be comma-separated integers"), (",", "No ids given"),
+                        ("1,2,3,4", "At most 3 ids per request")):
+        response = client.get(f"{settings.API_V1_STR}/books/batch", params={"ids": ids})
+        assert (response.status_code, response.json()["detail"]) == (400, detail)
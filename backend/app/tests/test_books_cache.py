@@ -1,37 +1,28 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from datetime import datetime
+from app.models import Book
 from app.routes import books
-from app.utils.cache import cache
+from app.utils.cache import CacheEntry, cache
 from app.config import settings
 
 client = TestClient(app)
 
-def test_list_books_cache_miss(monkeypatch):
-    # Simulate DB returning a list of books
-    class DummyBook:
-        def __init__(self, id, title):
-            self.id = id
-            self.title = title
-            self.author = "Author"
-            self.isbn = "1234567890"
-            self.description = "desc"
-            self.publication_year = 2024
-            self.created_at = datetime.utcnow()
-            self.updated_at = None
-    class DummyDB:
-        def query(self, model):
-            class DummyQuery:
-                def offset(self, *args, **kwargs):
-                    return self
-                def limit(self, *args, **kwargs):
-                    return self
-                def all(self):
-                    return [DummyBook(1, "Book 1"), DummyBook(2, "Book 2")]
-            return DummyQuery()
-    app.dependency_overrides[books.get_db] = lambda: DummyDB()
-    monkeypatch.setattr(cache, "get", lambda key: None)
+def returns(value):
+    """Async stand-in for a cache lookup that always yields `value`"""
+    async def _get(*args, **kwargs):
+        return value
+    return _get
+
+def test_list_books_cache_miss(monkeypatch, add_rows):
+    # Books only exist in the database
+    add_rows(
+        Book(title="Book 1", author="Author", isbn="1234567890", description="desc", publication_year=2024),
+        Book(title="Book 2", author="Author", isbn="1234567891", description="desc", publication_year=2024),
+    )
+    monkeypatch.setattr(cache, "get_entry", returns(None))
     response = client.get(f"{settings.API_V1_STR}/books")
     assert response.status_code == 200
     data = response.json()
@@ -46,11 +37,63 @@ def test_list_books_cache_hit(monkeypatch):
         {"id": 1, "title": "Book 1", "author": "Author", "isbn": "1234567890", "description": "desc", "publication_year": 2024, "created_at": str(datetime.utcnow()), "updated_at": None},
         {"id": 2, "title": "Book 2", "author": "Author", "isbn": "1234567890", "description": "desc", "publication_year": 2024, "created_at": str(datetime.utcnow()), "updated_at": None}
     ]
-    app.dependency_overrides[books.get_db] = lambda: None  # DB should not be called
-    monkeypatch.setattr(cache, "get", lambda key: cached_books)
+    app.dependency_overrides[books.get_read_db] = lambda: None  # DB should not be called
+    cached_body = json.dumps(cached_books).encode()
+    monkeypatch.setattr(cache, "get_entry", returns(CacheEntry.of(cached_body)))
     response = client.get(f"{settings.API_V1_STR}/books")
     assert response.status_code == 200
+    # Hits are sent exactly as stored, without decoding or re-validation
+    assert response.content == cached_body
     data = response.json()
     assert isinstance(data, list)
     assert len(data) == 2
     assert data[0]["title"] == "Book 1"
+
+
+def test_cold_key_stampede_runs_one_query(fake_cache, add_rows, monkeypatch):
+    import asyncio
+    import httpx
+    from sqlalchemy import event
+    from app.database import async_engine
+    from app.models import Review
+
+    book, = add_rows(Book(title="Popular", author="Author"))
+    add_rows(*(Review(book_id=book.id, reviewer_name=f"R{i}", rating=5) for i in range(3)))
+
+    book_queries = []
+    # 500 at once would be shed by admission control; this is about the cache
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", False)
+
+    def count_book_queries(conn, cursor, statement, parameters, context, executemany):
+        if "FROM books" in statement:
+            book_queries.append(statement)
+
+    async def stampede():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews") for _ in range(500)
+            ))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_book_queries)
+    try:
+        responses = asyncio.run(stampede())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_book_queries)
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(len(r.json()["reviews"]) == 3 for r in responses)
+    assert len(book_queries) == 1
+
+
+def test_stampede_shares_not_found(fake_cache):
+    import asyncio
+    import httpx
+
+    async def stampede():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.get(f"{settings.API_V1_STR}/books/999") for _ in range(20)))
+
+    assert all(r.status_code == 404 for r in asyncio.run(stampede()))
+    assert fake_cache.get("book:999") is None
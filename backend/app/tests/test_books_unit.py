@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from datetime import datetime
+from app.models import Book, Review
 from app.routes import books
 from app.config import settings
 
@@ -9,38 +10,6 @@ client = TestClient(app)
 
 # --- Unit Test: POST /api/v1/books ---
 def test_create_book(monkeypatch):
-    class DummyBook:
-        def __init__(self, **kwargs):
-            self.id = None
-            self.title = kwargs.get("title")
-            self.author = kwargs.get("author")
-            self.isbn = kwargs.get("isbn")
-            self.description = kwargs.get("description")
-            self.publication_year = kwargs.get("publication_year")
-            self.created_at = None
-            self.updated_at = None
-    def mock_commit():
-        pass
-    def mock_refresh(obj):
-        obj.id = 1
-        obj.created_at = datetime.utcnow()
-    def mock_add(obj):
-        pass
-    class DummyDB:
-        def query(self, model):
-            class DummyQuery:
-                def filter(self, *args, **kwargs):
-                    return self
-                def first(self):
-                    return None
-            return DummyQuery()
-        def add(self, obj):
-            mock_add(obj)
-        def commit(self):
-            mock_commit()
-        def refresh(self, obj):
-            mock_refresh(obj)
-    app.dependency_overrides[books.get_db] = lambda: DummyDB()
     app.dependency_overrides[books.validate_isbn] = lambda isbn: True
     app.dependency_overrides[books.validate_year] = lambda year: True
     payload = {
@@ -59,26 +28,123 @@ def test_create_book(monkeypatch):
     assert data["id"] == 1
 
 # --- Unit Test: GET /api/v1/books/{id} ---
-def test_get_book(monkeypatch):
-    from app.schemas.book import BookResponse
-    class DummyBook:
-        id = 1
-        title = "Test Book"
-        author = "Test Author"
-        isbn = "1234567890"
-        description = "desc"
-        publication_year = 2024
-        created_at = datetime.utcnow()
-        updated_at = None
-    class DummyDB:
-        def query(self, model):
-            class DummyQuery:
-                def filter(self, *args, **kwargs):
-                    return self
-                def first(self):
-                    return DummyBook()
-            return DummyQuery()
-    app.dependency_overrides[books.get_db] = lambda: DummyDB()
+def test_get_book(monkeypatch, add_rows):
+    add_rows(Book(title="Test Book", author="Test Author", isbn="1234567890", description="desc", publication_year=2024))
     response = client.get(f"{settings.API_V1_STR}/books/1")
     assert response.status_code == 200
     assert response.json()["title"] == "Test Book"
+
+# --- Unit Test: GET /api/v1/books/{id}/reviews ---
+def test_get_book_with_reviews_eager_loads(add_rows):
+    book, = add_rows(Book(title="Test Book", author="Test Author"))
+    add_rows(
+        Review(book_id=book.id, reviewer_name="Alice", rating=5),
+        Review(book_id=book.id, reviewer_name="Bob", rating=4),
+    )
+    response = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews")
+    assert response.status_code == 200
+    assert [r["reviewer_name"] for r in response.json()["reviews"]] == ["Alice", "Bob"]
+
+def test_create_book_duplicate_isbn(add_rows):
+    add_rows(Book(title="Existing", author="Author", isbn="1234567890"))
+    payload = {"title": "Test Book", "author": "Test Author", "isbn": "1234567890"}
+    response = client.post(f"{settings.API_V1_STR}/books", json=payload)
+    assert response.status_code == 400
+
+def test_delete_book_cascades_reviews(add_rows):
+    book, = add_rows(Book(title="Test Book", author="Test Author"))
+    add_rows(Review(book_id=book.id, reviewer_name="Alice", rating=5))
+    response = client.delete(f"{settings.API_V1_STR}/books/{book.id}")
+    assert response.status_code == 204
+    assert client.get(f"{settings.API_V1_STR}/books/{book.id}").status_code == 404
+
+# --- Unit Test: keyset pagination on GET /api/v1/books ---
+def test_list_books_keyset_pages(add_rows):
+    add_rows(*(Book(title=f"Book {i}", author="Author") for i in range(25)))
+    seen, cursor, pages = [], "", 0
+    while cursor is not None:
+        response = client.get(f"{settings.API_V1_STR}/books", params={"cursor": cursor, "limit": 10})
+        assert response.status_code == 200
+        page = response.json()
+        seen += [book["title"] for book in page["items"]]
+        cursor = page["next_cursor"]
+        pages += 1
+    assert pages == 3
+    assert seen == [f"Book {i}" for i in range(25)]
+
+def test_list_books_offset_mode_is_ordered(add_rows):
+    add_rows(*(Book(title=f"Book {i}", author="Author") for i in range(15)))
+    response = client.get(f"{settings.API_V1_STR}/books", params={"skip": 10, "limit": 10})
+    assert [book["title"] for book in response.json()] == [f"Book {i}" for i in range(10, 15)]
+
+def test_list_books_rejects_bad_cursor():
+    response = client.get(f"{settings.API_V1_STR}/books", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+# --- Unit Test: embedded review pages on GET /api/v1/books/{id}/reviews ---
+def test_get_book_with_reviews_is_capped_and_paged(add_rows):
+    from sqlalchemy import event
+    from app.database import async_engine
+
+    book, = add_rows(Book(title="Popular", author="Author", review_count=25, rating_sum=100, rating_4_count=25))
+    add_rows(*(Review(book_id=book.id, reviewer_name=f"R{i}", rating=4) for i in range(25)))
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        first = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews", params={"limit": 10}).json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    assert first["review_total"] == 25
+    assert [r["reviewer_name"] for r in first["reviews"]] == [f"R{i}" for i in range(10)]
+
+    names, cursor = [], first["next_cursor"]
+    while cursor:
+        page = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews", params={"cursor": cursor, "limit": 10}).json()
+        names += [r["reviewer_name"] for r in page["reviews"]]
+        cursor = page["next_cursor"]
+    assert names == [f"R{i}" for i in range(10, 25)]
+
+    skipped = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews", params={"skip": 20, "limit": 10}).json()
+    assert len(skipped["reviews"]) == 5
+    assert skipped["next_cursor"] is None
+
+def test_get_book_with_no_reviews(add_rows):
+    book, = add_rows(Book(title="Quiet", author="Author"))
+    data = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews").json()
+    assert data["reviews"] == []
+    assert data["review_total"] == 0
+    assert client.get(f"{settings.API_V1_STR}/books/999/reviews").status_code == 404
+
+def test_review_writes_maintain_book_aggregates(add_rows):
+    book, = add_rows(Book(title="Rated", author="Author"))
+    url = f"{settings.API_V1_STR}/books/{book.id}"
+    first = client.post(f"{url}/reviews", json={"reviewer_name": "Alice", "rating": 5}).json()
+    client.post(f"{url}/reviews", json={"reviewer_name": "Bob", "rating": 2})
+    client.put(f"{settings.API_V1_STR}/books/reviews/{first['id']}", json={"rating": 4})
+
+    data = client.get(url).json()
+    assert data["review_count"] == 2
+    assert data["average_rating"] == 3.0
+    assert data["rating_histogram"] == {"1": 0, "2": 1, "3": 0, "4": 1, "5": 0}
+
+    client.delete(f"{settings.API_V1_STR}/books/reviews/{first['id']}")
+    data = client.get(url).json()
+    assert (data["review_count"], data["average_rating"]) == (1, 2.0)
+
+def test_reconcile_repairs_drifted_aggregates(add_rows):
+    from app.reconcile import reconcile
+
+    book, = add_rows(Book(title="Imported", author="Author"))
+    add_rows(*(Review(book_id=book.id, reviewer_name=f"R{i}", rating=3) for i in range(3)))
+    assert client.get(f"{settings.API_V1_STR}/books/{book.id}").json()["review_count"] == 0
+
+    assert reconcile(dry_run=True) == 1
+    assert reconcile() == 1
+    data = client.get(f"{settings.API_V1_STR}/books/{book.id}").json()
+    assert (data["review_count"], data["average_rating"], data["rating_histogram"]["3"]) == (3, 3.0, 3)
+    assert reconcile(dry_run=True) == 0
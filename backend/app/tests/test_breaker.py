@@ -0,0 +1,116 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+class FlakyRedis:
+    """Fake Redis that can be taken down, counting the commands it was sent"""
+
+    def __init__(self):
+        import fakeredis
+
+        self.redis = fakeredis.FakeAsyncRedis()
+        self.down = False
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+
+        async def call(*args, **kwargs):
+            self.calls += 1
+            if self.down:
+                raise ConnectionError("Connection refused")
+            return await method(*args, **kwargs)
+        return call
+
+def test_breaker_opens_after_consecutive_failures_and_backs_off():
+    breaker = CircuitBreaker(failure_threshold=3, backoff_min=1, backoff_max=4)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allows_calls
+    for expected in (2, 4, 4):
+        breaker.probe_failed()
+        assert breaker.backoff == expected
+
+    # A recovery that does not hold reopens at once, backing off further
+    breaker.backoff = 1
+    breaker.probe_succeeded()
+    assert breaker.state == HALF_OPEN and breaker.allows_calls
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.backoff == 2 and breaker.trips == 2
+
+    breaker.probe_succeeded()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.backoff == 1
+
+def test_cache_skips_redis_while_open_and_reconnects():
+    from app.utils.cache import RedisCache
+
+    async def scenario():
+        client = FlakyRedis()
+        cache = RedisCache()
+        cache.breaker.backoff_min = 0.01
+        await cache.connect(client)
+        await cache.set("book:1", {"title": "Cached"})
+
+        client.down = True
+        for _ in range(cache.breaker.failure_threshold):
+            assert await cache.get("book:1") is None
+        assert cache.breaker.state == OPEN and not cache.is_available
+
+        # Open: no command reaches Redis (the reconnect probe aside)
+        calls = client.calls
+        for _ in range(100):
+            assert await cache.get("book:1") is None
+        assert client.calls - calls <= 1
+
+        client.down = False
+        for _ in range(100):
+            if cache.is_available:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.breaker.state == HALF_OPEN
+        assert (await cache.get("book:1"))["title"] == "Cached"
+        assert cache.breaker.state == CLOSED
+        await cache.close()
+
+    asyncio.run(scenario())
+
+def test_redis_down_at_startup_is_retried_in_the_background():
+    from app.utils.cache import RedisCache
+
+    async def scenario():
+        client = FlakyRedis()
+        client.down = True
+        cache = RedisCache()
+        cache.breaker.backoff_min = 0.01
+        assert not await cache.connect(client)
+        reconnected = []
+        cache.reconnect_hooks.append(lambda: asyncio.sleep(0, reconnected.append(True)))
+
+        client.down = False
+        for _ in range(100):
+            if cache.is_available:
+                break
+            await asyncio.sleep(0.01)
+        available = cache.is_available
+        await cache.close()
+        return available, reconnected
+
+    assert asyncio.run(scenario()) == (True, [True])
+
+def test_health_reports_open_breaker_as_degraded(fake_cache, monkeypatch):
+    from app.utils.cache import cache
+
+    monkeypatch.setattr(cache.breaker, "state", OPEN)
+    body = TestClient(app).get("/health").json()
+    assert body["status"] == "degraded"
+    assert body["cache"]["breaker"]["state"] == "open"
@@ -0,0 +1,89 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Book
+from app.utils.cache import cache
+from app.config import settings
+
+client = TestClient(app)
+
+def ndjson(*records):
+    return "".join((record if isinstance(record, str) else json.dumps(record)) + "\n" for record in records)
+
+def bulk(path, body, content_type="application/x-ndjson"):
+    def chunks():
+        # Split mid-line so records arrive across several body chunks
+        data = body.encode()
+        for start in range(0, len(data), 7):
+            yield data[start:start + 7]
+
+    response = client.post(f"{settings.API_V1_STR}/books{path}", content=chunks(), headers={"Content-Type": content_type})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_bulk_import_books_reports_rejected_rows(add_rows):
+    add_rows(Book(title="Existing", author="Author", isbn="9780000000001"))
+    results = bulk("/bulk", ndjson(
+        {"title": "One", "author": "A", "isbn": "9780000000002"},
+        {"title": "Bad ISBN", "author": "A", "isbn": "12345abcde"},
+        "{not json",
+        {"title": "Taken", "author": "A", "isbn": "9780000000001"},
+        {"author": "No title"},
+        {"title": "Two", "author": "B", "publication_year": 2001},
+    ))
+    assert results == [
+        {"line": 2, "error": "Invalid ISBN format"},
+        {"line": 3, "error": "Invalid JSON"},
+        {"line": 5, "error": "title: Field required"},
+        {"line": 4, "error": "Book with this ISBN already exists"},
+        {"inserted": 2, "failed": 4},
+    ]
+    titles = [book["title"] for book in client.get(f"{settings.API_V1_STR}/books/").json()]
+    assert titles == ["Existing", "One", "Two"]
+
+def test_bulk_import_books_from_csv():
+    body = 'title,author,description,publication_year\n"Two\nLines","A ""quoted"" author",,1999\nShort row\n'
+    results = bulk("/bulk", body, content_type="text/csv")
+    assert results == [{"line": 4, "error": "Expected 4 columns, got 1"}, {"inserted": 1, "failed": 1}]
+    book = client.get(f"{settings.API_V1_STR}/books/1").json()
+    assert (book["title"], book["author"], book["description"]) == ("Two\nLines", 'A "quoted" author', None)
+
+def test_bulk_import_batches_share_one_invalidation(fake_cache, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_BATCH_SIZE", 2)
+    invalidations = []
+    original = cache.invalidate
+
+    async def counting_invalidate(*keys, namespaces=()):
+        invalidations.append(namespaces)
+        return await original(*keys, namespaces=namespaces)
+
+    monkeypatch.setattr(cache, "invalidate", counting_invalidate)
+    results = bulk("/bulk", ndjson(*({"title": f"Book {i}", "author": "A"} for i in range(5))))
+    assert results == [{"inserted": 5, "failed": 0}]
+    # Each of the three batches records an outbox event; the drain merges them
+    assert invalidations == [("books:list",)]
+
+def test_bulk_import_reviews_updates_aggregates(fake_cache, add_rows):
+    book, = add_rows(Book(title="Reviewed", author="Author"))
+    body = "reviewer_name,rating,comment\nAlice,5,Great\nBob,9,Too high\nCarol,3,\n"
+    results = bulk(f"/{book.id}/reviews/bulk", body, content_type="text/csv")
+    assert results == [{"line": 3, "error": "rating: Input should be less than or equal to 5"}, {"inserted": 2, "failed": 1}]
+
+    data = client.get(f"{settings.API_V1_STR}/books/{book.id}").json()
+    assert (data["review_count"], data["average_rating"]) == (2, 4.0)
+    assert fake_cache.zscore("leaderboard:reviews", book.id) == 2
+
+def test_bulk_import_rejects_unknown_book_and_format(add_rows):
+    response = client.post(
+        f"{settings.API_V1_STR}/books/99/reviews/bulk", content="", headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 404
+    response = client.post(f"{settings.API_V1_STR}/books/bulk", content="[]", headers={"Content-Type": "application/json"})
+    assert response.status_code == 415
+    # RFC 7464 JSON text sequences prefix each record with RS, which the NDJSON parser would reject row by row
+    response = client.post(
+        f"{settings.API_V1_STR}/books/bulk", content='\x1e{"title": "T", "author": "A"}\n',
+        headers={"Content-Type": "application/json-seq"},
+    )
+    assert response.status_code == 415
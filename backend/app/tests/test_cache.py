@@ -0,0 +1,145 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import get_read_db
+from app.models import Book
+from app.utils.cache import CacheEntry, cache
+from app.config import settings
+
+client = TestClient(app)
+
+def test_get_book_populates_cache(fake_cache, add_rows):
+    book, = add_rows(Book(title="Cached Book", author="Author"))
+    response = client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    assert response.status_code == 200
+    entry = CacheEntry.load(fake_cache.get(f"book:{book.id}").encode())
+    assert json.loads(entry.body)["title"] == "Cached Book"
+    assert (response.headers["etag"], response.content) == (entry.etag, entry.body)
+
+def test_cache_hit_skips_database(fake_cache):
+    fake_cache.setex("book:42", 300, CacheEntry.of(json.dumps({
+        "id": 42, "title": "From Redis", "author": "Author",
+        "created_at": "2024-01-01T00:00:00", "updated_at": None,
+    }).encode()).dump())
+    app.dependency_overrides[get_read_db] = lambda: None  # DB should not be called
+    response = client.get(f"{settings.API_V1_STR}/books/42")
+    assert response.status_code == 200
+    assert response.json()["title"] == "From Redis"
+
+def test_cache_hit_sends_stored_bytes(fake_cache, add_rows):
+    book, = add_rows(Book(title="Serialized Once", author="Author"))
+    miss = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews")
+    hit = client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews")
+    assert hit.headers["content-type"] == "application/json"
+    stored = CacheEntry.load(fake_cache.get(f"book:reviews:{book.id}:0:0:None:10").encode())
+    assert hit.content == miss.content == stored.body
+    assert hit.json()["review_total"] == 0
+
+def test_update_book_invalidates_in_one_pipeline(fake_cache, add_rows, monkeypatch):
+    book, = add_rows(Book(title="Old Title", author="Author"))
+    client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    client.get(f"{settings.API_V1_STR}/books/{book.id}/reviews")
+    client.get(f"{settings.API_V1_STR}/books")
+    assert fake_cache.exists(f"book:{book.id}", f"book:reviews:{book.id}:0:0:None:10", "books:list:0:0:10") == 3
+
+    executed = []
+    original_pipeline = cache.redis_client.pipeline
+
+    def tracking_pipeline(*args, **kwargs):
+        pipe = original_pipeline(*args, **kwargs)
+        executed.append(pipe)
+        return pipe
+
+    monkeypatch.setattr(cache.redis_client, "pipeline", tracking_pipeline)
+    response = client.put(f"{settings.API_V1_STR}/books/{book.id}", json={"title": "New Title"})
+    assert response.status_code == 200
+    assert len(executed) == 1
+    assert fake_cache.exists(f"book:{book.id}") == 0
+    assert fake_cache.get("gen:books:list") == "1"
+    assert fake_cache.get(f"gen:book:reviews:{book.id}") == "1"
+
+def test_cache_errors_are_swallowed(fake_cache, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise ConnectionError("redis went away")
+
+    monkeypatch.setattr(cache.redis_client, "get", broken)
+    assert asyncio.run(cache.get("book:1")) is None
+
+def test_new_book_retires_cached_list_pages(fake_cache, add_rows):
+    add_rows(Book(title="First", author="Author"))
+    assert len(client.get(f"{settings.API_V1_STR}/books").json()) == 1
+    assert len(client.get(f"{settings.API_V1_STR}/books?skip=0&limit=50").json()) == 1
+
+    client.post(f"{settings.API_V1_STR}/books", json={"title": "Second", "author": "Author"})
+
+    assert len(client.get(f"{settings.API_V1_STR}/books").json()) == 2
+    assert len(client.get(f"{settings.API_V1_STR}/books?skip=0&limit=50").json()) == 2
+    # Invalidation never scans the keyspace; old pages simply age out
+    assert fake_cache.exists("books:list:0:0:10", "books:list:1:0:10") == 2
+
+def test_local_tier_serves_repeat_hits():
+    import fakeredis
+    from app.utils.cache import LocalCache, RedisCache
+
+    async def scenario():
+        tiered = RedisCache(local=LocalCache(maxsize=10, ttl=60))
+        await tiered.connect(fakeredis.FakeAsyncRedis())
+        await tiered.redis_client.setex("book:1", 300, CacheEntry.of(b'{"title": "Hot"}').dump())
+
+        assert (await tiered.get("book:1"))["title"] == "Hot"
+        # Gone from Redis, still served in-process
+        await tiered.redis_client.delete("book:1")
+        assert (await tiered.get("book:1"))["title"] == "Hot"
+        return tiered.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["redis"]["hits"] == 1
+    assert stats["local"]["hits"] == 1
+    assert stats["local"]["hit_ratio"] == 0.5
+
+def test_invalidation_reaches_other_workers():
+    import fakeredis
+    from app.utils.cache import LocalCache, RedisCache
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        writer, reader = (RedisCache(local=LocalCache(ttl=60)) for _ in range(2))
+        await writer.connect(fakeredis.FakeAsyncRedis(server=server))
+        await reader.connect(fakeredis.FakeAsyncRedis(server=server))
+        reader.start_invalidation_listener()
+        await asyncio.sleep(0.05)
+
+        await reader.set("book:1", {"title": "Old"})
+        await reader.namespaced_key("books:list", "0:10")
+        assert len(reader.local) == 2
+
+        await writer.invalidate("book:1", namespaces=("books:list",))
+        for _ in range(50):
+            if len(reader.local) == 0:
+                break
+            await asyncio.sleep(0.01)
+        evicted = len(reader.local) == 0
+        key = await reader.namespaced_key("books:list", "0:10")
+        await reader.close()
+        return evicted, key
+
+    evicted, key = asyncio.run(scenario())
+    assert evicted
+    assert key == "books:list:1:0:10"
+
+def test_local_tier_is_bounded(monkeypatch):
+    import time
+    from app.utils.cache import LocalCache
+
+    local = LocalCache(maxsize=2, ttl=5)
+    local.set("a", 1)
+    local.set("b", 2)
+    local.get("a")
+    local.set("c", 3)
+    assert local.get("b") is None
+    assert local.get("a") == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert local.get("a") is None
@@ -0,0 +1,65 @@
+import gzip
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Book
+from app.utils import compression
+from app.utils.compression import negotiate
+from app.config import settings
+
+client = TestClient(app)
+
+def add_books(add_rows, count=30):
+    return add_rows(*(Book(title=f"Book {i}", author="Author", description="A long enough description. " * 4) for i in range(count)))
+
+def test_negotiate_honours_q_values_then_server_order():
+    assert negotiate("gzip, br", ["zstd", "br", "gzip"]) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate("*;q=0.1, gzip;q=0", ["gzip", "br"]) == "br"
+    assert negotiate("identity", ["gzip"]) is None
+    assert negotiate("", ["gzip"]) is None
+
+def test_cached_list_is_compressed_once(fake_cache, add_rows, monkeypatch):
+    add_books(add_rows)
+    url = f"{settings.API_V1_STR}/books?limit=30"
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    calls = []
+    original = compression.compress
+    monkeypatch.setattr(compression, "compress", lambda data, encoding: calls.append(encoding) or original(data, encoding))
+    monkeypatch.setattr("app.utils.conditional.compress", compression.compress)
+    responses = [client.get(url, headers={"Accept-Encoding": "gzip"}) for _ in range(3)]
+
+    assert calls == ["gzip"]
+    assert {response.headers["content-encoding"] for response in responses} == {"gzip"}
+    assert responses[0].content == plain.content  # decoded by the client
+    etag = responses[0].headers["etag"]
+    assert etag == plain.headers["etag"][:-1] + '-gzip"'
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    assert len(fake_cache.keys("variant:gzip:*")) == 1
+
+def test_middleware_compresses_uncached_and_streamed_responses(add_rows):
+    add_books(add_rows)
+    with client.stream("GET", f"{settings.API_V1_STR}/books/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw).count(b"\n") == 30
+
+    search = client.get(f"{settings.API_V1_STR}/books/search", params={"q": "book", "limit": 30}, headers={"Accept-Encoding": "gzip"})
+    assert search.headers["content-encoding"] == "gzip"
+    assert len(search.json()) == 30
+
+    small = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+@pytest.mark.parametrize("encoding, module", [("br", "brotli"), ("zstd", "zstandard")])
+def test_optional_encodings(add_rows, monkeypatch, encoding, module):
+    pytest.importorskip(module)
+    monkeypatch.setattr(settings, "COMPRESSION_ENCODINGS", f"{encoding},gzip")
+    add_books(add_rows)
+    response = client.get(f"{settings.API_V1_STR}/books?limit=30", headers={"Accept-Encoding": f"gzip;q=0.5, {encoding}"})
+    assert response.headers["content-encoding"] == encoding
+    assert len(response.json()) == 30
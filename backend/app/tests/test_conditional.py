@@ -0,0 +1,47 @@
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import get_read_db
+from app.models import Book, Review
+from app.config import settings
+
+client = TestClient(app)
+
+def test_if_none_match_returns_304_from_cache(fake_cache, add_rows):
+    book, = add_rows(Book(title="Polled", author="Author"))
+    add_rows(Review(book_id=book.id, reviewer_name="Alice", rating=4))
+    url = f"{settings.API_V1_STR}/books/{book.id}/reviews"
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "public, max-age=0, s-maxage=5"
+
+    app.dependency_overrides[get_read_db] = lambda: None  # a cached validator needs no database
+    response = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert (response.status_code, response.content, response.headers["etag"]) == (304, b"", etag)
+    assert client.get(url, headers={"If-None-Match": '"other"'}).json()["reviews"][0]["reviewer_name"] == "Alice"
+
+def test_if_modified_since_and_changed_etag_after_update(fake_cache, add_rows):
+    book, = add_rows(Book(title="Old Title", author="Author"))
+    url = f"{settings.API_V1_STR}/books/{book.id}"
+    first = client.get(url)
+    last_modified = parsedate_to_datetime(first.headers["last-modified"])
+
+    assert client.get(url, headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+    earlier = format_datetime(last_modified - timedelta(seconds=1), usegmt=True)
+    assert client.get(url, headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get(url, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+    client.put(url, json={"title": "New Title"})
+    response = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["title"] == "New Title"
+    assert response.headers["etag"] != first.headers["etag"]
+
+def test_lists_have_etag_but_no_last_modified(add_rows):
+    add_rows(Book(title="Listed", author="Author"))
+    # Without Redis the validators are computed from the freshly loaded page
+    first = client.get(f"{settings.API_V1_STR}/books")
+    assert "last-modified" not in first.headers
+    response = client.get(f"{settings.API_V1_STR}/books", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 304
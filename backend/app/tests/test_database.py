@@ -0,0 +1,118 @@
+import asyncio
+import os
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.main import app
+from app.models import Book
+from app.database.connection import InstrumentedPool, async_engine_options
+from app.config import settings
+
+client = TestClient(app)
+
+def test_postgres_engine_gets_pool_and_timeouts(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    options = async_engine_options("postgresql://user@localhost/books")
+    assert (options["poolclass"], options["pool_size"], options["pool_pre_ping"]) == (InstrumentedPool, 7, True)
+    assert options["connect_args"]["server_settings"] == {"statement_timeout": "1500"}
+
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 0)
+    assert "server_settings" not in async_engine_options("postgresql://user@localhost/books")["connect_args"]
+    assert "pool_size" not in async_engine_options("sqlite:///books.db")
+
+def test_instrumented_pool_records_waits_and_timeouts():
+    path = os.path.join(tempfile.mkdtemp(), "pool.db")
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=InstrumentedPool, pool_size=1, max_overflow=0, pool_timeout=0.2,
+    )
+
+    async def scenario():
+        async with engine.connect() as held:
+            await held.execute(text("SELECT 1"))
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect() as second:
+                    await second.execute(text("SELECT 1"))
+            checked_out = engine.pool.checkedout()
+        waits = engine.pool.waits
+        await engine.dispose()
+        return checked_out, waits
+
+    checked_out, waits = asyncio.run(scenario())
+    assert checked_out == 1
+    assert (waits["count"], waits["timeouts"]) == (2, 1)
+    assert waits["max"] >= 0.2
+
+def test_deep_health_reports_latency(fake_cache):
+    response = client.get("/health", params={"deep": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "healthy"
+    assert body["checks"]["database"]["status"] == body["checks"]["redis"]["status"] == "up"
+    assert body["checks"]["database"]["latency_ms"] >= 0
+    assert body["db_pool"] == {"class": "NullPool"}
+
+def test_deep_health_degraded_without_redis():
+    body = client.get("/health", params={"deep": True}).json()
+    assert (body["status"], body["checks"]["redis"]["status"]) == ("degraded", "down")
+    assert "checks" not in client.get("/health").json()
+
+def use_lagging_replica(add_rows, monkeypatch):
+    """Serve reads from a replica that still has book 1's old title"""
+    from sqlalchemy import create_engine
+    from app.database import Base, replicas
+    from app.database.connection import ReplicaSet
+
+    path = os.path.join(tempfile.mkdtemp(), "replica.db")
+    replica = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(replica)
+    with replica.begin() as conn:
+        conn.execute(text("INSERT INTO books (id, title, author) VALUES (1, 'Replica copy', 'Author')"))
+    for name, value in vars(ReplicaSet([f"sqlite:///{path}"])).items():
+        monkeypatch.setattr(replicas, name, value)
+    add_rows(Book(title="Primary copy", author="Author"))
+    return replicas
+
+def test_reads_go_to_replicas_until_the_client_writes(add_rows, monkeypatch):
+    replicas = use_lagging_replica(add_rows, monkeypatch)
+
+    writer = TestClient(app)
+    assert writer.get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Replica copy"
+    response = writer.put(f"{settings.API_V1_STR}/books/1", json={"title": "Updated"})
+    assert "read_primary_until" in response.headers["set-cookie"]
+    # The writer sees its change; other clients keep reading the replica
+    assert writer.get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Updated"
+    assert TestClient(app).get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Replica copy"
+
+    replicas.healthy[0] = False
+    assert TestClient(app).get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Updated"
+    asyncio.run(replicas.check())
+    assert replicas.stats()[0]["healthy"] is True
+    asyncio.run(replicas.close())
+
+def test_writer_skips_entries_cached_from_a_lagging_replica(fake_cache, add_rows, monkeypatch):
+    replicas = use_lagging_replica(add_rows, monkeypatch)
+    writer, other = TestClient(app), TestClient(app)
+    writer.put(f"{settings.API_V1_STR}/books/1", json={"title": "Updated"})
+
+    # Another client refills the invalidated entry from the replica
+    assert other.get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Replica copy"
+    assert writer.get(f"{settings.API_V1_STR}/books/1").json()["title"] == "Updated"
+    assert writer.get(f"{settings.API_V1_STR}/books/batch", params={"ids": "1"}).json()[0]["book"]["title"] == "Updated"
+    asyncio.run(replicas.close())
+
+def test_invalidation_repeats_after_the_replica_lag(fake_cache, monkeypatch):
+    from app.utils.cache import cache
+
+    monkeypatch.setattr(cache, "reinvalidate_after", 0.01)
+
+    async def scenario():
+        await cache.invalidate(namespaces=("books:list",))
+        generation = fake_cache.get("gen:books:list")
+        await asyncio.sleep(0.05)
+        return generation, fake_cache.get("gen:books:list")
+
+    assert asyncio.run(scenario()) == ("1", "2")
@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import gc
+import io
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from app.main import app
+from app.database import engine
+from app.models import Book
+from app.config import settings
+
+client = TestClient(app)
+
+# Rows streamed by the memory test. The default keeps the suite fast; run with
+# EXPORT_RSS_ROWS=1000000 for the full check, where holding the export would show
+EXPORT_RSS_ROWS = int(os.getenv("EXPORT_RSS_ROWS", "20000"))
+
+def test_export_ndjson_with_stats(add_rows):
+    first, second = add_rows(Book(title="First", author="A", isbn="9780000000001"), Book(title="Second", author="B"))
+    client.post(f"{settings.API_V1_STR}/books/{first.id}/reviews", json={"reviewer_name": "R", "rating": 4})
+
+    response = client.get(f"{settings.API_V1_STR}/books/export", params={"stats": True})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="books.ndjson"'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["title"], row["review_count"], row["average_rating"], row["rating_4_count"]) for row in rows] == [
+        ("First", 1, 4.0, 1), ("Second", 0, None, 0),
+    ]
+    # Datetimes are written as the API returns them
+    book = client.get(f"{settings.API_V1_STR}/books/{first.id}").json()
+    assert (rows[0]["created_at"], rows[0]["updated_at"]) == (book["created_at"], book["updated_at"])
+
+def test_export_csv(add_rows):
+    add_rows(Book(title='Comma, "Quote"', author="A", description="two\nlines"))
+    response = client.get(f"{settings.API_V1_STR}/books/export", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    header, row = list(csv.reader(io.StringIO(response.text)))
+    assert header[:5] == ["id", "title", "author", "isbn", "description"]
+    assert row[1:5] == ['Comma, "Quote"', "A", "", "two\nlines"]
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def seed_books(total: int):
+    with engine.begin() as conn:
+        for start in range(0, total, 50000):
+            conn.execute(insert(Book), [
+                {"title": f"Book {i}", "author": "Synthetic Author", "description": "x" * 100}
+                for i in range(start, min(start + 50000, total))
+            ])
+
+async def drain_export(path: str) -> dict:
+    """Call the app as an ASGI server would, discarding the body as it streams.
+
+    TestClient and httpx collect the whole body before returning, which would
+    measure their buffer rather than the endpoint.
+    """
+    stats = {"bytes": 0, "lines": 0, "peak_rss": current_rss(), "status": None}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stats["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            stats["bytes"] += len(message.get("body", b""))
+            stats["lines"] += message.get("body", b"").count(b"\n")
+            stats["peak_rss"] = max(stats["peak_rss"], current_rss())
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"stats=true", "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    return stats
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read the resident set size")
+def test_export_memory_stays_flat():
+    seed_books(EXPORT_RSS_ROWS)
+    gc.collect()
+    baseline = current_rss()
+
+    stats = asyncio.run(drain_export(f"{settings.API_V1_STR}/books/export"))
+    assert stats["status"] == 200
+    assert stats["lines"] == EXPORT_RSS_ROWS
+    # At a million rows the export is well over 100 MB; holding even a fraction of it would show up here
+    growth = stats["peak_rss"] - baseline
+    assert growth < 32 * 1024 * 1024, f"RSS grew {growth / 2**20:.1f} MB while streaming {stats['bytes'] / 2**20:.0f} MB"
@@ -0,0 +1,69 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import AsyncSessionLocal
+from app.models import Book
+from app.utils.cache import cache
+from app.utils.leaderboard import bayesian_score, leaderboard
+from app.config import settings
+
+client = TestClient(app)
+
+def post_reviews(book_id, *ratings):
+    for i, rating in enumerate(ratings):
+        response = client.post(
+            f"{settings.API_V1_STR}/books/{book_id}/reviews",
+            json={"reviewer_name": f"R{i}", "rating": rating},
+        )
+        assert response.status_code == 201
+
+def seed_rankings(add_rows):
+    one_hit, steady, popular = add_rows(
+        Book(title="One Hit", author="A"), Book(title="Steady", author="B"), Book(title="Popular", author="C"),
+    )
+    post_reviews(one_hit.id, 5)
+    post_reviews(steady.id, *[5, 4] * 10)
+    post_reviews(popular.id, *[3] * 30)
+    return one_hit, steady, popular
+
+def test_top_books_are_ranked_incrementally(fake_cache, add_rows):
+    one_hit, steady, popular = seed_rankings(add_rows)
+
+    rated = client.get(f"{settings.API_V1_STR}/books/top", params={"by": "rating"}).json()
+    # A single 5-star review does not outrank twenty reviews averaging 4.5
+    assert [book["title"] for book in rated] == ["Steady", "One Hit", "Popular"]
+    assert rated[0]["score"] == bayesian_score(20, 90)
+
+    reviewed = client.get(f"{settings.API_V1_STR}/books/top", params={"by": "reviews", "limit": 2}).json()
+    assert [(book["title"], book["score"]) for book in reviewed] == [("Popular", 30), ("Steady", 20)]
+
+    reviews = client.get(f"{settings.API_V1_STR}/books/{one_hit.id}/reviews").json()["reviews"]
+    client.delete(f"{settings.API_V1_STR}/books/reviews/{reviews[0]['id']}")
+    client.delete(f"{settings.API_V1_STR}/books/{popular.id}")
+    assert fake_cache.zrevrange("leaderboard:rating", 0, -1) == [str(steady.id)]
+
+def test_top_books_fall_back_to_sql_without_redis(fake_cache, add_rows):
+    seed_rankings(add_rows)
+    from_redis = client.get(f"{settings.API_V1_STR}/books/top", params={"limit": 3}).json()
+
+    cache.is_available = False
+    from_sql = client.get(f"{settings.API_V1_STR}/books/top", params={"limit": 3}).json()
+    assert [(book["id"], round(book["score"], 6)) for book in from_sql] == \
+        [(book["id"], round(book["score"], 6)) for book in from_redis]
+
+def test_rebuild_matches_incremental_rankings(fake_cache, add_rows):
+    seed_rankings(add_rows)
+    incremental = {key: fake_cache.zrange(key, 0, -1, withscores=True) for key in leaderboard.RANKINGS.values()}
+
+    async def rebuild():
+        async with AsyncSessionLocal() as db:
+            return await leaderboard.rebuild(db)
+
+    fake_cache.flushall()
+    assert asyncio.run(rebuild()) == 3
+    for key, expected in incremental.items():
+        assert [(member, round(score, 6)) for member, score in fake_cache.zrange(key, 0, -1, withscores=True)] == \
+            [(member, round(score, 6)) for member, score in expected]
+
+def test_top_books_rejects_unknown_ranking():
+    assert client.get(f"{settings.API_V1_STR}/books/top", params={"by": "title"}).status_code == 422
@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Book
+from app.utils.metrics import Histogram, key_namespace
+from app.config import settings
+
+client = TestClient(app)
+
+def sample(name: str, **labels) -> float:
+    """Current value of one series scraped from /metrics (0 when absent)"""
+    selector = name + ("{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}" if labels else "")
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(selector + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_requests_are_labelled_by_route_template(fake_cache, add_rows):
+    book, = add_rows(Book(title="Measured", author="Author"))
+    route = f"{settings.API_V1_STR}/books/{{book_id}}"
+    before = sample("http_requests_total", method="GET", route=route, status="200")
+    queries_before = sample("db_queries_per_request_sum", route=route)
+    misses = sample("cache_requests_total", namespace="book", tier="redis", result="miss")
+    hits = sample("cache_requests_total", namespace="book", tier="redis", result="hit")
+
+    client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    client.get("/no/such/path")
+
+    assert sample("http_requests_total", method="GET", route=route, status="200") == before + 2
+    # Only the miss ran SQL
+    assert sample("db_queries_per_request_sum", route=route) == queries_before + 1
+    assert sample("cache_requests_total", namespace="book", tier="redis", result="miss") == misses + 1
+    assert sample("cache_requests_total", namespace="book", tier="redis", result="hit") == hits + 1
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert sample("http_requests_in_flight", method="GET") == 1  # the scrape itself
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "/books")
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/books",le="0.1"} 1',
+        'latency_seconds_bucket{route="/books",le="1.0"} 3',
+        'latency_seconds_bucket{route="/books",le="+Inf"} 4',
+        'latency_seconds_sum{route="/books"} 4.25',
+        'latency_seconds_count{route="/books"} 4',
+    ]
+
+def test_cache_key_namespaces_stay_low_cardinality():
+    assert [key_namespace(key) for key in (
+        "book:12", "books:list:3:0:10", "reviews:book:5:1:0:10", "book:reviews:5:2:0:None:10", "variant:gzip:ab12", "42",
+    )] == ["book", "books:list", "reviews:book", "book:reviews", "variant:gzip", "other"]
@@ -0,0 +1,103 @@
+import asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from app.main import app
+from app.database import AsyncSessionLocal
+from app.models import Book, OutboxEvent
+from app.utils.cache import cache
+from app.utils.metrics import outbox_events, outbox_lag
+from app.utils.outbox import outbox
+from app.config import settings
+
+client = TestClient(app)
+
+def pending_events() -> int:
+    async def count():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(OutboxEvent))
+    return asyncio.run(count())
+
+def test_failed_invalidation_is_retried(fake_cache, add_rows, monkeypatch):
+    book, = add_rows(Book(title="Old Title", author="Author"))
+    client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    original = cache.invalidate
+
+    async def redis_down(*keys, namespaces=()):
+        return False
+
+    monkeypatch.setattr(cache, "invalidate", redis_down)
+    failures = outbox.failures
+    response = client.put(f"{settings.API_V1_STR}/books/{book.id}", json={"title": "New Title"})
+    assert response.status_code == 200
+    # The write committed; its invalidation waits in the outbox
+    assert pending_events() == 1
+    assert outbox.failures == failures + 1
+    assert fake_cache.exists(f"book:{book.id}") == 1
+
+    monkeypatch.setattr(cache, "invalidate", original)
+    assert asyncio.run(outbox.drain()) == 1
+    assert pending_events() == 0
+    assert fake_cache.exists(f"book:{book.id}") == 0
+    assert client.get(f"{settings.API_V1_STR}/books/{book.id}").json()["title"] == "New Title"
+
+def test_drain_merges_a_batch(fake_cache, add_rows, monkeypatch):
+    book, = add_rows(Book(title="Busy", author="Author"))
+    calls = {"invalidate": [], "record_many": []}
+
+    async def invalidate(*keys, namespaces=()):
+        calls["invalidate"].append((keys, namespaces))
+        return True
+
+    async def record_many(book_id, added=(), removed=()):
+        calls["record_many"].append((book_id, added, removed))
+        return True
+
+    async def write_events():
+        async with AsyncSessionLocal() as db:
+            outbox.invalidate(db, f"book:{book.id}", namespaces=("books:list",))
+            outbox.record_ratings(db, book.id, added=[5])
+            outbox.invalidate(db, f"book:{book.id}", "review:7", namespaces=("books:list", f"book:reviews:{book.id}"))
+            outbox.record_ratings(db, book.id, added=[3], removed=[4])
+            await db.commit()
+
+    monkeypatch.setattr(cache, "invalidate", invalidate)
+    monkeypatch.setattr(outbox.leaderboard, "record_many", record_many)
+    applied, lagged = sum(outbox_events.values.values()), sum(outbox_lag.values.get((), [[], 0])[0])
+    asyncio.run(write_events())
+    assert asyncio.run(outbox.drain()) == 4
+
+    assert calls["invalidate"] == [((f"book:{book.id}", "review:7"), ("books:list", f"book:reviews:{book.id}"))]
+    assert calls["record_many"] == [(book.id, [5, 3], [4])]
+    assert sum(outbox_events.values.values()) == applied + 4
+    assert sum(outbox_lag.values[()][0]) == lagged + 4
+    assert outbox.stats()["oldest_pending_seconds"] == 0
+
+def test_failed_ranking_update_is_kept_and_counted_once(fake_cache, add_rows, monkeypatch):
+    first, second = add_rows(Book(title="First", author="A"), Book(title="Second", author="B"))
+    original = outbox.leaderboard.record_many
+
+    async def first_book_fails(book_id, added=(), removed=()):
+        if book_id == first.id:
+            return False
+        return await original(book_id, added=added, removed=removed)
+
+    async def write_events():
+        async with AsyncSessionLocal() as db:
+            outbox.invalidate(db, f"book:{first.id}", f"book:{second.id}")
+            outbox.record_ratings(db, first.id, added=[5])
+            outbox.record_ratings(db, second.id, added=[4])
+            await db.commit()
+
+    monkeypatch.setattr(outbox.leaderboard, "record_many", first_book_fails)
+    asyncio.run(write_events())
+    assert asyncio.run(outbox.drain()) == 0
+    # The invalidation and the second book's ratings went through; only the first book's wait
+    assert pending_events() == 1
+    assert fake_cache.zscore("leaderboard:reviews", second.id) == 1
+    assert fake_cache.zscore("leaderboard:reviews", first.id) is None
+
+    monkeypatch.setattr(outbox.leaderboard, "record_many", original)
+    assert asyncio.run(outbox.drain()) == 1
+    assert pending_events() == 0
+    assert fake_cache.zscore("leaderboard:reviews", first.id) == 1
+    assert fake_cache.zscore("leaderboard:reviews", second.id) == 1
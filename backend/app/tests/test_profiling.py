@@ -0,0 +1,64 @@
+import logging
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.main import app
+from app.database import engine
+from app.utils.profiling import explain
+from app.models import Book
+from app.config import settings
+
+client = TestClient(app)
+
+def phases(header: str) -> dict:
+    """Server-Timing durations by name"""
+    timings = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        timings[name] = float(next(param for param in params if param.startswith("dur="))[4:])
+    return timings
+
+def test_profile_header_adds_server_timing(fake_cache, add_rows, monkeypatch, tmp_path, caplog):
+    book, = add_rows(Book(title="Profiled", author="Author"))
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    url = f"{settings.API_V1_STR}/books/{book.id}"
+
+    assert "server-timing" not in client.get(url).headers
+    assert "server-timing" not in client.get(url, headers={"X-Profile": "guess"}).headers
+
+    fake_cache.flushall()
+    with caplog.at_level(logging.INFO, logger="app.utils.profiling"):
+        miss = client.get(url, headers={"X-Profile": "secret"})
+        hit = client.get(url, headers={"X-Profile": "secret"})
+
+    miss_timing, hit_timing = phases(miss.headers["server-timing"]), phases(hit.headers["server-timing"])
+    assert {"db", "cache", "serialize", "app", "total"} <= miss_timing.keys()
+    assert "db" not in hit_timing and "cache" in hit_timing
+    assert miss_timing["total"] >= miss_timing["db"] + miss_timing["cache"]
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+
+def test_sampled_requests_are_profiled(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1.0)
+    with caplog.at_level(logging.INFO, logger="app.utils.profiling"):
+        response = client.get(f"{settings.API_V1_STR}/books")
+    assert "total;dur=" in response.headers["server-timing"]
+    assert "cumulative" in caplog.text
+
+def test_slow_queries_are_logged_with_plan(add_rows, monkeypatch, caplog):
+    book, = add_rows(Book(title="Slow", author="Author"))
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger="app.utils.profiling"):
+        client.get(f"{settings.API_V1_STR}/books/{book.id}")
+    record = next(record for record in caplog.records if record.getMessage().startswith("Slow query"))
+    message = record.getMessage()
+    assert "FROM books" in message and f"({book.id}," in message
+    # SQLite's EXPLAIN QUERY PLAN: a primary key lookup
+    assert "Plan:\nSEARCH books USING INTEGER PRIMARY KEY" in message
+
+def test_failed_explain_leaves_the_transaction_usable(add_rows):
+    add_rows(Book(title="Kept", author="Author"))
+    with engine.begin() as conn:
+        conn.execute(text("SELECT 1"))
+        assert explain(conn, "SELECT no_such_column FROM books", ()).startswith("(EXPLAIN failed")
+        # The EXPLAIN ran in a savepoint, so the request's transaction goes on
+        assert conn.execute(text("SELECT count(*) FROM books")).scalar() == 1
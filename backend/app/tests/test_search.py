@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import Book, Review
+from app.config import settings
+
+client = TestClient(app)
+
+def search(q, **params):
+    response = client.get(f"{settings.API_V1_STR}/books/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [book["title"] for book in response.json()]
+
+def test_search_ranks_title_matches_above_other_fields(add_rows):
+    in_comment, in_title, in_description = add_rows(
+        Book(title="Quiet Seas", author="A"),
+        Book(title="The Dragon Keeper", author="B"),
+        Book(title="Rivers", author="C", description="A dragon sleeps under the river"),
+    )
+    add_rows(Review(book_id=in_comment.id, reviewer_name="R", rating=4, comment="Needed more dragon"))
+    assert search("dragon") == ["The Dragon Keeper", "Rivers", "Quiet Seas"]
+    # Every word has to match
+    assert search("dragon river") == ["Rivers"]
+    assert search("dragon", skip=1, limit=1) == ["Rivers"]
+    assert search("the and") == []
+
+def test_search_follows_writes(add_rows):
+    book, = add_rows(Book(title="Untitled", author="Anon"))
+    assert search("whimsy") == []
+
+    review = client.post(
+        f"{settings.API_V1_STR}/books/{book.id}/reviews",
+        json={"reviewer_name": "R", "rating": 5, "comment": "Pure whimsy"},
+    ).json()
+    assert search("whimsy") == ["Untitled"]
+
+    client.put(f"{settings.API_V1_STR}/books/{book.id}", json={"title": "Whimsical"})
+    client.delete(f"{settings.API_V1_STR}/books/reviews/{review['id']}")
+    assert search("whimsy") == []
+    assert search("whimsical") == ["Whimsical"]
+
+    client.delete(f"{settings.API_V1_STR}/books/{book.id}")
+    assert search("whimsical") == []
+
+def test_search_requires_query():
+    assert client.get(f"{settings.API_V1_STR}/books/search").status_code == 422
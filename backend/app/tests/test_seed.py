@@ -0,0 +1,59 @@
+import statistics
+import pytest
+from sqlalchemy import delete, select
+from app import seed as seeding
+from app.database import SessionLocal
+from app.models import Book, Review
+from app.reconcile import count_drifted
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    """Batches of ten rows, so a small dataset spans many of them"""
+    monkeypatch.setattr(seeding, "BATCH_SIZE", 10)
+
+def snapshot():
+    with SessionLocal() as db:
+        books = db.execute(select(Book.id, Book.title, Book.isbn, Book.review_count, Book.rating_sum).order_by(Book.id)).all()
+        reviews = db.execute(select(Review.id, Review.book_id, Review.rating, Review.comment).order_by(Review.id)).all()
+    return books, reviews
+
+def test_seed_loads_a_skewed_dataset_with_consistent_aggregates():
+    assert seeding.seed(books=40, reviews=500) == 540
+
+    books, reviews = snapshot()
+    assert [book.id for book in books] == list(range(1, 41))
+    assert [review.id for review in reviews] == list(range(1, 501))
+    with SessionLocal() as db:
+        assert count_drifted(db) == 0
+    # Zipf: a few books collect most of the reviews
+    counts = sorted((book.review_count for book in books), reverse=True)
+    assert counts[0] > 5 * statistics.median(counts)
+    # The usual J shape: five stars is the most common rating
+    ratings = [review.rating for review in reviews]
+    assert max(range(1, 6), key=ratings.count) == 5
+
+def test_batches_are_deterministic():
+    plan = seeding.Plan(books=40, reviews=500, seed=7, zipf=1.0)
+    assert seeding.review_rows(plan, 3) == seeding.review_rows(plan, 3)
+    assert seeding.book_rows(plan, 2) != seeding.book_rows(plan._replace(seed=8), 2)
+
+def test_seed_resumes_missing_batches_and_then_skips():
+    seeding.seed(books=40, reviews=500)
+    expected = snapshot()
+
+    # An interrupted run: one batch of reviews never made it, and neither did the aggregates
+    with SessionLocal() as db:
+        db.execute(delete(Review).where(Review.id.between(21, 30)))
+        db.execute(Book.__table__.update().values(review_count=0, rating_sum=0))
+        db.commit()
+
+    assert seeding.seed(books=40, reviews=500) == 10
+    assert snapshot() == expected
+    assert seeding.seed(books=40, reviews=500) == 0
+
+def test_seed_leaves_other_data_alone(add_rows):
+    add_rows(Book(title="My Own Book", author="Me"))
+
+    assert seeding.seed(books=40, reviews=500) == 0
+    books, reviews = snapshot()
+    assert [book.title for book in books] == ["My Own Book"] and reviews == []
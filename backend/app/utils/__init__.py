@@ -1,4 +1,5 @@
 from .cache import cache
+from .pagination import encode_cursor, decode_cursor, keyset_page
 from .validation import validate_isbn, validate_rating, validate_year
 
-__all__ = ["cache", "validate_isbn", "validate_rating", "validate_year"]
\ No newline at end of file
+__all__ = ["cache", "encode_cursor", "decode_cursor", "keyset_page", "validate_isbn", "validate_rating", "validate_year"]
\ No newline at end of file
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import settings
+from app.utils.metrics import admission_in_flight, admission_queue_depth, admission_rejections, admission_wait, registry
+
+HIGH, LOW = 0, 1
+PRIORITY_NAMES = {HIGH: "high", LOW: "low"}
+
+def parse_route_limits(value: str) -> Dict[str, int]:
+    """{"GET /api/v1/books/{book_id}/reviews": 16, ...} from "METHOD /template=limit" pairs"""
+    limits = {}
+    for item in value.split(","):
+        route, _, limit = item.strip().rpartition("=")
+        if route:
+            limits[route.strip()] = int(limit)
+    return limits
+
+class Limiter:
+    """At most `capacity` holders at once; the rest wait by priority, then arrival.
+
+    A released slot is handed straight to the next waiter, so a newcomer can
+    never overtake the queue.
+    """
+
+    def __init__(self, capacity: int, queue_size: int):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    def has_room(self, priority: int) -> bool:
+        """Whether a waiter of this priority may still join the queue"""
+        if priority == HIGH:
+            return self.waiting < self.queue_size
+        # Cheap reads keep part of the queue to themselves
+        return self.waiting < self.queue_size * settings.ADMISSION_LOW_PRIORITY_QUEUE_SHARE
+
+    async def acquire(self, priority: int, timeout: float) -> Optional[str]:
+        """Take a slot; on failure the reason ("queue_full" or "timeout") is returned"""
+        if self.active < self.capacity and not self.waiting:
+            self.active += 1
+            return None
+        if not self.has_room(priority):
+            return "queue_full"
+        if timeout <= 0:
+            return "timeout"
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+            return None
+        except asyncio.TimeoutError:
+            # Handed a slot just as the wait ran out: keep it
+            if future.done() and not future.cancelled():
+                return None
+            return "timeout"
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the client went away
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+class AdmissionController:
+    """Concurrency limits for the API, shedding load before it piles up.
+
+    Every API request needs a slot under ADMISSION_MAX_CONCURRENT, and routes
+    listed in ADMISSION_ROUTE_LIMITS also one of their own. Without a free slot
+    a request waits at most ADMISSION_QUEUE_TIMEOUT in a bounded queue. When
+    the queue is full or the wait runs out it gets a 503 with Retry-After right
+    away, rather than timing out on the client. GET routes without their own
+    limit (the cached reads) go first; writes and limited routes are low
+    priority and may fill only part of the queue.
+    """
+
+    def __init__(self):
+        self.route_limits = parse_route_limits(settings.ADMISSION_ROUTE_LIMITS)
+        self.limiter = Limiter(settings.ADMISSION_MAX_CONCURRENT, settings.ADMISSION_QUEUE_SIZE)
+        self.route_limiters = {
+            route: Limiter(limit, settings.ADMISSION_QUEUE_SIZE) for route, limit in self.route_limits.items()
+        }
+        self.rejected = 0
+
+    def priority(self, method: str, route: str) -> int:
+        return HIGH if method in ("GET", "HEAD") and f"{method} {route}" not in self.route_limits else LOW
+
+    async def admit(self, method: str, route: str) -> Tuple[Optional[str], List[Limiter]]:
+        """Acquire every slot the request needs, or none; returns the rejection reason and the slots held"""
+        priority = self.priority(method, route)
+        deadline = time.monotonic() + settings.ADMISSION_QUEUE_TIMEOUT
+        needed = [self.route_limiters.get(f"{method} {route}"), self.limiter]
+        held = []
+        started = time.perf_counter()
+        for limiter in needed:
+            if limiter is None:
+                continue
+            reason = await limiter.acquire(priority, deadline - time.monotonic())
+            if reason is not None:
+                for acquired in held:
+                    acquired.release()
+                self.rejected += 1
+                if settings.METRICS_ENABLED:
+                    admission_rejections.inc(route, reason)
+                return reason, []
+            held.append(limiter)
+        if settings.METRICS_ENABLED:
+            admission_wait.observe(time.perf_counter() - started, PRIORITY_NAMES[priority])
+        return None, held
+
+    def collect(self):
+        """Refresh the queue gauges on each scrape"""
+        for name, limiter in (("global", self.limiter), *self.route_limiters.items()):
+            admission_in_flight.set(limiter.active, name)
+            admission_queue_depth.set(limiter.waiting, name)
+
+    def stats(self) -> Dict[str, Any]:
+        limiters = {"global": self.limiter, **self.route_limiters}
+        return {
+            "rejected": self.rejected,
+            "limits": {
+                name: {"capacity": limiter.capacity, "active": limiter.active, "waiting": limiter.waiting}
+                for name, limiter in limiters.items()
+            },
+        }
+
+admission = AdmissionController()
+registry.collectors.append(admission.collect)
+
+class AdmissionMiddleware:
+    """Apply the admission controller to API routes.
+
+    The route is matched here, before the router runs, so limits and labels
+    use its template; health checks, metrics and docs are never shed.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute]):
+        self.app = app
+        self.routes = routes
+
+    def match(self, scope: Scope) -> Optional[BaseRoute]:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED or not scope["path"].startswith(settings.API_V1_STR):
+            await self.app(scope, receive, send)
+            return
+        route = self.match(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason, held = await admission.admit(scope["method"], route.path)
+        if reason is not None:
+            # Lets metrics label the rejection with its route; the router would set the same
+            scope["route"] = route
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for limiter in held:
+                limiter.release()
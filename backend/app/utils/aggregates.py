@@ -0,0 +1,69 @@
+from typing import Iterable, Optional
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Book, Review
+
+RATING_COUNT_COLUMNS = {stars: f"rating_{stars}_count" for stars in range(1, 6)}
+
+async def apply_review_change(
+    db: AsyncSession,
+    book_id: int,
+    added: Optional[int] = None,
+    removed: Optional[int] = None,
+):
+    """Adjust a book's review aggregates for one review added and/or removed.
+
+    Runs as a single relative UPDATE inside the caller's transaction, so the
+    aggregates commit (or roll back) together with the review itself.
+    """
+    await apply_review_ratings(
+        db, book_id, added=() if added is None else (added,), removed=() if removed is None else (removed,)
+    )
+
+async def apply_review_ratings(db: AsyncSession, book_id: int, added: Iterable[int] = (), removed: Iterable[int] = ()):
+    """Adjust a book's review aggregates for any number of ratings added and removed"""
+    deltas = {}
+    for ratings, sign in ((added, 1), (removed, -1)):
+        for rating in ratings:
+            for column, amount in (("review_count", 1), ("rating_sum", rating), (RATING_COUNT_COLUMNS[rating], 1)):
+                deltas[column] = deltas.get(column, 0) + sign * amount
+
+    values = {column: getattr(Book, column) + delta for column, delta in deltas.items() if delta}
+    if values:
+        await db.execute(update(Book).where(Book.id == book_id).values(**values))
+
+def computed_aggregates() -> dict:
+    """Aggregate values recomputed from the reviews table, per book"""
+    def count(*criteria):
+        return select(func.count(Review.id)).where(Review.book_id == Book.id, *criteria).scalar_subquery()
+
+    values = {
+        "review_count": count(),
+        "rating_sum": select(func.coalesce(func.sum(Review.rating), 0))
+        .where(Review.book_id == Book.id)
+        .scalar_subquery(),
+    }
+    for stars, column in RATING_COUNT_COLUMNS.items():
+        values[column] = count(Review.rating == stars)
+    return values
+
+def reconcile_statement(book_ids: Optional[Iterable[int]] = None):
+    """UPDATE that rewrites the aggregates of every book whose stored values drifted"""
+    values = computed_aggregates()
+    drifted = or_(*(getattr(Book, column) != expected for column, expected in values.items()))
+    statement = update(Book).where(drifted).values(**values)
+    if book_ids is not None:
+        statement = statement.where(Book.id.in_(list(book_ids)))
+    return statement.execution_options(synchronize_session=False)
+
+def recount_statement():
+    """UPDATE that rewrites the aggregates of every reviewed book from one grouped pass over reviews.
+
+    Cheaper than `reconcile_statement` when most books changed (after a bulk
+    load), since the reviews are scanned once rather than probed per book.
+    """
+    columns = [func.count(Review.id).label("review_count"), func.sum(Review.rating).label("rating_sum")]
+    columns += [func.sum(case((Review.rating == stars, 1), else_=0)).label(column) for stars, column in RATING_COUNT_COLUMNS.items()]
+    totals = select(Review.book_id, *columns).group_by(Review.book_id).subquery()
+    values = {column.name: totals.c[column.name] for column in columns}
+    return update(Book).where(Book.id == totals.c.book_id).values(**values).execution_options(synchronize_session=False)
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Type
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.utils.cache import cache
+
+def parse_ids(ids: str, max_ids: int) -> List[int]:
+    """Parse a comma-separated id list, raising ValueError when malformed or too long"""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise ValueError("Ids must be comma-separated integers") from None
+    if not parsed:
+        raise ValueError("No ids given")
+    if len(parsed) > max_ids:
+        raise ValueError(f"At most {max_ids} ids per request")
+    return parsed
+
+async def fetch_by_ids(
+    db: AsyncSession,
+    model,
+    schema: Type[BaseModel],
+    ids: List[int],
+    key_prefix: str,
+    expire: int = 300,
+) -> Dict[int, Any]:
+    """Cached payloads for many rows: one MGET, one IN query for the misses, one SETEX pipeline.
+
+    Entries share the `{key_prefix}:{id}` keys of the single-row endpoints.
+    Ids with no row map to None.
+    """
+    keys = {row_id: f"{key_prefix}:{row_id}" for row_id in ids}
+
+    async def load_missing(missing_keys: List[str]) -> Dict[str, BaseModel]:
+        missing = set(missing_keys)
+        missing_ids = [row_id for row_id, key in keys.items() if key in missing]
+        result = await db.execute(select(model).where(model.id.in_(missing_ids)))
+        return {keys[row.id]: schema.model_validate(row) for row in result.scalars().all()}
+
+    found = await cache.get_or_load_many(list(keys.values()), load_missing, expire=expire)
+    return {row_id: found.get(key) for row_id, key in keys.items()}
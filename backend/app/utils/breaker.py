@@ -0,0 +1,97 @@
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """Stop calling a dependency that keeps failing, and let it back in carefully.
+
+    closed: calls go through; `failure_threshold` failures in a row open it.
+    open: callers skip the dependency without trying. Its owner probes it once
+    `retry_in()` has passed, backing off from `backoff_min` to `backoff_max`.
+    half_open: a probe succeeded and calls go through again; the first success
+    closes the breaker, the first failure opens it with a longer backoff.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        backoff_min: float,
+        backoff_max: float,
+        on_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.on_change = on_change
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.backoff = backoff_min
+        self.opened_at: Optional[float] = None
+        self.next_probe_at = 0.0
+
+    @property
+    def allows_calls(self) -> bool:
+        return self.state != OPEN
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self.backoff = self.backoff_min
+            self._set(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # Recovered too early: wait longer this time
+            self.trip(min(self.backoff * 2, self.backoff_max))
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self.trip(self.backoff_min)
+
+    def trip(self, backoff: Optional[float] = None):
+        """Open the breaker, probing again after `backoff` seconds"""
+        self.backoff = self.backoff_min if backoff is None else backoff
+        self.opened_at = time.monotonic()
+        self._schedule_probe()
+        self.trips += 1
+        self._set(OPEN)
+
+    def probe_failed(self):
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+        self._schedule_probe()
+
+    def probe_succeeded(self):
+        if self.state == OPEN:
+            self._set(HALF_OPEN)
+
+    def reset(self):
+        self.failures = 0
+        self.backoff = self.backoff_min
+        self.opened_at = None
+        self._set(CLOSED)
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is due"""
+        return max(self.next_probe_at - time.monotonic(), 0.0)
+
+    def _schedule_probe(self):
+        # Jitter, so workers that lost Redis together do not all reconnect at once
+        self.next_probe_at = time.monotonic() + self.backoff * random.uniform(0.8, 1.2)
+
+    def _set(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self.on_change is not None:
+                self.on_change(state)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 3) if self.state != CLOSED and self.opened_at else None,
+            "next_probe_in_seconds": round(self.retry_in(), 3) if self.state == OPEN else None,
+        }
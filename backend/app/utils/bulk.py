@@ -0,0 +1,112 @@
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+# Upload formats accepted by the bulk endpoints
+BULK_CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+class BulkRowError(ValueError):
+    """A record that cannot be imported; the message is reported for its line"""
+
+def upload_format(request: Request) -> Optional[str]:
+    """Upload format named by the request's Content-Type, if it is supported"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return BULK_CONTENT_TYPES.get(content_type)
+
+async def read_lines(request: Request) -> AsyncIterator[Tuple[int, str]]:
+    """(line number, text) for each line of the body, read as it arrives"""
+    buffer = b""
+    number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield number + 1, buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+async def read_records(request: Request, format: str) -> AsyncIterator[Tuple[int, Any]]:
+    """(line number, record) for each NDJSON object or CSV row of the body.
+
+    A record that cannot be parsed is yielded as a BulkRowError. CSV input needs
+    a header row; quoted fields may span lines.
+    """
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    start = 0
+    async for number, line in read_lines(request):
+        if format == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, BulkRowError("Invalid JSON")
+            continue
+
+        # A CSV record continues while it has an unbalanced quote
+        if not pending:
+            start = number
+        pending.append(line)
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            continue
+        pending = []
+        if not text.strip():
+            continue
+        row = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in row]
+        elif len(row) != len(header):
+            yield start, BulkRowError(f"Expected {len(header)} columns, got {len(row)}")
+        else:
+            # Empty cells mean "not given" so optional fields fall back to None
+            yield start, {name: value for name, value in zip(header, row) if value != ""}
+    if pending:
+        yield start, BulkRowError("Unterminated quoted field")
+
+def parse_record(schema: Type[BaseModel], record: Any) -> BaseModel:
+    """Validate one record against a create schema, raising BulkRowError"""
+    if isinstance(record, BulkRowError):
+        raise record
+    if not isinstance(record, dict):
+        raise BulkRowError("Expected an object")
+    try:
+        return schema.model_validate(record)
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise BulkRowError(f"{location}: {error['msg']}" if location else error["msg"])
+
+def insert_ignoring_conflicts(db: AsyncSession, model, rows: List[Dict[str, Any]], index_elements: Iterable[str]):
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING for the session's dialect"""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    return insert(model).values(rows).on_conflict_do_nothing(index_elements=list(index_elements))
+
+def report_line(**fields) -> bytes:
+    return (json.dumps(fields) + "\n").encode()
+
+class BulkResultResponse(StreamingResponse):
+    """NDJSON stream of per-row results, produced while the upload is still read.
+
+    StreamingResponse normally watches `receive` for a disconnect alongside the
+    body, which would swallow request body chunks the generator still has to
+    read. The generator reads `receive` itself (and sees the disconnect there).
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -1,77 +1,620 @@
+import asyncio
+import hashlib
 import json
-import redis
-from typing import Optional, Any
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import redis.asyncio as redis
+from pydantic import BaseModel
+from pydantic_core import to_json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 from app.config import settings
+from app.utils.breaker import OPEN, STATE_VALUES, CircuitBreaker
+from app.utils.metrics import cache_breaker_state, cache_breaker_trips, cache_errors, cache_requests, key_namespace
+from app.utils.profiling import timed
+
+logger = logging.getLogger(__name__)
+
+# Lookup result -> key in RedisCache.counters
+COUNTER_NAMES = {"hit": "hits", "miss": "misses"}
+
+# Set while serving a client that wrote within the replica lag window: an entry
+# cached (or being loaded) from a replica may predate its write, so its reads
+# load from the primary and refresh the cache instead
+fresh_reads: ContextVar[bool] = ContextVar("fresh_reads", default=False)
+
+def last_modified_of(value: Any) -> Optional[datetime]:
+    """Latest updated_at (or created_at) of a model and the models nested in it.
+
+    Only single resources have one: a list or page can change by losing an
+    item, which no timestamp records, so those are left to the ETag.
+    """
+    if not isinstance(value, BaseModel):
+        return None
+    stamps = [getattr(value, "updated_at", None) or getattr(value, "created_at", None)]
+    for name in type(value).model_fields:
+        field = getattr(value, name)
+        for nested in field if isinstance(field, list) else [field]:
+            if isinstance(nested, BaseModel):
+                stamps.append(last_modified_of(nested))
+    stamps = [stamp.replace(tzinfo=stamp.tzinfo or timezone.utc) for stamp in stamps if isinstance(stamp, datetime)]
+    # HTTP dates have whole-second precision
+    return max(stamps).replace(microsecond=0) if stamps else None
+
+class CacheEntry(NamedTuple):
+    """A cached payload with its HTTP validators.
+
+    Stored in Redis as one value: a header line with the ETag and Last-Modified
+    (Unix seconds, or "-"), then the JSON body, so a hit can answer a
+    conditional request without decoding the body.
+    """
+
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def of(cls, body: bytes, last_modified: Optional[datetime] = None) -> "CacheEntry":
+        return cls(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', last_modified)
+
+    @classmethod
+    def load(cls, data: bytes) -> "CacheEntry":
+        header, _, body = data.partition(b"\n")
+        etag, _, stamp = header.decode().partition(" ")
+        last_modified = None if stamp == "-" else datetime.fromtimestamp(int(stamp), timezone.utc)
+        return cls(body, etag, last_modified)
+
+    def dump(self) -> bytes:
+        stamp = "-" if self.last_modified is None else str(int(self.last_modified.timestamp()))
+        return f"{self.etag} {stamp}\n".encode() + self.body
+
+class LocalCache:
+    """Bounded in-process LRU with a TTL, sitting in front of Redis.
+
+    Entries hold the same serialized payloads as Redis (as CacheEntry), so a hit
+    skips the network hop and can be sent as is. The short TTL bounds staleness if an invalidation
+    message is missed.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expire: Optional[float] = None):
+        ttl = self.ttl if expire is None else min(expire, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 class RedisCache:
-    def __init__(self):
+    """Redis-backed cache that degrades to a no-op while Redis is unreachable.
+
+    Errors feed a circuit breaker: after REDIS_BREAKER_FAILURES in a row it
+    opens, `is_available` turns False, and every call returns at once without
+    touching the network. A background task then pings Redis with growing
+    pauses; once it answers, calls go through again and the first success
+    closes the breaker (a failure opens it again). Socket timeouts keep the
+    calls made before it opens short.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, local: Optional[LocalCache] = None):
+        self.redis_client = client
+        self.is_available = False
+        self.breaker = CircuitBreaker(
+            settings.REDIS_BREAKER_FAILURES,
+            settings.REDIS_RECONNECT_MIN,
+            settings.REDIS_RECONNECT_MAX,
+            on_change=self._breaker_changed,
+        )
+        self._reconnector: Optional[asyncio.Task] = None
+        # Called once Redis answers again after an outage, e.g. to rebuild data it lost
+        self.reconnect_hooks: List[Callable[[], Awaitable[Any]]] = []
+        self.local = local
+        self.channel = settings.CACHE_INVALIDATION_CHANNEL
+        self.counters = {tier: {"hits": 0, "misses": 0} for tier in ("local", "redis")}
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Seconds after which every invalidation is repeated (0 = never); set when
+        # reads go to replicas, so entries refilled from a lagging replica are retired
+        self.reinvalidate_after = 0.0
+        self._reinvalidations: "set[asyncio.Task]" = set()
+
+    async def connect(self, client: Optional[redis.Redis] = None) -> bool:
+        """Create the shared connection pool and check that Redis answers"""
+        if client is not None:
+            self.redis_client = client
+        elif self.redis_client is None:
+            pool = redis.ConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            )
+            self.redis_client = redis.Redis(connection_pool=pool)
+
         try:
-            self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-            # Test connection
-            self.redis_client.ping()
+            await self.redis_client.ping()
+            self.breaker.reset()
             self.is_available = True
-            print("Redis cache initialized successfully.")
+            logger.info("Redis cache initialized successfully.")
         except Exception as e:
-            print(f"Redis connection failed: {e}")
-            self.redis_client = None
+            logger.warning("Redis connection failed, retrying in the background: %s", e)
+            self.breaker.trip()
             self.is_available = False
-            print("Redis cache is not available.")
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+        return self.is_available
+
+    def _breaker_changed(self, state: str):
+        self.is_available = state != OPEN
+        if settings.METRICS_ENABLED:
+            cache_breaker_state.set(STATE_VALUES[state])
+            if state == OPEN:
+                cache_breaker_trips.inc()
+        if state == OPEN:
+            logger.warning("Redis circuit breaker open, cache bypassed for %.1fs", self.breaker.retry_in())
+            if self._reconnector is None or self._reconnector.done():
+                self._reconnector = asyncio.create_task(self._reconnect())
+        else:
+            logger.info("Redis circuit breaker %s", state.replace("_", "-"))
+
+    async def _reconnect(self):
+        """Ping Redis with growing pauses until it answers, then let calls through again"""
+        while self.breaker.state == OPEN:
+            await asyncio.sleep(self.breaker.retry_in())
+            try:
+                await self.redis_client.ping()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.breaker.probe_failed()
+                logger.debug("Redis still unreachable, next try in %.1fs: %s", self.breaker.retry_in(), e)
+            else:
+                self.breaker.probe_succeeded()
+                for hook in self.reconnect_hooks:
+                    try:
+                        await hook()
+                    except Exception as e:
+                        logger.warning("Redis reconnect hook error: %s", e)
+
+    async def ping(self) -> float:
+        """Round-trip a PING to Redis; returns the latency in seconds, raising when unreachable"""
+        if self.redis_client is None:
+            raise ConnectionError("Redis is not connected")
+        started = time.perf_counter()
+        await self.redis_client.ping()
+        return time.perf_counter() - started
+
+    async def close(self):
+        """Stop listening for invalidations and reconnecting, and release the connection pool"""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._reconnector is not None:
+            self._reconnector.cancel()
+            self._reconnector = None
+        for task in self._reinvalidations:
+            task.cancel()
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+        self.redis_client = None
+        self.is_available = False
+
+    @staticmethod
+    def serialize(value: Any) -> bytes:
+        """JSON bytes of a value; pydantic models are serialized as responses would be"""
+        return to_json(value)
+
+    async def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Get a cached payload and its validators, trying the in-process tier before Redis"""
         if not self.is_available:
             return None
-        
+
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                self._record("local", key, "hit")
+                return entry
+            self._record("local", key, "miss")
+
         try:
-            value = self.redis_client.get(key)
+            with timed("cache"):
+                value = await self.redis_client.get(key)
+            self.breaker.record_success()
             if value:
-                print(f"[INFO] Cache hit for key: {key}")
-                return json.loads(value)
+                logger.debug("Cache hit for key: %s", key)
+                self._record("redis", key, "hit")
+                entry = CacheEntry.load(value)
+                if self.local is not None:
+                    self.local.set(key, entry)
+                return entry
             else:
-                print(f"[INFO] Cache miss for key: {key}")
+                logger.debug("Cache miss for key: %s", key)
+                self._record("redis", key, "miss")
         except Exception as e:
-            print(f"Cache get error: {e}")
+            self._failed("get", e)
         return None
-    
-    def set(self, key: str, value: Any, expire: int = 300) -> bool:
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """Get the serialized value from cache"""
+        entry = await self.get_entry(key)
+        return entry.body if entry is not None else None
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from cache, decoded from JSON"""
+        value = await self.get_raw(key)
+        return json.loads(value) if value is not None else None
+
+    async def set_entry(self, key: Optional[str], entry: CacheEntry, expire: int = 300) -> bool:
+        """Store a payload and its validators with expiration (default 5 minutes)"""
+        if not self.is_available or key is None:
+            return False
+        logger.debug("Setting cache for key: %s", key)
+
+        try:
+            with timed("cache"):
+                await self.redis_client.setex(key, expire, entry.dump())
+            self.breaker.record_success()
+            if self.local is not None:
+                self.local.set(key, entry, expire)
+            return True
+        except Exception as e:
+            self._failed("set", e)
+            return False
+
+    async def set(self, key: Optional[str], value: Any, expire: int = 300) -> bool:
         """Set value in cache with expiration (default 5 minutes)"""
-        if not self.is_available:
+        return await self.set_entry(key, self.entry_for(value), expire)
+
+    def entry_for(self, value: Any) -> CacheEntry:
+        """Serialize a value once, with its ETag and Last-Modified"""
+        with timed("serialize"):
+            return CacheEntry.of(self.serialize(value), last_modified_of(value))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values at once: the in-process tier, then one MGET for the rest"""
+        values: List[Optional[Any]] = [None] * len(keys)
+        if not self.is_available or not keys:
+            return values
+
+        remote = []
+        for index, key in enumerate(keys):
+            entry = self.local.get(key) if self.local is not None else None
+            if entry is not None:
+                self._record("local", key, "hit")
+                values[index] = json.loads(entry.body)
+            else:
+                if self.local is not None:
+                    self._record("local", key, "miss")
+                remote.append(index)
+        if not remote:
+            return values
+
+        try:
+            with timed("cache"):
+                raw_values = await self.redis_client.mget([keys[index] for index in remote])
+        except Exception as e:
+            self._failed("mget", e)
+            return values
+        self.breaker.record_success()
+        for index, raw in zip(remote, raw_values):
+            if raw:
+                self._record("redis", keys[index], "hit")
+                entry = CacheEntry.load(raw)
+                values[index] = json.loads(entry.body)
+                if self.local is not None:
+                    self.local.set(keys[index], entry)
+            else:
+                self._record("redis", keys[index], "miss")
+        return values
+
+    async def set_many(self, values: Dict[str, Any], expire: int = 300) -> bool:
+        """Set several values with one pipelined round of SETEX"""
+        if not self.is_available or not values:
             return False
-        print(f"[INFO] Setting cache for key: {key}")
-        
+
         try:
-            serialized_value = json.dumps(value, default=str)
-            self.redis_client.setex(key, expire, serialized_value)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in values.items():
+                entry = self.entry_for(value)
+                pipe.setex(key, expire, entry.dump())
+                if self.local is not None:
+                    self.local.set(key, entry, expire)
+            with timed("cache"):
+                await pipe.execute()
+            self.breaker.record_success()
             return True
         except Exception as e:
-            print(f"Cache set error: {e}")
+            self._failed("set", e)
             return False
-    
-    def delete(self, key: str) -> bool:
-        """Delete key from cache"""
+
+    async def get_or_load_many(
+        self,
+        keys: List[str],
+        loader: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        expire: int = 300,
+    ) -> Dict[str, Any]:
+        """Get many values, loading every miss with one call to `loader`.
+
+        `loader` receives the missing keys and returns the values it found, by
+        key; those are written back in one pipeline. Keys it cannot find are
+        left out of the result.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        if not fresh_reads.get():
+            found = {key: value for key, value in zip(keys, await self.get_many(keys)) if value is not None}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            loaded = await loader(missing)
+            await self.set_many(loaded, expire)
+            found.update(loaded)
+        return found
+
+    async def get_or_make_variant(
+        self, entry: CacheEntry, name: str, make: Callable[[bytes], bytes], expire: int = 300
+    ) -> bytes:
+        """A derived form of an entry's body (such as its gzip encoding), made once and shared.
+
+        Variants are keyed by the entry's ETag, so a changed body never meets a
+        stale variant and nothing needs invalidating; old ones simply expire.
+        """
         if not self.is_available:
+            return make(entry.body)
+
+        digest = entry.etag.strip('"')
+        key = f"variant:{name}:{digest}"
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        try:
+            with timed("cache"):
+                value = await self.redis_client.get(key)
+            self.breaker.record_success()
+        except Exception as e:
+            self._failed("get", e)
+            value = None
+        if value is None:
+            value = make(entry.body)
+            try:
+                if self.is_available:
+                    with timed("cache"):
+                        await self.redis_client.setex(key, expire, value)
+            except Exception as e:
+                self._failed("set", e)
+        if self.local is not None:
+            self.local.set(key, value, expire)
+        return value
+
+    async def delete(self, *keys: str) -> bool:
+        """Delete one or more keys from cache in a single command"""
+        if not self.is_available or not keys:
             return False
-        
+
+        if self.local is not None:
+            self.local.delete(*keys)
         try:
-            self.redis_client.delete(key)
+            with timed("cache"):
+                await self.redis_client.delete(*keys)
+            self.breaker.record_success()
             return True
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            self._failed("delete", e)
             return False
-    
-    def clear_pattern(self, pattern: str) -> bool:
-        """Clear all keys matching pattern"""
+
+    async def namespaced_key(self, namespace: str, key: str) -> Optional[str]:
+        """Full key of `key` in the current generation of a namespace.
+
+        None when the generation could not be read, so nothing should be cached.
+        """
+        generation = await self._generation(namespace)
+        if generation is None:
+            return None
+        return f"{namespace}:{generation}:{key}"
+
+    async def get_or_load_entry(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        expire: int = 300,
+        namespace: Optional[str] = None,
+    ) -> CacheEntry:
+        """Get the cached payload, or load, serialize and cache it on a miss.
+
+        Hits return the stored bytes untouched, ready to send as a response body
+        along with their validators.
+        Concurrent misses for the same key in this process share one call to
+        `loader` (single flight), so an expired popular key costs one database
+        query rather than one per waiting request. Loader errors reach every waiter.
+        Under `fresh_reads` the cached copy and loads in flight are skipped.
+        """
+        if namespace is None:
+            flight_key = full_key = key
+        else:
+            flight_key = f"{namespace}:{key}"
+            full_key = await self.namespaced_key(namespace, key)
+        if fresh_reads.get():
+            entry = self.entry_for(await loader())
+            await self.set_entry(full_key, entry, expire)
+            return entry
+        entry = await self.get_entry(full_key) if full_key is not None else None
+        if entry is not None:
+            return entry
+
+        while flight_key in self._inflight:
+            inflight = self._inflight[flight_key]
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only retry when the loading request was cancelled, not this one
+                if not inflight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            entry = self.entry_for(await loader())
+            await self.set_entry(full_key, entry, expire)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the error as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(entry)
+        finally:
+            del self._inflight[flight_key]
+        return entry
+
+    async def _generation(self, namespace: str) -> Optional[int]:
+        """Current generation counter of a namespace"""
         if not self.is_available:
+            return 0
+
+        generation_key = f"gen:{namespace}"
+        if self.local is not None:
+            generation = self.local.get(generation_key)
+            if generation is not None:
+                return generation
+
+        try:
+            with timed("cache"):
+                generation = int(await self.redis_client.get(generation_key) or 0)
+            self.breaker.record_success()
+        except Exception as e:
+            self._failed("generation", e)
+            return None
+        if self.local is not None:
+            self.local.set(generation_key, generation)
+        return generation
+
+    async def invalidate(self, *keys: str, namespaces: Iterable[str] = ()) -> bool:
+        """Delete keys and retire whole namespaces in one pipelined round trip.
+
+        Retiring a namespace bumps its generation counter, so every entry cached
+        under the old generation stops being read and ages out through its TTL.
+        This costs O(1) no matter how many entries the namespace holds.
+        """
+        namespaces = tuple(namespaces)
+        if not self.is_available or not (keys or namespaces):
             return False
-        
+
+        if self.reinvalidate_after:
+            task = asyncio.create_task(self._reinvalidate(keys, namespaces))
+            self._reinvalidations.add(task)
+            task.add_done_callback(self._reinvalidations.discard)
+        return await self._invalidate(keys, namespaces)
+
+    async def _reinvalidate(self, keys: Tuple[str, ...], namespaces: Tuple[str, ...]):
+        await asyncio.sleep(self.reinvalidate_after)
+        if self.is_available:
+            await self._invalidate(keys, namespaces)
+
+    async def _invalidate(self, keys: Tuple[str, ...], namespaces: Tuple[str, ...]) -> bool:
+        self._evict_local(keys, namespaces)
         try:
-            keys = self.redis_client.keys(pattern)
+            pipe = self.redis_client.pipeline(transaction=False)
             if keys:
-                self.redis_client.delete(*keys)
+                pipe.delete(*keys)
+            for namespace in namespaces:
+                pipe.incr(f"gen:{namespace}")
+            if self.local is not None:
+                # Other workers drop the same entries from their in-process tier
+                pipe.publish(self.channel, json.dumps({"keys": keys, "namespaces": namespaces}))
+            with timed("cache"):
+                await pipe.execute()
+            self.breaker.record_success()
             return True
         except Exception as e:
-            print(f"Cache clear pattern error: {e}")
+            self._failed("invalidate", e)
             return False
 
-# Global cache instance
-cache = RedisCache()
\ No newline at end of file
+    def _evict_local(self, keys: Iterable[str], namespaces: Iterable[str]):
+        if self.local is not None:
+            self.local.delete(*keys, *(f"gen:{namespace}" for namespace in namespaces))
+
+    def start_invalidation_listener(self):
+        """Evict in-process entries when any worker invalidates them"""
+        if self.local is not None and self._listener is None and self.redis_client is not None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def _listen_for_invalidations(self):
+        while True:
+            # Nothing is read from the local tier while the breaker is open
+            while not self.is_available:
+                await asyncio.sleep(settings.REDIS_RECONNECT_MIN)
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Anything published while we were not subscribed is lost
+                    self.local.clear()
+                    while self.is_available:
+                        # Waits at most a second, below the socket timeout that would
+                        # otherwise cut an idle subscription
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is not None and message["type"] == "message":
+                            payload = json.loads(message["data"])
+                            self._evict_local(payload["keys"], payload["namespaces"])
+                    self.local.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.local.clear()
+                self._failed("listen", e)
+                await asyncio.sleep(1)
+
+    def _record(self, tier: str, key: str, result: str):
+        """Count a lookup for /health (per tier) and /metrics (per key namespace)"""
+        self.counters[tier][COUNTER_NAMES[result]] += 1
+        if settings.METRICS_ENABLED:
+            cache_requests.inc(key_namespace(key), tier, result)
+
+    def _failed(self, operation: str, error: Exception):
+        """Log and count a failed Redis call, and report it to the circuit breaker"""
+        logger.warning("Cache %s error: %s", operation, error)
+        if settings.METRICS_ENABLED:
+            cache_errors.inc(operation)
+        self.breaker.record_failure()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit and miss counts and hit ratio for each cache tier"""
+        stats = {}
+        for tier, counts in self.counters.items():
+            lookups = counts["hits"] + counts["misses"]
+            stats[tier] = {**counts, "hit_ratio": round(counts["hits"] / lookups, 4) if lookups else None}
+        stats["local"]["enabled"] = self.local is not None
+        stats["local"]["size"] = len(self.local) if self.local is not None else 0
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+# Global cache instance, connected on application startup
+cache = RedisCache(
+    local=LocalCache(settings.CACHE_LOCAL_MAXSIZE, settings.CACHE_LOCAL_TTL) if settings.CACHE_LOCAL_ENABLED else None
+)
@@ -0,0 +1,179 @@
+import zlib
+from typing import List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.utils.profiling import timed
+
+# brotli and zstd are optional: without the package that encoding is never offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INSTALLED = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+
+# Only text-like payloads are worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def available_encodings() -> List[str]:
+    """Configured encodings in server preference order, skipping those not installed"""
+    names = [name.strip().lower() for name in settings.COMPRESSION_ENCODINGS.split(",")]
+    return [name for name in names if INSTALLED.get(name)]
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """Encoding to use for an Accept-Encoding header: highest q, then server preference"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, *params = (item.strip() for item in part.split(";"))
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole body at the configured level"""
+    with timed("compress"):
+        compressor = StreamCompressor(encoding)
+        return compressor.compress(data) + compressor.finish()
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the encoded representation: a strong validator must differ per encoding"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+class StreamCompressor:
+    """Incremental gzip/br/zstd encoder; each chunk is flushed so streams stay live"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._codec = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._codec = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._codec = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compressed bytes for `data`, without flushing"""
+        if self.encoding == "br":
+            return self._codec.process(data)
+        return self._codec.compress(data)
+
+    def flush(self) -> bytes:
+        """Everything buffered so far, decodable by the client right away"""
+        if self.encoding == "gzip":
+            return self._codec.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._codec.flush()
+        return self._codec.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._codec.finish()
+        return self._codec.flush()
+
+class CompressionMiddleware:
+    """Compress JSON, NDJSON and text responses for clients that accept it.
+
+    Bodies under COMPRESSION_MIN_SIZE are sent as they are. Streaming responses
+    are compressed chunk by chunk. Responses that already carry a
+    Content-Encoding (cached payloads compressed ahead of time) pass through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), available_encodings())
+        start: Optional[Message] = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                    return
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if encoding is None or message["status"] in (204, 304):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Wait for the first body chunk to decide
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                if "etag" in headers:
+                    headers["ETag"] = encoded_etag(headers["etag"], encoding)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    with timed("compress"):
+                        body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    passthrough = True
+                    return
+                await send(start)
+                start = None
+
+            if more_body:
+                data = compressor.compress(body) + compressor.flush()
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.finish()})
+
+        await self.app(scope, receive, send_compressed)
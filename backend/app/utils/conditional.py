@@ -0,0 +1,55 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from starlette.requests import Request
+from starlette.responses import Response
+from app.config import settings
+from app.utils.cache import CacheEntry, cache
+from app.utils.compression import available_encodings, compress, encoded_etag, negotiate
+
+def cache_control() -> str:
+    """Browsers revalidate every time; a CDN may reuse a response for a few seconds"""
+    return f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, s-maxage={settings.HTTP_CACHE_SHARED_MAX_AGE}"
+
+def not_modified(request: Request, entry: CacheEntry) -> bool:
+    """Whether the client's copy is current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, as RFC 9110 requires for If-None-Match; any encoding
+        # of the same body is equally current
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        current = {entry.etag, *(encoded_etag(entry.etag, encoding) for encoding in available_encodings())}
+        return not tags.isdisjoint(current)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or entry.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return entry.last_modified <= since.replace(tzinfo=since.tzinfo or timezone.utc)
+
+async def cached_response(request: Request, entry: CacheEntry) -> Response:
+    """The cached JSON body with its validators, or an empty 304 when the client has it.
+
+    Bodies over COMPRESSION_MIN_SIZE are sent in the best encoding the client
+    accepts; each encoding of a payload is compressed once and cached.
+    """
+    encoding = None
+    if len(entry.body) >= settings.COMPRESSION_MIN_SIZE:
+        encoding = negotiate(request.headers.get("accept-encoding", ""), available_encodings())
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control(), "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["ETag"] = encoded_etag(entry.etag, encoding)
+    if entry.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(entry.last_modified, usegmt=True)
+    if not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+    body = await cache.get_or_make_variant(entry, encoding, lambda data: compress(data, encoding))
+    headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,45 @@
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.database.connection import READ_PRIMARY_COOKIE, reads_own_writes, replicas
+from app.utils.cache import fresh_reads
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class ReadYourWritesMiddleware:
+    """Pin a client's reads to the primary for a short while after it writes.
+
+    Successful writes set a cookie holding the time until which replicas may
+    still lack the change; get_read_db honours it, and the client's reads skip
+    cached entries, which may have been filled from a replica. Does nothing
+    without replicas.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not replicas.engines:
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] in READ_METHODS:
+            token = fresh_reads.set(reads_own_writes(Request(scope)))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                fresh_reads.reset(token)
+            return
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + settings.REPLICA_LAG_WINDOW
+                MutableHeaders(raw=message["headers"]).append(
+                    "Set-Cookie",
+                    f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={int(settings.REPLICA_LAG_WINDOW) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
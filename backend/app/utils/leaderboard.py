@@ -0,0 +1,150 @@
+import logging
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models import Book
+from app.utils.cache import RedisCache, cache
+
+logger = logging.getLogger(__name__)
+
+# Adjust one book's review count and rating sum, then rescore it. Done in Lua so
+# concurrent review writes apply atomically and in any order.
+RECORD_SCRIPT = """
+local count = tonumber(redis.call('ZINCRBY', KEYS[1], ARGV[2], ARGV[1]))
+local total = redis.call('HINCRBY', KEYS[3], ARGV[1], ARGV[3])
+if count <= 0 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    return 0
+end
+local weight = tonumber(ARGV[4])
+local score = (weight * tonumber(ARGV[5]) + total) / (weight + count)
+redis.call('ZADD', KEYS[2], score, ARGV[1])
+return 1
+"""
+
+def bayesian_score(review_count: int, rating_sum: int) -> float:
+    """Average rating pulled towards the prior mean until a book has enough reviews"""
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (weight * settings.LEADERBOARD_PRIOR_MEAN + rating_sum) / (weight + review_count)
+
+class Leaderboard:
+    """Top-rated and most-reviewed rankings kept in Redis sorted sets.
+
+    `leaderboard:reviews` scores books by review count, `leaderboard:rating` by
+    Bayesian average, and `leaderboard:rating_sum` holds the sums needed to
+    rescore. Review writes update them incrementally, so reading the top N is
+    O(log n + N) however large the catalog is.
+    """
+
+    RANKINGS = {"rating": "leaderboard:rating", "reviews": "leaderboard:reviews"}
+    SUMS = "leaderboard:rating_sum"
+
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+
+    async def record(self, book_id: int, added: Optional[int] = None, removed: Optional[int] = None) -> bool:
+        """Apply one review added and/or removed to the rankings (after the commit)"""
+        return await self.record_many(
+            book_id, added=() if added is None else (added,), removed=() if removed is None else (removed,)
+        )
+
+    async def record_many(self, book_id: int, added: Iterable[int] = (), removed: Iterable[int] = ()) -> bool:
+        """Apply any number of ratings added and removed to the rankings; False when Redis failed"""
+        added, removed = list(added), list(removed)
+        count_delta = len(added) - len(removed)
+        sum_delta = sum(added) - sum(removed)
+        if not (count_delta or sum_delta):
+            return True
+        if not self.cache.is_available:
+            return False
+        try:
+            await self.cache.redis_client.eval(
+                RECORD_SCRIPT, 3, self.RANKINGS["reviews"], self.RANKINGS["rating"], self.SUMS,
+                book_id, count_delta, sum_delta,
+                settings.LEADERBOARD_PRIOR_WEIGHT, settings.LEADERBOARD_PRIOR_MEAN,
+            )
+            self.cache.breaker.record_success()
+            return True
+        except Exception as e:
+            logger.warning("Leaderboard record error: %s", e)
+            self.cache.breaker.record_failure()
+            return False
+
+    async def remove(self, book_id: int) -> bool:
+        """Drop a deleted book from every ranking"""
+        if not self.cache.is_available:
+            return False
+        try:
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            for key in self.RANKINGS.values():
+                pipe.zrem(key, book_id)
+            pipe.hdel(self.SUMS, book_id)
+            await pipe.execute()
+            self.cache.breaker.record_success()
+            return True
+        except Exception as e:
+            logger.warning("Leaderboard remove error: %s", e)
+            self.cache.breaker.record_failure()
+            return False
+
+    async def top(self, by: str, limit: int) -> Optional[List[Tuple[int, float]]]:
+        """Best (book id, score) pairs, or None when Redis cannot answer"""
+        if not self.cache.is_available:
+            return None
+        try:
+            ranked = await self.cache.redis_client.zrevrange(self.RANKINGS[by], 0, limit - 1, withscores=True)
+            self.cache.breaker.record_success()
+        except Exception as e:
+            logger.warning("Leaderboard read error: %s", e)
+            self.cache.breaker.record_failure()
+            return None
+        return [(int(book_id), score) for book_id, score in ranked]
+
+    async def rebuild(self, db: AsyncSession, batch_size: int = 10000) -> int:
+        """Rewrite the rankings from the books' stored aggregates"""
+        if not self.cache.is_available:
+            return 0
+        staging = {key: f"{key}:rebuild" for key in (*self.RANKINGS.values(), self.SUMS)}
+        await self.cache.redis_client.delete(*staging.values())
+
+        total = 0
+        result = await db.stream(
+            select(Book.id, Book.review_count, Book.rating_sum)
+            .where(Book.review_count > 0)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            pipe.zadd(staging[self.RANKINGS["reviews"]], {book_id: count for book_id, count, _ in rows})
+            pipe.zadd(staging[self.RANKINGS["rating"]], {book_id: bayesian_score(count, rating_sum) for book_id, count, rating_sum in rows})
+            pipe.hset(staging[self.SUMS], mapping={book_id: rating_sum for book_id, _, rating_sum in rows})
+            await pipe.execute()
+            total += len(rows)
+
+        # Swap the finished rankings in, or clear the old ones if no book has reviews
+        pipe = self.cache.redis_client.pipeline(transaction=True)
+        for key, staged in staging.items():
+            if total:
+                pipe.rename(staged, key)
+            else:
+                pipe.delete(key)
+        await pipe.execute()
+        logger.info("Leaderboard rebuilt for %d books", total)
+        return total
+
+    async def ensure_built(self, db: AsyncSession) -> int:
+        """Rebuild the rankings when Redis has none, e.g. after a flush or first deploy"""
+        if not self.cache.is_available:
+            return 0
+        try:
+            if await self.cache.redis_client.exists(self.RANKINGS["reviews"]):
+                return 0
+            return await self.rebuild(db)
+        except Exception as e:
+            logger.warning("Leaderboard rebuild error: %s", e)
+            return 0
+
+leaderboard = Leaderboard(cache)
@@ -0,0 +1,259 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.utils.profiling import query_finished
+
+# Seconds; tuned for an API whose cached reads take about a millisecond
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Outbox events wait for the next drain, or much longer while Redis is down
+OUTBOX_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in self.values.items()
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # Per label values: a count per bucket (the last one is +Inf), the sum
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """In-process metrics rendered in the Prometheus text format.
+
+    Series are plain dicts keyed by label values, so recording is a dict lookup
+    and an add; nothing is formatted until a scrape. Each worker process keeps
+    its own numbers, so scrape every worker.
+    """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Called on every scrape to refresh gauges that are read rather than recorded
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ["method", "route", "status"]
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last body chunk.", ["method", "route"]
+))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "Requests being handled right now.", ["method"]))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed while handling one request.", ["route"], QUERY_COUNT_BUCKETS
+))
+db_time_per_request = registry.register(Histogram(
+    "db_query_seconds_per_request", "Total SQL execution time while handling one request.", ["route"]
+))
+db_query_latency = registry.register(Histogram("db_query_duration_seconds", "Execution time of single SQL statements."))
+db_errors = registry.register(Counter("db_errors_total", "SQL statements that raised."))
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by key namespace, tier and result (hit or miss); failures count in cache_errors_total.",
+    ["namespace", "tier", "result"],
+))
+cache_errors = registry.register(Counter("cache_errors_total", "Failed cache operations.", ["operation"]))
+cache_breaker_state = registry.register(Gauge(
+    "cache_breaker_state", "Redis circuit breaker state: 0 closed, 1 half-open, 2 open (cache bypassed)."
+))
+cache_breaker_trips = registry.register(Counter("cache_breaker_trips_total", "Times the Redis circuit breaker opened."))
+admission_rejections = registry.register(Counter(
+    "admission_rejections_total", "Requests shed with a 503, by route and reason (queue_full or timeout).", ["route", "reason"]
+))
+admission_wait = registry.register(Histogram("admission_wait_seconds", "Time admitted requests waited for a slot.", ["priority"]))
+admission_in_flight = registry.register(Gauge("admission_in_flight", "Requests holding a slot, per limit.", ["limit"]))
+admission_queue_depth = registry.register(Gauge("admission_queue_depth", "Requests waiting for a slot, per limit.", ["limit"]))
+outbox_events = registry.register(Counter("outbox_events_total", "Outbox events applied, by kind.", ["kind"]))
+outbox_lag = registry.register(Histogram(
+    "outbox_lag_seconds", "Time from a write adding an outbox event to the event being applied.", buckets=OUTBOX_LAG_BUCKETS
+))
+outbox_failures = registry.register(Counter("outbox_failures_total", "Outbox drains that failed; their events are retried."))
+outbox_oldest = registry.register(Gauge(
+    "outbox_oldest_pending_seconds", "Age of the oldest outbox event left pending by the last drain."
+))
+pool_gauges = {
+    name: registry.register(Gauge(f"db_pool_{name}", help))
+    for name, help in (
+        ("size", "Connections the primary's pool keeps open."),
+        ("checked_out", "Primary pool connections in use."),
+        ("overflow", "Primary pool connections opened beyond the pool size."),
+        ("checkouts", "Connection checkouts from the primary's pool (monotonic)."),
+        ("wait_seconds", "Total time spent waiting for a primary pool connection (monotonic)."),
+        ("timeouts", "Checkouts that gave up waiting for a connection (monotonic)."),
+    )
+}
+
+def key_namespace(key: str) -> str:
+    """Low-cardinality namespace of a cache key: its leading word segments ("books:list", "book")"""
+    words = []
+    for segment in key.split(":", 2)[:2]:
+        if not segment.replace("_", "").isalpha():
+            break
+        words.append(segment)
+    return ":".join(words) or "other"
+
+# SQL statement count and seconds for the request being handled
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def instrument_engine(engine: AsyncEngine):
+    """Time every statement an engine runs and add it to the current request's totals.
+
+    The timing is also handed to the profiler and the slow-query log.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        query_finished(conn, statement, parameters, executemany, elapsed)
+        if not settings.METRICS_ENABLED:
+            return
+        db_query_latency.observe(elapsed)
+        totals = _request_db.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def failed(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        if settings.METRICS_ENABLED:
+            db_errors.inc()
+
+def collect_pool(pool_stats: Callable[[], dict], pool_waits: Callable[[], Optional[dict]]):
+    """Refresh the pool gauges from the primary engine on each scrape"""
+    def collect():
+        stats = pool_stats()
+        for name in ("size", "checked_out", "overflow"):
+            if name in stats:
+                pool_gauges[name].set(stats[name])
+        waits = pool_waits()
+        if waits is not None:
+            pool_gauges["checkouts"].set(waits["count"])
+            pool_gauges["wait_seconds"].set(waits["total"])
+            pool_gauges["timeouts"].set(waits["timeouts"])
+    registry.collectors.append(collect)
+
+class MetricsMiddleware:
+    """Record latency, status and SQL totals for every HTTP request.
+
+    Routes are labelled by their template (/api/v1/books/{book_id}), so the
+    number of series stays fixed however many ids are requested.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        http_in_flight.inc(method)
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            http_in_flight.dec(method)
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            http_requests.inc(method, label, str(status))
+            http_latency.observe(elapsed, method, label)
+            db_queries_per_request.observe(totals[0], label)
+            db_time_per_request.observe(totals[1], label)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import OutboxEvent
+from app.utils.cache import RedisCache, cache
+from app.utils.leaderboard import Leaderboard, leaderboard
+from app.utils.metrics import outbox_events, outbox_failures, outbox_lag, outbox_oldest
+
+logger = logging.getLogger(__name__)
+
+def age(event: OutboxEvent, now: datetime) -> float:
+    """Seconds since an event was added (SQLite hands timestamps back without a zone)"""
+    created_at = event.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max((now - created_at).total_seconds(), 0.0)
+
+class Outbox:
+    """Post-commit side effects of writes, kept in the `outbox` table.
+
+    Write routes add events in the same transaction as their change, so every
+    committed write has its cache invalidation on record even if Redis fails or
+    the process dies right after the commit. Events are applied once the
+    response is sent (routes schedule `drain` as a background task) and by a
+    worker polling every OUTBOX_POLL_INTERVAL, which retries anything left over.
+    A drain merges its batch into one invalidation plus one ranking update per
+    book, and deletes the events only after the invalidation went through.
+    """
+
+    def __init__(self, cache: RedisCache, leaderboard: Leaderboard):
+        self.cache = cache
+        self.leaderboard = leaderboard
+        self.applied = 0
+        self.failures = 0
+        self.oldest_pending = 0.0
+        self._lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+
+    def invalidate(self, db: AsyncSession, *keys: str, namespaces: Iterable[str] = ()):
+        """Delete cache keys and retire namespaces once the session commits"""
+        db.add(OutboxEvent(kind="invalidate", payload={"keys": list(keys), "namespaces": list(namespaces)}))
+
+    def record_ratings(self, db: AsyncSession, book_id: int, added: Iterable[int] = (), removed: Iterable[int] = ()):
+        """Apply ratings added and removed to the rankings once the session commits"""
+        db.add(OutboxEvent(kind="leaderboard", payload={"book_id": book_id, "added": list(added), "removed": list(removed)}))
+
+    def remove_book(self, db: AsyncSession, book_id: int):
+        """Drop a book from the rankings once the session commits"""
+        db.add(OutboxEvent(kind="leaderboard_remove", payload={"book_id": book_id}))
+
+    async def drain(self) -> int:
+        """Apply pending events batch by batch until none are left; returns how many were applied"""
+        total = 0
+        async with self._lock:
+            while True:
+                try:
+                    applied = await self._drain_batch()
+                except Exception as e:
+                    # While the Redis breaker is open every poll fails; it already logged the outage
+                    log = logger.warning if self.cache.is_available else logger.debug
+                    log("Outbox drain error: %s", e)
+                    self.failures += 1
+                    if settings.METRICS_ENABLED:
+                        outbox_failures.inc()
+                    break
+                total += applied
+                if applied < settings.OUTBOX_BATCH_SIZE:
+                    break
+        return total
+
+    async def _drain_batch(self) -> int:
+        async with AsyncSessionLocal() as db:
+            query = select(OutboxEvent).order_by(OutboxEvent.id).limit(settings.OUTBOX_BATCH_SIZE)
+            if db.bind.dialect.name == "postgresql":
+                # Workers in other processes take the next events instead of waiting for these
+                query = query.with_for_update(skip_locked=True)
+            events = (await db.scalars(query)).all()
+            now = datetime.now(timezone.utc)
+            if not events:
+                self._set_oldest_pending(0.0)
+                return 0
+
+            applied = await self.apply(events)
+            if applied:
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in applied])))
+                await db.commit()
+
+        self.applied += len(applied)
+        if settings.METRICS_ENABLED:
+            for event in applied:
+                outbox_events.inc(event.kind)
+                outbox_lag.observe(age(event, now))
+        if len(applied) < len(events):
+            done = {event.id for event in applied}
+            kept = [event for event in events if event.id not in done]
+            self._set_oldest_pending(age(kept[0], now))
+            raise RuntimeError(f"cache update failed, {len(kept)} events kept for a retry")
+        # A full batch may have more behind it; the next one measures those
+        self._set_oldest_pending(0.0 if len(events) < settings.OUTBOX_BATCH_SIZE else age(events[-1], now))
+        return len(events)
+
+    def _set_oldest_pending(self, seconds: float):
+        self.oldest_pending = seconds
+        if settings.METRICS_ENABLED:
+            outbox_oldest.set(seconds)
+
+    async def apply(self, events: List[OutboxEvent]) -> List[OutboxEvent]:
+        """Apply a batch of events, merged; returns the ones that went through.
+
+        Invalidations come first and the rankings wait for them. Each book's
+        ratings go in one atomic update, so when Redis fails partway only the
+        events of the books not yet updated are kept, and a retry counts no
+        rating twice.
+        """
+        keys: Dict[str, None] = {}
+        namespaces: Dict[str, None] = {}
+        invalidations: List[OutboxEvent] = []
+        ratings: Dict[int, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        rating_events: Dict[int, List[OutboxEvent]] = defaultdict(list)
+        removals: Dict[int, List[OutboxEvent]] = defaultdict(list)
+        for event in events:
+            payload: Dict[str, Any] = event.payload
+            if event.kind == "invalidate":
+                keys.update(dict.fromkeys(payload["keys"]))
+                namespaces.update(dict.fromkeys(payload["namespaces"]))
+                invalidations.append(event)
+            elif event.kind == "leaderboard":
+                added, removed = ratings[payload["book_id"]]
+                added.extend(payload["added"])
+                removed.extend(payload["removed"])
+                rating_events[payload["book_id"]].append(event)
+            elif event.kind == "leaderboard_remove":
+                removals[payload["book_id"]].append(event)
+            else:
+                logger.warning("Unknown outbox event kind: %s", event.kind)
+
+        # Without Redis nothing is cached or ranked
+        if self.cache.redis_client is None:
+            return list(events)
+        # While the breaker is open the events wait: Redis may still hold the stale entries
+        if not self.cache.is_available:
+            return []
+        if (keys or namespaces) and not await self.cache.invalidate(*keys, namespaces=tuple(namespaces)):
+            return []
+        # Unknown kinds are dropped along with the invalidations
+        applied = [event for event in events if event.kind not in ("leaderboard", "leaderboard_remove")]
+        for book_id, removal in removals.items():
+            if await self.leaderboard.remove(book_id):
+                # The book is gone, so its rating changes no longer matter
+                applied += removal + rating_events.pop(book_id, [])
+        for book_id, book_events in rating_events.items():
+            added, removed = ratings[book_id]
+            if await self.leaderboard.record_many(book_id, added=added, removed=removed):
+                applied += book_events
+        return applied
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            await self.drain()
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+    async def close(self):
+        """Stop the worker and apply whatever is still pending"""
+        if self._worker is not None:
+            # Holding the lock, the worker is sleeping or waiting for it, not halfway through a drain
+            async with self._lock:
+                self._worker.cancel()
+            self._worker = None
+        await self.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "applied": self.applied,
+            "failures": self.failures,
+            "oldest_pending_seconds": round(self.oldest_pending, 3),
+        }
+
+outbox = Outbox(cache, leaderboard)
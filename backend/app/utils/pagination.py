@@ -0,0 +1,30 @@
+import base64
+import json
+from typing import Optional
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the position after `last_id` as an opaque cursor"""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """Decode a cursor into the id to continue after (None for the first page)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+def keyset_page(rows: list, limit: int, schema) -> dict:
+    """Build a page of `schema` items from up to `limit + 1` rows ordered by id"""
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1].id) if len(rows) > limit else None
+    return {
+        "items": [schema.model_validate(row) for row in items],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,191 @@
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing descriptions of the timed phases; time outside them is reported as "app"
+PHASES = {
+    "db": "SQL statements",
+    "cache": "Redis round trips",
+    "serialize": "JSON encoding of cached payloads",
+    "compress": "Response compression",
+}
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+MAX_LOGGED_PARAMETERS = 1000
+
+class RequestProfile:
+    """Seconds and calls per phase for one profiled request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def server_timing(self) -> str:
+        """Server-Timing header value for the time spent so far"""
+        total = time.perf_counter() - self.started
+        parts = [
+            f'{phase};dur={self.durations[phase] * 1000:.2f};desc="{description} ({self.counts[phase]})"'
+            for phase, description in PHASES.items() if phase in self.durations
+        ]
+        # Validation, routing and any serialization FastAPI does itself
+        other = max(total - sum(self.durations.values()), 0.0)
+        parts.append(f'app;dur={other * 1000:.2f};desc="Everything else"')
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+class _Phase:
+    def __init__(self, profile: RequestProfile, phase: str):
+        self.profile = profile
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profile.add(self.phase, time.perf_counter() - self.started)
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("profile", default=None)
+_NOT_PROFILED = nullcontext()
+
+def timed(phase: str):
+    """Context manager adding its duration to `phase` of the request being profiled, if any"""
+    profile = _profile.get()
+    return _NOT_PROFILED if profile is None else _Phase(profile, phase)
+
+def query_finished(conn, statement: str, parameters: Any, executemany: bool, elapsed: float):
+    """Count a statement towards the request's db phase and log it if slow"""
+    profile = _profile.get()
+    if profile is not None:
+        profile.add("db", elapsed)
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS and not conn.info.get("explaining"):
+        log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+def explain(conn, statement: str, parameters: Any) -> Optional[str]:
+    """Query plan of a statement on the connection that ran it (EXPLAIN without ANALYZE runs nothing)"""
+    if conn.dialect.name == "postgresql":
+        prefix = "EXPLAIN "
+    elif conn.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    if statement.lstrip().split(None, 1)[0].lower() not in EXPLAINABLE:
+        return None
+
+    conn.info["explaining"] = True
+    try:
+        # In a savepoint: on Postgres a failed EXPLAIN would abort the request's transaction
+        with conn.begin_nested():
+            rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+    finally:
+        conn.info["explaining"] = False
+    # Postgres returns one line per row; SQLite (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+def log_slow_query(conn, statement: str, parameters: Any, executemany: bool, elapsed: float):
+    shown = repr(parameters)
+    if len(shown) > MAX_LOGGED_PARAMETERS:
+        shown = shown[:MAX_LOGGED_PARAMETERS] + "..."
+    plan = None
+    if settings.SLOW_QUERY_EXPLAIN and not executemany:
+        plan = explain(conn, statement, parameters)
+    logger.warning(
+        "Slow query (%.1f ms): %s\nParameters: %s%s",
+        elapsed * 1000, statement, shown, f"\nPlan:\n{plan}" if plan else "",
+    )
+
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_profiler_busy = False
+_profile_numbers = itertools.count(1)
+
+def start_profiler() -> Optional[cProfile.Profile]:
+    global _profiler_busy
+    if _profiler_busy:
+        return None
+    _profiler_busy = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_profiler(profiler: cProfile.Profile, scope: Scope, timing: str):
+    """Write the profile to PROFILE_DIR, or log its top functions"""
+    global _profiler_busy
+    profiler.disable()
+    _profiler_busy = False
+
+    request = f"{scope['method']} {scope['path']}"
+    stats = pstats.Stats(profiler)
+    if settings.PROFILE_DIR:
+        name = re.sub(r"[^A-Za-z0-9]+", "-", request).strip("-")
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_numbers)}-{name}.prof"
+        path = os.path.join(settings.PROFILE_DIR, filename)
+        stats.dump_stats(path)
+        logger.info("Profile of %s (%s) written to %s", request, timing, path)
+        return
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats("cumulative").print_stats(25)
+    logger.info("Profile of %s (%s):\n%s", request, timing, output.getvalue())
+
+class ProfilingMiddleware:
+    """Time the database, cache, serialization and compression work of chosen requests.
+
+    A request is profiled when it sends PROFILE_HEADER set to PROFILE_TOKEN, or
+    at random at PROFILE_SAMPLE_RATE. Its response carries a Server-Timing
+    header, and a cProfile of it is logged (or saved to PROFILE_DIR). cProfile
+    sees the whole event loop, so work for concurrent requests shows up in it.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def wants_profile(self, scope: Scope) -> bool:
+        if settings.PROFILE_TOKEN:
+            value = Headers(scope=scope).get(settings.PROFILE_HEADER)
+            if value is not None and hmac.compare_digest(value.encode(), settings.PROFILE_TOKEN.encode()):
+                return True
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        profiler = start_profiler()
+        timing = ""
+
+        async def send_with_timing(message: Message):
+            nonlocal timing
+            if message["type"] == "http.response.start":
+                timing = profile.server_timing()
+                MutableHeaders(raw=message["headers"]).append("Server-Timing", timing)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _profile.reset(token)
+            if profiler is not None:
+                finish_profiler(profiler, scope, timing)
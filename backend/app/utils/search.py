@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, literal, literal_column, select, text, union_all
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models import Book, Review
+
+# Relative weight of each field, matching Postgres' default ts_rank weights for
+# the A (title), B (author), C (description) and D (review comments) labels
+FIELD_WEIGHTS = {"title": 1.0, "author": 0.4, "description": 0.2, "comments": 0.1}
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words of a text, without stopwords"""
+    if not text:
+        return []
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+class PostgresSearch:
+    """Ranked search on the `books.search_vector` and `reviews.search_vector` tsvectors.
+
+    A book matches on its own fields or on any one of its review comments. Its
+    rank is the rank of its own fields plus that of its best matching review, so
+    many weak review matches cannot outweigh a title match. The columns and their
+    GIN indexes are maintained by the database (see the
+    index_review_comments_separately migration), so writes through any path stay
+    searchable without app hooks.
+    """
+
+    async def search(self, db: AsyncSession, q: str, skip: int, limit: int) -> List[Tuple[Book, float]]:
+        query = func.websearch_to_tsquery("english", q)
+        book_vector = literal_column("books.search_vector")
+        review_vector = literal_column("reviews.search_vector")
+        book_rank = func.ts_rank_cd(book_vector, query)
+        review_rank = func.ts_rank_cd(review_vector, query)
+        # Each side keeps its SEARCH_MAX_RANKED best-ranked matches (ties by id), which
+        # bounds the rows merged and joined below; ranking still reads every match
+        book_hits = (
+            select(Book.id.label("book_id"), book_rank.label("book_rank"), literal(0.0).label("review_rank"))
+            .where(book_vector.op("@@")(query))
+            .order_by(book_rank.desc(), Book.id)
+            .limit(settings.SEARCH_MAX_RANKED)
+        )
+        review_hits = (
+            select(Review.book_id, literal(0.0), review_rank)
+            .where(review_vector.op("@@")(query))
+            .order_by(review_rank.desc(), Review.id)
+            .limit(settings.SEARCH_MAX_RANKED)
+        )
+        hits = union_all(book_hits, review_hits).subquery()
+        rank = (func.max(hits.c.book_rank) + func.max(hits.c.review_rank)).label("rank")
+        ranked = select(hits.c.book_id, rank).group_by(hits.c.book_id).subquery()
+        # Statements are prepared, and a generic plan cannot see how common a term is.
+        # Plan for this query's terms
+        await db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+        result = await db.execute(
+            select(Book, ranked.c.rank)
+            .join(ranked, Book.id == ranked.c.book_id)
+            .order_by(ranked.c.rank.desc(), Book.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        return [(book, float(score)) for book, score in result.all()]
+
+    async def refresh(self, db: AsyncSession, book_id: int):
+        pass
+
+    async def refresh_many(self, db: AsyncSession, book_ids: List[int]):
+        pass
+
+    def clear(self):
+        pass
+
+class InMemorySearchIndex:
+    """Pure-Python inverted index used when the database has no full-text search.
+
+    Meant for SQLite development and tests: the index lives in this process, is
+    built from the database on first search and is refreshed per book by the
+    write routes. Every term of the query must match; hits are ranked by
+    field-weighted tf-idf.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.doc_terms: Dict[int, Set[str]] = {}
+        self.built = False
+        self._lock = asyncio.Lock()
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.built = False
+
+    def add(self, book_id: int, fields: Dict[str, Optional[str]], comments: List[str] = ()):
+        """Index (or re-index) one book"""
+        self.remove(book_id)
+        weights: Dict[str, float] = defaultdict(float)
+        for field, text in (*fields.items(), ("comments", " ".join(comment for comment in comments if comment))):
+            for term in tokenize(text):
+                weights[term] += FIELD_WEIGHTS[field]
+        for term, weight in weights.items():
+            self.postings[term][book_id] = weight
+        self.doc_terms[book_id] = set(weights)
+
+    def remove(self, book_id: int):
+        for term in self.doc_terms.pop(book_id, ()):
+            postings = self.postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def query(self, q: str, top: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(book id, score) of the `top` (default all) books matching all terms, best first"""
+        terms = set(tokenize(q))
+        if not terms or any(term not in self.postings for term in terms):
+            return []
+        ordered = sorted(terms, key=lambda term: len(self.postings[term]))
+        matches = set(self.postings[ordered[0]])
+        for term in ordered[1:]:
+            matches.intersection_update(self.postings[term])
+
+        total = len(self.doc_terms)
+        idf = {term: math.log(1 + total / len(self.postings[term])) for term in terms}
+        scored = ((book_id, sum(self.postings[term][book_id] * idf[term] for term in terms)) for book_id in matches)
+        if top is None:
+            return sorted(scored, key=lambda hit: (-hit[1], hit[0]))
+        return heapq.nsmallest(top, scored, key=lambda hit: (-hit[1], hit[0]))
+
+    async def build(self, db: AsyncSession):
+        """Index every book and review comment in the database"""
+        self.clear()
+        comments: Dict[int, List[str]] = defaultdict(list)
+        reviews = await db.stream(select(Review.book_id, Review.comment).where(Review.comment.isnot(None)))
+        async for book_id, comment in reviews:
+            comments[book_id].append(comment)
+        books = await db.stream(select(Book.id, Book.title, Book.author, Book.description))
+        async for book_id, title, author, description in books:
+            self.add(book_id, {"title": title, "author": author, "description": description}, comments.get(book_id, []))
+        self.built = True
+
+    async def search(self, db: AsyncSession, q: str, skip: int, limit: int) -> List[Tuple[Book, float]]:
+        if not self.built:
+            async with self._lock:
+                if not self.built:
+                    await self.build(db)
+        hits = self.query(q, top=skip + limit)[skip:]
+        if not hits:
+            return []
+        result = await db.execute(select(Book).where(Book.id.in_([book_id for book_id, _ in hits])))
+        books = {book.id: book for book in result.scalars().all()}
+        return [(books[book_id], score) for book_id, score in hits if book_id in books]
+
+    async def refresh(self, db: AsyncSession, book_id: int):
+        """Re-index one book after it or one of its reviews changed"""
+        await self.refresh_many(db, [book_id])
+
+    async def refresh_many(self, db: AsyncSession, book_ids: List[int]):
+        """Re-index a batch of books in two queries"""
+        if not self.built or not book_ids:
+            return
+        comments: Dict[int, List[str]] = defaultdict(list)
+        result = await db.execute(
+            select(Review.book_id, Review.comment).where(Review.book_id.in_(book_ids), Review.comment.isnot(None))
+        )
+        for book_id, comment in result.all():
+            comments[book_id].append(comment)
+        result = await db.execute(
+            select(Book.id, Book.title, Book.author, Book.description).where(Book.id.in_(book_ids))
+        )
+        found = set()
+        for book_id, title, author, description in result.all():
+            self.add(book_id, {"title": title, "author": author, "description": description}, comments.get(book_id, []))
+            found.add(book_id)
+        for book_id in set(book_ids) - found:
+            self.remove(book_id)
+
+def make_search_backend():
+    """Postgres full-text search when available, the in-memory index otherwise"""
+    if make_url(settings.DATABASE_URL).get_backend_name() == "postgresql":
+        return PostgresSearch()
+    return InMemorySearchIndex()
+
+search_index = make_search_backend()
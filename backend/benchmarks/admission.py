@@ -0,0 +1,113 @@
+"""Overload with and without admission control.
+
+Adds two routes to the app: a cheap read (1 ms, like a cache hit) and an
+expensive one that holds one of ten "pool connections" for 50 ms, so it tops
+out at 200 requests/s. Both are then offered more traffic than that, at a
+fixed arrival rate, by clients that give up after ``--client-timeout``.
+Without admission control expensive requests pile up on the pool until
+clients time out, and cheap reads wait behind them for the event loop.
+With it, the excess is answered 503 at once and cheap reads stay fast.
+
+    python -m benchmarks.admission --seconds 3 --expensive-rps 300 --cheap-rps 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List
+
+from benchmarks.common import summarize, use_temp_sqlite
+
+use_temp_sqlite()
+os.environ["ADMISSION_ROUTE_LIMITS"] = "GET /api/v1/bench/expensive=10"
+os.environ["ADMISSION_QUEUE_TIMEOUT"] = "0.25"
+
+import httpx
+
+from app.config import settings
+
+POOL_SIZE = 10
+EXPENSIVE_SECONDS = 0.05
+CHEAP_SECONDS = 0.001
+
+def add_routes(app):
+    pool = asyncio.Semaphore(POOL_SIZE)
+
+    @app.get(f"{settings.API_V1_STR}/bench/cheap")
+    async def cheap():
+        await asyncio.sleep(CHEAP_SECONDS)
+        return {"ok": True}
+
+    @app.get(f"{settings.API_V1_STR}/bench/expensive")
+    async def expensive():
+        async with pool:
+            await asyncio.sleep(EXPENSIVE_SECONDS)
+        return {"ok": True}
+
+async def offer_load(app, seconds: float, rates: Dict[str, float], client_timeout: float) -> Dict[str, dict]:
+    """Send requests at fixed rates and sort the outcomes by route"""
+    outcomes: Dict[str, Dict[str, List[float]]] = {name: {"ok": [], "shed": [], "timeout": []} for name in rates}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(name: str):
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(client.get(f"{settings.API_V1_STR}/bench/{name}"), client_timeout)
+            except asyncio.TimeoutError:
+                outcomes[name]["timeout"].append(client_timeout)
+                return
+            kind = "ok" if response.status_code == 200 else "shed"
+            outcomes[name][kind].append(time.perf_counter() - started)
+
+        tasks = []
+        started = time.perf_counter()
+        for name, rate in rates.items():
+            for i in range(int(seconds * rate)):
+                delay = started + i / rate - time.perf_counter()
+
+                async def scheduled(name=name, delay=delay):
+                    await asyncio.sleep(max(delay, 0))
+                    await call(name)
+
+                tasks.append(asyncio.create_task(scheduled()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        name: {
+            "offered": sum(len(latencies) for latencies in kinds.values()),
+            "served": summarize(kinds["ok"], elapsed) if kinds["ok"] else {"requests": 0},
+            "shed_503": len(kinds["shed"]),
+            "client_timeouts": len(kinds["timeout"]),
+        }
+        for name, kinds in outcomes.items()
+    }
+
+async def run(seconds: float, rates: Dict[str, float], client_timeout: float) -> dict:
+    from app.main import app
+
+    add_routes(app)
+    results = {}
+    for enabled in (False, True):
+        settings.ADMISSION_ENABLED = enabled
+        results["admission_on" if enabled else "admission_off"] = await offer_load(app, seconds, rates, client_timeout)
+    results["config"] = {
+        "seconds": seconds, "rates": rates, "client_timeout": client_timeout,
+        "expensive_capacity_rps": POOL_SIZE / EXPENSIVE_SECONDS,
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--expensive-rps", type=float, default=300)
+    parser.add_argument("--cheap-rps", type=float, default=200)
+    parser.add_argument("--client-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rates = {"expensive": args.expensive_rps, "cheap": args.cheap_rps}
+    print(json.dumps(asyncio.run(run(args.seconds, rates, args.client_timeout)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Blocking vs async database sessions under concurrent load.
+
+Serves GET /api/v1/books/{id} two ways against the same SQLite file:
+
+* ``blocking`` - an ``async def`` handler calling a synchronous ``Session``,
+  which is how every route worked before the async database layer
+* ``async`` - the real app routes running on ``AsyncSession``
+
+Every SQL statement pays an artificial round-trip delay inside the driver,
+standing in for the network hop to Postgres. The blocking handler sleeps on
+the event loop thread, the async one in the driver's worker thread.
+
+    python -m benchmarks.async_db --requests 2000 --concurrency 50 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import run_concurrently, use_temp_sqlite
+
+use_temp_sqlite()
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.database import Base, SessionLocal, async_engine, engine
+from app.models import Book
+from app.schemas import BookResponse
+from app.utils.cache import cache
+
+# Unpooled like the async engine on SQLite. With the default 5+10 pool the blocking
+# handlers deadlock once concurrency exceeds the pool: they wait for a connection on
+# the loop thread while the sessions holding them need the loop to be released.
+blocking_engine = create_engine(engine.url, poolclass=NullPool)
+BlockingSession = sessionmaker(autocommit=False, autoflush=False, bind=blocking_engine)
+
+def add_statement_latency(latency: float):
+    """Delay every statement by `latency` seconds in whichever thread runs the driver"""
+    def delay(statement):
+        time.sleep(latency)
+
+    @event.listens_for(blocking_engine, "connect")
+    def _blocking_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(delay)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _async_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(lambda conn: conn.set_trace_callback(delay))
+
+def blocking_app() -> FastAPI:
+    """The pre-async handler shape: async route, blocking session"""
+    legacy = FastAPI()
+
+    def get_blocking_db():
+        db = BlockingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @legacy.get("/api/v1/books/{book_id}", response_model=BookResponse)
+    async def get_book(book_id: int, db: Session = Depends(get_blocking_db)):
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return BookResponse.model_validate(book)
+
+    return legacy
+
+async def drive(target: FastAPI, books: int, total: int, concurrency: int) -> dict:
+    rng = random.Random(42)
+    ids = [rng.randint(1, books) for _ in range(total)]
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(i: int):
+            response = await client.get(f"/api/v1/books/{ids[i]}")
+            response.raise_for_status()
+
+        return await run_concurrently(call, total, concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add_all(Book(title=f"Book {i}", author="Bench Author") for i in range(args.books))
+        db.commit()
+
+    # Measure the database path only
+    cache.is_available = False
+    add_statement_latency(args.latency_ms / 1000)
+
+    from app.main import app
+
+    results = {
+        "config": vars(args),
+        "blocking": asyncio.run(drive(blocking_app(), args.books, args.requests, args.concurrency)),
+        "async": asyncio.run(drive(app, args.books, args.requests, args.concurrency)),
+    }
+    results["speedup_rps"] = round(results["async"]["rps"] / results["blocking"]["rps"], 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
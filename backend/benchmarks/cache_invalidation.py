@@ -0,0 +1,81 @@
+"""Cost of retiring cached list pages: KEYS scan vs generation bump.
+
+Fills Redis with N cached ``books:list`` pages, then times one invalidation
+with the old ``KEYS books:list:* + DEL`` approach and with the generation
+counter used by ``RedisCache.invalidate``. Runs against fakeredis unless
+``--redis-url`` points at a real (disposable!) Redis database.
+
+    python -m benchmarks.cache_invalidation --pages 100000
+    python -m benchmarks.cache_invalidation --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import use_temp_sqlite
+
+use_temp_sqlite()
+
+import redis.asyncio as redis
+
+from app.utils.cache import RedisCache
+
+PAGE = json.dumps([{"id": i, "title": f"Book {i}", "author": "Author"} for i in range(10)])
+
+async def fill(client: redis.Redis, prefix: str, pages: int):
+    for start in range(0, pages, 5000):
+        pipe = client.pipeline(transaction=False)
+        for skip in range(start, min(start + 5000, pages)):
+            pipe.setex(f"{prefix}{skip}:10", 300, PAGE)
+        await pipe.execute()
+
+async def keys_scan_invalidation(client: redis.Redis) -> float:
+    """The pre-generation clear_pattern: KEYS then DEL of every match"""
+    started = time.perf_counter()
+    keys = await client.keys("books:list:*")
+    if keys:
+        await client.delete(*keys)
+    return time.perf_counter() - started
+
+async def generation_invalidation(cache: RedisCache) -> float:
+    started = time.perf_counter()
+    await cache.invalidate(namespaces=("books:list",))
+    return time.perf_counter() - started
+
+async def run(pages: int, redis_url: str = None) -> dict:
+    if redis_url:
+        client = redis.from_url(redis_url, decode_responses=True)
+    else:
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await client.flushdb()
+
+    await fill(client, "books:list:", pages)
+    keys_seconds = await keys_scan_invalidation(client)
+
+    cache = RedisCache()
+    await cache.connect(client)
+    await fill(client, "books:list:0:", pages)
+    generation_seconds = await generation_invalidation(cache)
+    key_after = await cache.namespaced_key("books:list", "0:10")
+
+    await client.flushdb()
+    await client.aclose()
+    return {
+        "pages": pages,
+        "backend": redis_url or "fakeredis",
+        "keys_scan_ms": round(keys_seconds * 1000, 3),
+        "generation_ms": round(generation_seconds * 1000, 3),
+        "key_after_invalidation": key_after,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100_000)
+    parser.add_argument("--redis-url", default=None, help="Redis database to use; it is flushed")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.pages, args.redis_url)), indent=2))
+
+if __name__ == "__main__":
+    main()
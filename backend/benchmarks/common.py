@@ -0,0 +1,47 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+def use_temp_sqlite(name: str = "bench.db") -> str:
+    """Point DATABASE_URL at a fresh SQLite file; call before importing any app module"""
+    path = os.path.join(tempfile.mkdtemp(prefix="book-review-bench-"), name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return os.environ["DATABASE_URL"]
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize per-request latencies (seconds) into the numbers we report"""
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "requests": len(ordered),
+        "rps": round(len(ordered) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "p99_ms": round(pct(0.99), 3),
+    }
+
+async def run_concurrently(
+    call: Callable[[int], Awaitable[None]],
+    total: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """Run `call(i)` for i in range(total) with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    next_index = iter(range(total))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
@@ -0,0 +1,453 @@
+"""Load test of the whole API: every route, a read/write mix, three cache states.
+
+Seeds books and reviews when the database has none, then sends ``--requests``
+requests per scenario from ``--concurrency`` clients in a closed loop. Each
+request is drawn from a weighted mix of every route, ``--write-ratio`` of
+them writes, with popular books read far more often than the rest:
+
+* ``hot`` - fake Redis, warm: ``--warmup`` reads run untimed first
+* ``cold`` - fake Redis emptied before every request (rankings aside), so
+  each read misses and fills the cache; the emptying is timed too
+* ``down`` - Redis unreachable: the circuit breaker opens and reads go to
+  the database
+
+Requests go through the app in-process (httpx ASGI transport, where the
+background tasks of writes count towards their latency) or over HTTP to a
+uvicorn server started per scenario (``--transport uvicorn``). The run is
+reproducible: a fixed ``--seed`` gives the same data and request sequence.
+SQLite is used unless DATABASE_URL names a database (for Postgres, migrate it
+first). Results are p50/p95/p99 and RPS per route and overall, as JSON.
+
+With ``--baseline`` the results are compared to a stored run. A percentile
+more than ``--threshold`` (and ``--min-delta-ms``) above the baseline's, or
+overall RPS that far below it, is a regression, and the exit status is 1.
+Percentiles are only compared for routes with enough requests to measure
+them. Identical runs differ by up to ~30% on a busy machine, hence the
+coarse default. Baselines depend on the machine: record one with
+``--save-baseline`` before comparing against it.
+
+    python -m benchmarks.load --requests 2000 --concurrency 20
+    python -m benchmarks.load --transport uvicorn --scenarios hot,down
+    python -m benchmarks.load --save-baseline benchmarks/baselines/load-sqlite.json
+    python -m benchmarks.load --baseline benchmarks/baselines/load-sqlite.json
+    DATABASE_URL=postgresql://localhost/books_bench python -m benchmarks.load --books 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.common import summarize, use_temp_sqlite
+
+if "DATABASE_URL" not in os.environ:
+    use_temp_sqlite()
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.models import Book, Review
+from app.utils.aggregates import reconcile_statement
+
+SCENARIOS = ("hot", "cold", "down")
+BOOKS = f"{settings.API_V1_STR}/books"
+WORDS = (
+    "river stone night garden winter empire shadow glass silent iron code "
+    "ocean paper crown forest machine letter summer mirror storm"
+).split()
+# Requests a route needs in both runs before a percentile is compared: ten
+# above it, or the tail is a handful of outliers
+PERCENTILE_SAMPLES = {"p50_ms": 20, "p95_ms": 200, "p99_ms": 1000}
+
+def seed(books: int, reviews_per_book: int, rng: random.Random):
+    """Insert books and reviews unless there are some already, then fill in the aggregates"""
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(Book)):
+            return
+        for start in range(0, books, 5000):
+            db.execute(insert(Book), [
+                {
+                    "title": " ".join(rng.choices(WORDS, k=3)).title(),
+                    "author": f"{rng.choice(WORDS).title()} Author",
+                    "description": " ".join(rng.choices(WORDS, k=12)),
+                    "publication_year": rng.randint(1950, 2024),
+                }
+                for _ in range(start, min(start + 5000, books))
+            ])
+        book_ids = db.scalars(select(Book.id)).all()
+        rows = [
+            {"book_id": book_id, "reviewer_name": f"Reader {rng.randint(1, 10000)}",
+             "rating": rng.randint(1, 5), "comment": " ".join(rng.choices(WORDS, k=8))}
+            for book_id in book_ids for _ in range(reviews_per_book)
+        ]
+        for start in range(0, len(rows), 5000):
+            db.execute(insert(Review), rows[start:start + 5000])
+        db.execute(reconcile_statement())
+        db.commit()
+
+class Request(NamedTuple):
+    route: str
+    method: str
+    url: str
+    options: Dict[str, Any] = {}
+    on_success: Optional[Callable[[httpx.Response], None]] = None
+
+class Workload:
+    """Draws requests from a weighted mix of every route"""
+
+    def __init__(self, rng: random.Random, write_ratio: float, book_ids: List[int], review_ids: List[int]):
+        self.rng = rng
+        self.write_ratio = write_ratio
+        self.book_ids = book_ids
+        self.review_ids = review_ids
+        # Created during the run, so deletes never remove the rows other requests read
+        self.created_books: List[int] = []
+        self.created_reviews: List[int] = []
+        self.reads = [
+            (30, self.get_book), (10, self.list_books), (10, self.book_with_reviews), (6, self.reviews_page),
+            (5, self.top), (5, self.search), (5, self.books_batch), (5, self.get_review), (3, self.reviews_batch),
+            (1, self.export), (1, self.health), (0.5, self.metrics),
+        ]
+        self.writes = [
+            (3, self.create_book), (3, self.update_book), (1, self.delete_book), (5, self.create_review),
+            (2, self.update_review), (1, self.delete_review), (0.5, self.bulk_books), (0.5, self.bulk_reviews),
+        ]
+
+    def next(self, reads_only: bool = False) -> Request:
+        mix = self.writes if not reads_only and self.rng.random() < self.write_ratio else self.reads
+        make = self.rng.choices([make for _, make in mix], [weight for weight, _ in mix])[0]
+        return make()
+
+    def popular_book(self) -> int:
+        # Heavy-tailed: a few books get most of the reads, as on a real catalogue
+        return self.book_ids[min(int(self.rng.paretovariate(1.2)), len(self.book_ids)) - 1]
+
+    def any_book(self) -> int:
+        return self.rng.choice(self.book_ids)
+
+    def any_review(self) -> int:
+        return self.rng.choice(self.review_ids)
+
+    def words(self, k: int) -> str:
+        return " ".join(self.rng.choices(WORDS, k=k))
+
+    def get_book(self):
+        return Request(f"GET {BOOKS}/{{book_id}}", "GET", f"{BOOKS}/{self.popular_book()}")
+
+    def list_books(self):
+        return Request(f"GET {BOOKS}/", "GET", f"{BOOKS}/", {"params": {"skip": 10 * self.rng.randint(0, 9), "limit": 10}})
+
+    def book_with_reviews(self):
+        return Request(f"GET {BOOKS}/{{book_id}}/reviews", "GET", f"{BOOKS}/{self.popular_book()}/reviews")
+
+    def reviews_page(self):
+        return Request(
+            f"GET {BOOKS}/{{book_id}}/reviews", "GET", f"{BOOKS}/{self.popular_book()}/reviews",
+            {"params": {"limit": 5, "skip": self.rng.randint(0, 3)}},
+        )
+
+    def top(self):
+        return Request(f"GET {BOOKS}/top", "GET", f"{BOOKS}/top", {"params": {"by": self.rng.choice(["rating", "reviews"])}})
+
+    def search(self):
+        return Request(f"GET {BOOKS}/search", "GET", f"{BOOKS}/search", {"params": {"q": self.words(self.rng.randint(1, 2))}})
+
+    def books_batch(self):
+        ids = ",".join(str(self.popular_book()) for _ in range(10))
+        return Request(f"GET {BOOKS}/batch", "GET", f"{BOOKS}/batch", {"params": {"ids": ids}})
+
+    def get_review(self):
+        return Request(f"GET {BOOKS}/reviews/{{review_id}}", "GET", f"{BOOKS}/reviews/{self.any_review()}")
+
+    def reviews_batch(self):
+        ids = ",".join(str(self.any_review()) for _ in range(10))
+        return Request(f"GET {BOOKS}/reviews/batch", "GET", f"{BOOKS}/reviews/batch", {"params": {"ids": ids}})
+
+    def export(self):
+        return Request(f"GET {BOOKS}/export", "GET", f"{BOOKS}/export", {"params": {"stats": "true"}})
+
+    def health(self):
+        return Request("GET /health", "GET", "/health")
+
+    def metrics(self):
+        return Request("GET /metrics", "GET", "/metrics")
+
+    def book_body(self) -> Dict[str, Any]:
+        return {"title": self.words(3).title(), "author": f"{self.rng.choice(WORDS).title()} Author",
+                "description": self.words(12), "publication_year": self.rng.randint(1950, 2024)}
+
+    def review_body(self) -> Dict[str, Any]:
+        return {"reviewer_name": f"Reader {self.rng.randint(1, 10000)}", "rating": self.rng.randint(1, 5),
+                "comment": self.words(8)}
+
+    def create_book(self):
+        return Request(
+            f"POST {BOOKS}/", "POST", f"{BOOKS}/", {"json": self.book_body()},
+            lambda response: self.created_books.append(response.json()["id"]),
+        )
+
+    def update_book(self):
+        return Request(f"PUT {BOOKS}/{{book_id}}", "PUT", f"{BOOKS}/{self.popular_book()}", {"json": {"title": self.words(3).title()}})
+
+    def delete_book(self):
+        if not self.created_books:
+            return self.create_book()
+        book_id = self.created_books.pop(self.rng.randrange(len(self.created_books)))
+        return Request(f"DELETE {BOOKS}/{{book_id}}", "DELETE", f"{BOOKS}/{book_id}")
+
+    def create_review(self):
+        return Request(
+            f"POST {BOOKS}/{{book_id}}/reviews", "POST", f"{BOOKS}/{self.any_book()}/reviews", {"json": self.review_body()},
+            lambda response: self.created_reviews.append(response.json()["id"]),
+        )
+
+    def update_review(self):
+        return Request(
+            f"PUT {BOOKS}/reviews/{{review_id}}", "PUT", f"{BOOKS}/reviews/{self.any_review()}",
+            {"json": {"rating": self.rng.randint(1, 5)}},
+        )
+
+    def delete_review(self):
+        if not self.created_reviews:
+            return self.create_review()
+        review_id = self.created_reviews.pop(self.rng.randrange(len(self.created_reviews)))
+        return Request(f"DELETE {BOOKS}/reviews/{{review_id}}", "DELETE", f"{BOOKS}/reviews/{review_id}")
+
+    def ndjson(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"content": "".join(json.dumps(row) + "\n" for row in rows), "headers": {"Content-Type": "application/x-ndjson"}}
+
+    def bulk_books(self):
+        return Request(f"POST {BOOKS}/bulk", "POST", f"{BOOKS}/bulk", self.ndjson([self.book_body() for _ in range(20)]))
+
+    def bulk_reviews(self):
+        return Request(
+            f"POST {BOOKS}/{{book_id}}/reviews/bulk", "POST", f"{BOOKS}/{self.any_book()}/reviews/bulk",
+            self.ndjson([self.review_body() for _ in range(20)]),
+        )
+
+async def drive(client: httpx.AsyncClient, workload: Workload, total: int, concurrency: int, reads_only: bool = False) -> dict:
+    """Send `total` requests from `concurrency` clients; latency and errors per route"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Counter] = defaultdict(Counter)
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            request = workload.next(reads_only)
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.url, **request.options)
+            except httpx.HTTPError as e:
+                errors[request.route][type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                errors[request.route][str(response.status_code)] += 1
+                continue
+            latencies[request.route].append(elapsed)
+            if request.on_success is not None:
+                request.on_success(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    def report(samples: List[float], failed: Counter) -> dict:
+        result = summarize(samples, elapsed) if samples else {"requests": 0}
+        result["errors"] = sum(failed.values())
+        if failed:
+            result["error_statuses"] = dict(failed)
+        return result
+
+    routes = sorted(set(latencies) | set(errors))
+    return {
+        "overall": report([s for samples in latencies.values() for s in samples], sum(errors.values(), Counter())),
+        "routes": {route: report(latencies[route], errors[route]) for route in routes},
+    }
+
+def unreachable_redis():
+    """A client for a port nothing listens on"""
+    import redis.asyncio as redis
+
+    return redis.Redis(host="127.0.0.1", port=1, socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                       socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT)
+
+def prepare_cache(scenario: str):
+    """Point the global cache at fake Redis, or an unreachable one; the app's startup connects it"""
+    import fakeredis
+    from app.utils.cache import cache
+
+    cache.redis_client = unreachable_redis() if scenario == "down" else fakeredis.FakeAsyncRedis()
+
+def scenario_app(app, scenario: str):
+    """The app, emptying the cache before every request in the cold scenario"""
+    if scenario != "cold":
+        return app
+    from app.utils.cache import cache
+    from app.utils.leaderboard import leaderboard
+
+    # Rankings are data rather than a cache: dropping them would make /top answer empty
+    kept = {key.encode() for key in (*leaderboard.RANKINGS.values(), leaderboard.SUMS)}
+
+    async def cold(scope, receive, send):
+        if scope["type"] == "http" and cache.redis_client is not None:
+            keys = [key for key in await cache.redis_client.keys() if key not in kept]
+            if keys:
+                await cache.redis_client.delete(*keys)
+            if cache.local is not None:
+                cache.local.clear()
+        await app(scope, receive, send)
+    return cold
+
+async def run_in_process(scenario: str, args, workload: Workload) -> dict:
+    from app.main import app
+
+    prepare_cache(scenario)
+    async with app.router.lifespan_context(app):
+        # App errors (SQLite's "database is locked" under write load) count as 500s
+        transport = httpx.ASGITransport(app=scenario_app(app, scenario), raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            await drive(client, workload, args.warmup, args.concurrency, reads_only=True)
+            return await drive(client, workload, args.requests, args.concurrency)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_over_uvicorn(scenario: str, args, workload: Workload) -> dict:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.load", "--serve", scenario, "--port", str(port)])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            for _ in range(200):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f"uvicorn did not start on {base_url}")
+            await drive(client, workload, args.warmup, args.concurrency, reads_only=True)
+            return await drive(client, workload, args.requests, args.concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+def serve(scenario: str, port: int):
+    """Run the app under uvicorn for one scenario (started by --transport uvicorn)"""
+    import uvicorn
+    from app.main import app
+
+    prepare_cache(scenario)
+    uvicorn.run(scenario_app(app, scenario), host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> dict:
+    """Routes and percentiles that got worse than the baseline by more than the thresholds"""
+    regressions = []
+    checked = 0
+    for scenario, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        for route, stats in [("overall", current["overall"]), *current["routes"].items()]:
+            old = before["overall"] if route == "overall" else before["routes"].get(route)
+            if not old:
+                continue
+            samples = min(old.get("requests", 0), stats.get("requests", 0))
+            for metric, needed in PERCENTILE_SAMPLES.items():
+                if samples < needed:
+                    continue
+                checked += 1
+                if stats[metric] > old[metric] * (1 + threshold) and stats[metric] - old[metric] >= min_delta_ms:
+                    regressions.append({"scenario": scenario, "route": route, "metric": metric,
+                                        "baseline": old[metric], "current": stats[metric]})
+            # Per-route rates only follow the mix, so throughput is judged overall
+            if route == "overall" and stats["rps"] < old["rps"] * (1 - threshold):
+                regressions.append({"scenario": scenario, "route": route, "metric": "rps",
+                                    "baseline": old["rps"], "current": stats["rps"]})
+    differing = sorted(
+        key for key in ("transport", "database", "requests", "concurrency", "write_ratio", "books")
+        if baseline.get("config", {}).get(key) != results["config"][key]
+    )
+    return {"checked": checked, "regressions": regressions, "config_differs": differing}
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    seed(args.books, args.reviews_per_book, rng)
+    results = {
+        "config": {
+            "transport": args.transport, "database": engine.dialect.name, "requests": args.requests,
+            "warmup": args.warmup, "concurrency": args.concurrency, "write_ratio": args.write_ratio,
+            "books": args.books, "reviews_per_book": args.reviews_per_book, "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+    # Rows that exist before any scenario writes, so no scenario reads what another deleted
+    with SessionLocal() as db:
+        book_ids = db.scalars(select(Book.id).order_by(Book.id).limit(args.books)).all()
+        review_ids = db.scalars(select(Review.id).order_by(Review.id).limit(args.books * args.reviews_per_book)).all()
+    runner = run_over_uvicorn if args.transport == "uvicorn" else run_in_process
+    for scenario in args.scenarios:
+        workload = Workload(random.Random(f"{args.seed}-{scenario}"), args.write_ratio, book_ids, review_ids)
+        results["scenarios"][scenario] = await runner(scenario, args, workload)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                        help=f"comma-separated, from {','.join(SCENARIOS)}")
+    parser.add_argument("--transport", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=300, help="untimed reads before each scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--books", type=int, default=2000, help="books to seed into an empty database")
+    parser.add_argument("--reviews-per-book", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.5, help="relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="smaller latency changes are noise")
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument("--serve", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args))
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["comparison"] = {
+            "baseline": args.baseline,
+            **compare(results, baseline, args.threshold, args.min_delta_ms),
+        }
+    print(json.dumps(results, indent=2))
+    if args.baseline and results["comparison"]["regressions"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Cost of metrics collection per request, with METRICS_ENABLED on and off.
+
+Requests a cached book (fakeredis, so a hit costs no database work) and an
+uncached one (cache off, one SQL query) through the app, alternating rounds
+with metrics on and off, and reports process CPU time per request. Whole
+requests are noisy next to the overhead, so the middleware and the SQL hooks
+are also timed alone around a no-op app and a trivial query.
+
+    python -m benchmarks.metrics_overhead --repeat 2000 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import use_temp_sqlite
+
+use_temp_sqlite()
+
+import fakeredis
+import httpx
+from sqlalchemy import insert
+
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.models import Book
+from app.utils.cache import cache
+from app.utils.metrics import MetricsMiddleware
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def middleware_cost(calls: int) -> dict:
+    """Nanoseconds per request added by MetricsMiddleware around an app that does nothing"""
+    scope = {"type": "http", "method": "GET", "path": "/"}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    timings = {}
+    for name, target in (("bare", noop_app), ("instrumented", MetricsMiddleware(noop_app))):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await target(scope, receive, send)
+        timings[name] = (time.perf_counter() - started) / calls * 1e9
+    return {"middleware_ns": round(timings["instrumented"] - timings["bare"])}
+
+async def query_hook_cost(calls: int) -> dict:
+    """Nanoseconds per SQL statement added by the engine hooks"""
+    from sqlalchemy import text
+    from app.database import async_engine
+
+    timings = {}
+    async with async_engine.connect() as conn:
+        for enabled in (False, True, False, True):
+            settings.METRICS_ENABLED = enabled
+            started = time.perf_counter()
+            for _ in range(calls):
+                await conn.execute(text("SELECT 1"))
+            timings[enabled] = min(timings.get(enabled, float("inf")), (time.perf_counter() - started) / calls * 1e9)
+    # The hooks always run; when disabled they only skip recording
+    return {"query_recording_ns": round(timings[True] - timings[False]), "query_total_ns": round(timings[True])}
+
+def seed():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.execute(insert(Book), [{"title": "Bench Book", "author": "Bench Author", "description": "x" * 200}])
+        db.commit()
+
+async def cpu_per_request(client: httpx.AsyncClient, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        response = await client.get("/api/v1/books/1")
+        response.raise_for_status()
+    return (time.process_time() - started) / repeat * 1e6
+
+async def run(repeat: int, rounds: int) -> dict:
+    from app.main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("cached", "uncached"):
+            if path == "cached":
+                await cache.connect(fakeredis.FakeAsyncRedis())
+            else:
+                cache.is_available = False
+            samples = {True: [], False: []}
+            await cpu_per_request(client, 50)  # warm up
+            for _ in range(rounds):
+                for enabled in (True, False):
+                    settings.METRICS_ENABLED = enabled
+                    samples[enabled].append(await cpu_per_request(client, repeat))
+            on, off = min(samples[True]), min(samples[False])
+            results[path] = {
+                "metrics_on_cpu_us": round(on, 1),
+                "metrics_off_cpu_us": round(off, 1),
+                "overhead_us": round(on - off, 1),
+                "overhead_pct": round(100 * (on - off) / off, 1),
+            }
+    settings.METRICS_ENABLED = True
+    results["isolated"] = {**await middleware_cost(repeat * 10), **await query_hook_cost(repeat)}
+    results["config"] = {"repeat": repeat, "rounds": rounds}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="requests per round")
+    parser.add_argument("--rounds", type=int, default=5, help="alternating on/off rounds; the best of each is reported")
+    args = parser.parse_args()
+
+    seed()
+    print(json.dumps(asyncio.run(run(args.repeat, args.rounds)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Deep page latency: OFFSET vs keyset cursor on GET /api/v1/books.
+
+Seeds enough books to reach the requested page, then fetches that page
+repeatedly through the app (cache disabled) with ``skip=page*limit`` and with
+the equivalent ``cursor``.
+
+    python -m benchmarks.pagination --page 10000 --limit 10
+    DATABASE_URL=postgresql://... python -m benchmarks.pagination --no-seed
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from benchmarks.common import run_concurrently, use_temp_sqlite
+
+if "DATABASE_URL" not in os.environ:
+    use_temp_sqlite()
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from app.database import Base, SessionLocal, engine
+from app.models import Book
+from app.utils.cache import cache
+from app.utils.pagination import encode_cursor
+
+def seed(total: int):
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(Book))
+        for start in range(existing, total, 10000):
+            rows = [{"title": f"Book {i}", "author": "Bench Author"} for i in range(start, min(start + 10000, total))]
+            db.execute(insert(Book), rows)
+        db.commit()
+
+def cursor_for_offset(offset: int) -> str:
+    """Cursor that continues right after the first `offset` books"""
+    with SessionLocal() as db:
+        last_id = db.scalar(select(Book.id).order_by(Book.id).offset(offset - 1).limit(1)) if offset else None
+    return encode_cursor(last_id) if last_id is not None else ""
+
+async def measure(params: dict, repeat: int) -> dict:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(i: int):
+            response = await client.get("/api/v1/books/", params=params)
+            response.raise_for_status()
+
+        return await run_concurrently(call, repeat, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", type=int, default=10_000, help="zero-based page number to fetch")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--no-seed", action="store_true", help="use the books already in DATABASE_URL")
+    args = parser.parse_args()
+
+    offset = args.page * args.limit
+    if not args.no_seed:
+        seed(offset + args.limit)
+    cache.is_available = False
+
+    cursor = cursor_for_offset(offset)
+    results = {
+        "config": vars(args),
+        "offset": asyncio.run(measure({"skip": offset, "limit": args.limit}, args.repeat)),
+        "keyset": asyncio.run(measure({"cursor": cursor, "limit": args.limit}, args.repeat)),
+    }
+    results["p50_speedup"] = round(results["offset"]["p50_ms"] / results["keyset"]["p50_ms"], 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
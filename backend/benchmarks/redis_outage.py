@@ -0,0 +1,93 @@
+"""What a cache read costs while Redis is down, with and without the circuit breaker.
+
+Two outages: a closed port (connections are refused at once) and a server
+that accepts connections but never answers (a hung or partitioned Redis).
+For each, cache reads are timed with the old client settings (no socket
+timeout, no breaker; reads are cut off after ``--give-up`` seconds), with
+the socket timeouts alone, and with timeouts and breaker together.
+
+    python -m benchmarks.redis_outage --reads 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from benchmarks.common import summarize, use_temp_sqlite
+
+use_temp_sqlite()
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.utils.cache import RedisCache
+
+async def start_silent_server():
+    """A TCP server that takes connections and never replies"""
+    async def hold(reader, writer):
+        await reader.read()
+
+    server = await asyncio.start_server(hold, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+def make_cache(port: int, socket_timeout, connect_timeout, breaker: bool) -> RedisCache:
+    pool = redis.ConnectionPool(
+        host="127.0.0.1", port=port, socket_timeout=socket_timeout, socket_connect_timeout=connect_timeout,
+    )
+    cache = RedisCache(redis.Redis(connection_pool=pool))
+    if not breaker:
+        cache.breaker.failure_threshold = float("inf")
+    # As if Redis had been up at startup and just went away
+    cache.is_available = True
+    return cache
+
+async def measure(cache: RedisCache, reads: int, give_up: float) -> dict:
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(reads):
+        began = time.perf_counter()
+        try:
+            await asyncio.wait_for(cache.get(f"book:{i}"), give_up)
+        except asyncio.TimeoutError:
+            pass
+        latencies.append(time.perf_counter() - began)
+    result = summarize(latencies, time.perf_counter() - started)
+    result["breaker"] = cache.breaker.state
+    await cache.close()
+    return result
+
+async def run(reads: int, give_up: float) -> dict:
+    import logging
+
+    logging.disable(logging.WARNING)
+    server, silent_port = await start_silent_server()
+    variants = {
+        "no_timeouts_no_breaker": (None, None, False),
+        "timeouts_only": (settings.REDIS_SOCKET_TIMEOUT, settings.REDIS_CONNECT_TIMEOUT, False),
+        "timeouts_and_breaker": (settings.REDIS_SOCKET_TIMEOUT, settings.REDIS_CONNECT_TIMEOUT, True),
+    }
+    results = {}
+    for outage, port, count in (("refused", 1, reads), ("hung", silent_port, reads)):
+        results[outage] = {}
+        for name, (socket_timeout, connect_timeout, breaker) in variants.items():
+            # Hung reads without a breaker take seconds each; a few are enough
+            n = count if breaker or outage == "refused" else min(count, 10)
+            cache = make_cache(port, socket_timeout, connect_timeout, breaker)
+            results[outage][name] = await measure(cache, n, give_up)
+    server.close()
+    results["config"] = {
+        "reads": reads, "give_up_seconds": give_up,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT, "breaker_failures": settings.REDIS_BREAKER_FAILURES,
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--give-up", type=float, default=2.0, help="seconds after which a read is abandoned")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.reads, args.give_up)), indent=2))
+
+if __name__ == "__main__":
+    main()
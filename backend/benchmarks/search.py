@@ -0,0 +1,115 @@
+"""Search latency: LIKE scan vs the full-text index behind GET /api/v1/books/search.
+
+Seeds a synthetic catalog (1M books by default) whose titles, authors and
+descriptions are drawn from a Zipf-like vocabulary, then times queries for
+common, rare and two-word terms with a ``LIKE '%term%'`` scan over the text
+columns and with the search backend the app uses for DATABASE_URL (tsvector +
+GIN on Postgres, the in-memory inverted index on SQLite).
+
+    python -m benchmarks.search --books 1000000
+    DATABASE_URL=postgresql://... python -m benchmarks.search --no-seed   # after alembic upgrade head
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+
+from benchmarks.common import run_concurrently, use_temp_sqlite
+
+if "DATABASE_URL" not in os.environ:
+    use_temp_sqlite()
+
+from sqlalchemy import func, insert, or_, select
+
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models import Book
+from app.utils.search import InMemorySearchIndex, search_index
+
+SYLLABLES = ["ka", "lo", "mi", "ran", "tor", "vel", "shi", "an", "dor", "el", "qua", "zen", "bri", "mo", "thu", "nel"]
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def seed(total: int, words: list, rng: random.Random):
+    Base.metadata.create_all(engine)
+    # Word i is drawn with probability ~ 1/(i+1), like natural text
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(Book))
+        for start in range(existing, total, 10000):
+            rows = [
+                {
+                    "title": " ".join(rng.choices(words, cum_weights=weights, k=3)).title(),
+                    "author": " ".join(rng.choices(words, cum_weights=weights, k=2)).title(),
+                    "description": " ".join(rng.choices(words, cum_weights=weights, k=25)),
+                }
+                for _ in range(start, min(start + 10000, total))
+            ]
+            db.execute(insert(Book), rows)
+        db.commit()
+
+async def measure(search, queries: list, repeat: int) -> dict:
+    async def call(i: int):
+        async with AsyncSessionLocal() as db:
+            await search(db, queries[i % len(queries)])
+
+    return await run_concurrently(call, repeat, 1)
+
+async def like_scan(db, q: str):
+    """What finding a book costs without an index: a substring scan of every text column"""
+    terms = [or_(Book.title.ilike(f"%{term}%"), Book.author.ilike(f"%{term}%"), Book.description.ilike(f"%{term}%"))
+             for term in q.split()]
+    result = await db.execute(select(Book).where(*terms).order_by(Book.id).limit(10))
+    return result.scalars().all()
+
+async def indexed(db, q: str):
+    return await search_index.search(db, q, 0, 10)
+
+async def run(queries: dict, repeat: int) -> dict:
+    results = {}
+    if isinstance(search_index, InMemorySearchIndex):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await search_index.build(db)
+        results["index_build_s"] = round(time.perf_counter() - started, 2)
+
+    for name, terms in queries.items():
+        results[name] = {
+            "queries": terms,
+            "like_scan": await measure(like_scan, terms, repeat),
+            "index": await measure(indexed, terms, repeat),
+        }
+        results[name]["p50_speedup"] = round(
+            results[name]["like_scan"]["p50_ms"] / results[name]["index"]["p50_ms"], 1
+        )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--no-seed", action="store_true", help="use the books already in DATABASE_URL")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    words = vocabulary(args.vocabulary, rng)
+    if not args.no_seed:
+        seed(args.books, words, rng)
+
+    queries = {
+        "common_term": words[:5],
+        "rare_term": words[-5:],
+        "two_terms": [f"{words[i]} {words[i + 50]}" for i in range(5)],
+    }
+    results = {"config": vars(args), "backend": type(search_index).__name__, **asyncio.run(run(queries, args.repeat))}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""CPU per cache hit: decode and re-validate vs sending the stored bytes.
+
+Caches one ``GET /api/v1/books/`` page in fakeredis (local tier off), then
+requests it repeatedly through the app and reports process CPU time per
+request. The "revalidate" route reproduces the former hit path: ``json.loads``
+of the cached value, then FastAPI validating it against the response model and
+serializing it again. The "raw" route is the real endpoint, which returns the
+cached bytes as they are.
+
+    python -m benchmarks.serialization --limit 100 --repeat 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from benchmarks.common import run_concurrently, use_temp_sqlite
+
+use_temp_sqlite()
+
+import fakeredis
+import httpx
+from sqlalchemy import insert
+
+from app.database import Base, SessionLocal, engine
+from app.models import Book
+from app.schemas import BookResponse
+from app.utils.cache import cache
+
+def seed(total: int):
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.execute(insert(Book), [
+            {"title": f"Book {i}", "author": "Bench Author", "isbn": f"978{i:010d}",
+             "description": "A description of moderate length. " * 4, "publication_year": 1990 + i % 30}
+            for i in range(total)
+        ])
+        db.commit()
+
+def add_revalidating_route(app, limit: int):
+    """The pre-bytes hit path, for comparison"""
+    @app.get("/bench/revalidate", response_model=List[BookResponse])
+    async def revalidate():
+        key = await cache.namespaced_key("books:list", f"0:{limit}")
+        return json.loads(await cache.get_raw(key))
+
+async def measure(app, path: str, params: dict, repeat: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(i: int):
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+
+        await call(0)  # warm up
+        cpu_started = time.process_time()
+        results = await run_concurrently(call, repeat, 1)
+        results["cpu_us_per_request"] = round((time.process_time() - cpu_started) / repeat * 1e6, 1)
+        return results
+
+async def run(limit: int, repeat: int) -> dict:
+    from app.main import app
+
+    await cache.connect(fakeredis.FakeAsyncRedis())
+    cache.local = None
+    add_revalidating_route(app, limit)
+
+    params = {"limit": limit}
+    await measure(app, "/api/v1/books/", params, 1)  # fill the cache
+    revalidate = await measure(app, "/bench/revalidate", {}, repeat)
+    raw = await measure(app, "/api/v1/books/", params, repeat)
+    body = await cache.get_raw(await cache.namespaced_key("books:list", f"0:{limit}"))
+    return {
+        "config": {"limit": limit, "repeat": repeat, "cached_bytes": len(body)},
+        "revalidate": revalidate,
+        "raw": raw,
+        "cpu_saved_pct": round(100 * (1 - raw["cpu_us_per_request"] / revalidate["cpu_us_per_request"]), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=100, help="books on the cached page")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed(args.limit)
+    print(json.dumps(asyncio.run(run(args.limit, args.repeat)), indent=2))
+
+if __name__ == "__main__":
+    main()